@@ -1,35 +1,50 @@
+"""
+Password hashing, JWT issuing and the current-user dependencies.
+
+Tokens carry the user's id (`uid`), roles (`adm`, `sa`), a token id (`jti`)
+and the user's token version (`ver`). The first request with a token loads
+the user row and checks that its token_version still matches; the verified
+identity is then cached per (jti, ver) for AUTH_CACHE_TTL seconds, and later
+requests attach it to the request's session without querying. Columns that
+are not cached (email, custom_domain, content_version, ...) load from the
+row on first access, so handlers still see current values.
+
+revoke_user_tokens() bumps token_version: the worker that does it rejects old
+tokens at once, other workers once their cached entry expires.
+"""
+import hashlib
 import os
+import secrets
 from datetime import datetime, timedelta, timezone
 
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 
-from database import get_db
+from cache import MISSING, TTLCache
+from database import get_db, get_async_db
 from db_models import User
-from schemas import TokenData
+from passwords import password_hasher
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    password_bytes = plain_password.encode("utf-8")[:72]
-    hashed_bytes = hashed_password.encode("utf-8")
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
+# Columns cached for a verified token; everything else loads on access.
+_IDENTITY_COLUMNS = ("id", "username", "is_admin", "super_admin", "token_version")
 
+# (token id, token version) -> identity columns of the verified user
+_verified_tokens = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+# user id -> token_version last seen in the database by this worker
+_token_versions = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
 
-def get_password_hash(password: str) -> str:
-    password_bytes = password.encode("utf-8")[:72]
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode("utf-8")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -43,41 +58,148 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return encoded_jwt
 
 
+def user_token_claims(user: User) -> dict:
+    """Claims for a new access token for `user`."""
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "adm": bool(user.is_admin),
+        "sa": bool(user.super_admin),
+        "ver": user.token_version or 0,
+        "jti": secrets.token_hex(16),
+    }
+
+
+def revoke_user_tokens(user: User) -> None:
+    """Invalidate every token issued to `user`; call before committing a password or role change."""
+    user.token_version = (user.token_version or 0) + 1
+    _token_versions.set(user.id, user.token_version)
+
+
+def _decode_token(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _cache_key(token: str, payload: dict) -> tuple:
+    # Tokens issued before `jti` existed are keyed by their hash.
+    token_id = payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+    return token_id, payload.get("ver", 0)
+
+
+def _cached_identity(token: str, payload: dict) -> dict | None:
+    key = _cache_key(token, payload)
+    identity = _verified_tokens.get(key)
+    if identity is MISSING:
+        return None
+    current = _token_versions.get(identity["id"])
+    if current is not MISSING and current != key[1]:
+        _verified_tokens.pop(key)
+        return None
+    return identity
+
+
+def _verify(token: str, payload: dict, user: User | None) -> dict:
+    """Check a freshly loaded user against the token and cache the result."""
+    if user is None or user.username != payload["sub"]:
+        raise _credentials_exception()
+    version = user.token_version or 0
+    _token_versions.set(user.id, version)
+    if payload.get("ver", 0) != version:
+        raise _credentials_exception()
+    identity = {column: getattr(user, column) for column in _IDENTITY_COLUMNS}
+    _verified_tokens.set(_cache_key(token, payload), identity)
+    return identity
+
+
+def _detached_user(identity: dict) -> User:
+    user = User(**identity)
+    # Marks the instance as loaded from the database; the columns left out
+    # are expired and load on first access once it is attached.
+    make_transient_to_detached(user)
+    return user
+
+
+def auth_cache_stats() -> dict:
+    return {"tokens": _verified_tokens.stats(), "versions": _token_versions.stats()}
+
+
 def get_user_by_username(db: Session, username: str) -> User | None:
     return db.query(User).filter(User.username == username).first()
 
 
-def authenticate_user(db: Session, username: str, password: str) -> User | None:
-    user = get_user_by_username(db, username)
+async def get_user_by_username_async(db: AsyncSession, username: str) -> User | None:
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> User | None:
+    user = await get_user_by_username_async(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return None
+    # Same password, so tokens stay valid: token_version is left alone.
+    new_hash = await password_hasher.rehash_if_needed(password, user.hashed_password)
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-
-    user = get_user_by_username(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+    """The user for routes on a sync Session.
+
+    A plain function, so FastAPI runs it in the threadpool: the user query on
+    a cache miss never blocks the event loop.
+    """
+    payload = _decode_token(token)
+    identity = _cached_identity(token, payload)
+    if identity is None:
+        if "uid" in payload:
+            user = db.get(User, payload["uid"])
+        else:
+            user = get_user_by_username(db, username=payload["sub"])
+        _verify(token, payload, user)
+        return user
+    return db.merge(_detached_user(identity), load=False)
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Same as get_current_user, for routes running on an AsyncSession.
+
+    Lazy loads are not possible on an AsyncSession: on a cache hit only the
+    identity columns are loaded, so routes that need others must refresh them.
+    """
+    payload = _decode_token(token)
+    identity = _cached_identity(token, payload)
+    if identity is None:
+        if "uid" in payload:
+            user = await db.get(User, payload["uid"])
+        else:
+            user = await get_user_by_username_async(db, username=payload["sub"])
+        _verify(token, payload, user)
+        return user
+    return await db.merge(_detached_user(identity), load=False)
 
 
 async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
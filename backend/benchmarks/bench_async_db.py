@@ -0,0 +1,191 @@
+"""
+Concurrent-request throughput: sync Session vs AsyncSession on the event loop.
+
+Builds two copies of a public projects route against a throwaway SQLite
+database: one on the legacy sync `Session` (blocking calls inside `async def`)
+and one on `AsyncSession`. Each request also runs a simulated slow query
+(`--query-ms`) so the difference between blocking the loop and yielding it is
+visible, while /api/health latency is sampled alongside the load.
+
+Run with: python benchmarks/bench_async_db.py [--requests 400] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from database import Base
+from db_models import User, Project
+
+
+def _install_sleep_function(engine) -> None:
+    """Register bench_sleep(ms) on every SQLite connection of `engine`."""
+    def _sleep(ms):
+        time.sleep(ms / 1000)
+        return ms
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        # Under aiosqlite the function runs in the driver's worker thread,
+        # which is what a slow network round-trip looks like to the loop.
+        dbapi_conn.create_function("bench_sleep", 1, _sleep)
+
+
+def _seed(db_path: str, projects: int) -> None:
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        user = User(username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        for i in range(projects):
+            db.add(Project(
+                title=f"Project {i}",
+                description="Benchmark project " * 20,
+                tech_stack=["Python", "FastAPI"],
+                gallery=[{"type": "image", "url": f"https://example.com/{i}.png"}],
+                user_id=user.id,
+                order=i,
+            ))
+        db.commit()
+    engine.dispose()
+
+
+def _build_sync_app(db_path: str, query_ms: int, pool_size: int) -> FastAPI:
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False},
+        pool_size=pool_size,
+    )
+    _install_sleep_function(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    app = FastAPI()
+
+    @app.get("/api/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/u/{username}/projects")
+    async def projects(username: str):
+        # The session is opened inline rather than through a yield dependency:
+        # that dependency's teardown runs in the threadpool, and with the loop
+        # blocked on checkout it can starve the pool under this benchmark.
+        with SessionLocal() as db:
+            user = db.query(User).filter(User.username == username).first()
+            db.execute(text("SELECT bench_sleep(:ms)"), {"ms": query_ms})
+            rows = db.query(Project).filter(Project.user_id == user.id).order_by(Project.order).all()
+            return [{"id": p.id, "title": p.title, "gallery": p.gallery} for p in rows]
+
+    return app
+
+
+def _build_async_app(db_path: str, query_ms: int, pool_size: int) -> FastAPI:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", pool_size=pool_size)
+    _install_sleep_function(engine.sync_engine)
+    SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    app = FastAPI()
+
+    async def get_db():
+        async with SessionLocal() as db:
+            yield db
+
+    @app.get("/api/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/u/{username}/projects")
+    async def projects(username: str, db: AsyncSession = Depends(get_db)):
+        user = await db.scalar(select(User).where(User.username == username))
+        await db.execute(text("SELECT bench_sleep(:ms)"), {"ms": query_ms})
+        rows = await db.scalars(
+            select(Project).where(Project.user_id == user.id).order_by(Project.order)
+        )
+        return [{"id": p.id, "title": p.title, "gallery": p.gallery} for p in rows]
+
+    return app
+
+
+async def _run(app: FastAPI, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/u/bench/projects")  # warm the pool
+
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for i in range(requests):
+            queue.put_nowait(i)
+        health_latencies: list[float] = []
+        done = asyncio.Event()
+
+        async def worker():
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                response = await client.get("/api/u/bench/projects")
+                response.raise_for_status()
+
+        async def probe():
+            # Latency is measured from when the probe was due, so time spent
+            # waiting for a blocked loop to schedule it is included.
+            while not done.is_set():
+                due = time.perf_counter() + 0.01
+                await asyncio.sleep(0.01)
+                await client.get("/api/health")
+                health_latencies.append((time.perf_counter() - due) * 1000)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    health_latencies.sort()
+    return {
+        "req_per_s": requests / elapsed,
+        "elapsed_s": elapsed,
+        "health_p50_ms": statistics.median(health_latencies) if health_latencies else 0.0,
+        "health_max_ms": health_latencies[-1] if health_latencies else 0.0,
+        "health_samples": len(health_latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=25)
+    parser.add_argument("--query-ms", type=int, default=20, help="simulated query latency")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        _seed(db_path, args.projects)
+        print(
+            f"{args.requests} requests, concurrency {args.concurrency}, "
+            f"{args.projects} projects, {args.query_ms} ms simulated query"
+        )
+        for label, build in (("sync Session (before)", _build_sync_app), ("AsyncSession (after)", _build_async_app)):
+            app = build(db_path, args.query_ms, args.concurrency)
+            result = asyncio.run(_run(app, args.requests, args.concurrency))
+            print(
+                f"{label:<22} {result['req_per_s']:8.1f} req/s  "
+                f"health p50 {result['health_p50_ms']:7.1f} ms  max {result['health_max_ms']:7.1f} ms  "
+                f"({result['health_samples']} probes)"
+            )
+
+
+if __name__ == "__main__":
+    main()
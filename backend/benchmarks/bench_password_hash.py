@@ -0,0 +1,138 @@
+"""
+Login throughput and public GET latency: inline bcrypt vs the hashing pool.
+
+Builds two copies of a login route against one in-memory user: one checks the
+password with bcrypt.checkpw directly inside `async def` (blocking the loop),
+the other goes through passwords.PasswordHasher. While logins run at the given
+concurrency, a cheap public GET is sampled to show what other visitors of the
+same worker see.
+
+Run with: python benchmarks/bench_password_hash.py [--logins 40] [--concurrency 10] [--rounds 12]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+import httpx
+from fastapi import FastAPI, Form, HTTPException
+
+from passwords import PASSWORD_HASH_WORKERS, PasswordHasher, hash_password
+
+PASSWORD = "correct horse battery staple"
+
+
+def _build_inline_app(hashed: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/public")
+    async def public():
+        return {"status": "ok"}
+
+    @app.post("/api/auth/login")
+    async def login(password: str = Form(...)):
+        if not bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8")):
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    return app
+
+
+def _build_pool_app(hashed: str, hasher: PasswordHasher) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/public")
+    async def public():
+        return {"status": "ok"}
+
+    @app.post("/api/auth/login")
+    async def login(password: str = Form(...)):
+        if not await hasher.verify(password, hashed):
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    return app
+
+
+async def _run(app: FastAPI, logins: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for i in range(logins):
+            queue.put_nowait(i)
+        latencies: list[float] = []
+        done = asyncio.Event()
+
+        async def worker():
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                response = await client.post("/api/auth/login", data={"password": PASSWORD})
+                response.raise_for_status()
+
+        async def probe():
+            # Measured from when the probe was due, so time spent waiting for
+            # a blocked loop to schedule it is included.
+            while not done.is_set():
+                due = time.perf_counter() + 0.01
+                await asyncio.sleep(0.01)
+                await client.get("/api/public")
+                latencies.append((time.perf_counter() - due) * 1000)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    latencies.sort()
+    return {
+        "logins_per_s": logins / elapsed,
+        "public_p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "public_p99_ms": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+        "public_max_ms": latencies[-1] if latencies else 0.0,
+        "samples": len(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS, help="hashing threads")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    hashed = hash_password(PASSWORD, args.rounds)
+    print(
+        f"{args.logins} logins, concurrency {args.concurrency}, cost {args.rounds} "
+        f"({(time.perf_counter() - started) * 1000:.0f} ms per hash), {args.workers} hashing threads"
+    )
+    hasher = PasswordHasher(workers=args.workers, max_queue=args.logins, rounds=args.rounds)
+    apps = (
+        ("inline bcrypt (before)", _build_inline_app(hashed)),
+        ("thread pool (after)", _build_pool_app(hashed, hasher)),
+    )
+    try:
+        for label, app in apps:
+            result = asyncio.run(_run(app, args.logins, args.concurrency))
+            print(
+                f"{label:<23} {result['logins_per_s']:6.1f} logins/s  "
+                f"public GET p50 {result['public_p50_ms']:7.1f} ms  p99 {result['public_p99_ms']:7.1f} ms  "
+                f"max {result['public_max_ms']:7.1f} ms  ({result['samples']} probes)"
+            )
+    finally:
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
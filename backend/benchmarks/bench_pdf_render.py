@@ -0,0 +1,77 @@
+"""
+PDF rasterization throughput (pages/second) for different process pool sizes.
+
+Generates a synthetic deck, then renders every page at the preview DPI with
+RenderPool sized to 1, 4 and os.cpu_count() workers. The inline row is the
+previous behaviour: a sequential get_pixmap loop in the calling process.
+
+Run with: python benchmarks/bench_pdf_render.py [--pages 40] [--dpi 120]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+
+from pdf_render import RenderPool, _render_chunk
+
+
+def _make_deck(path: str, pages: int) -> None:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=1280, height=720)
+        page.insert_text((60, 90), f"Slide {i + 1}", fontsize=48)
+        for j in range(40):
+            rect = fitz.Rect(60 + j * 28, 160 + (j % 7) * 60, 80 + j * 28, 500)
+            page.draw_rect(rect, color=(0, 0, 0), fill=((j * 37) % 255 / 255, 0.4, 0.7))
+        page.insert_textbox(fitz.Rect(60, 520, 1220, 700), "Lorem ipsum dolor sit amet. " * 30, fontsize=12)
+    doc.save(path)
+    doc.close()
+
+
+async def _bench_pool(path: str, pages: int, dpi: int, workers: int) -> float:
+    pool = RenderPool(workers=workers, max_queue=1)
+    try:
+        # One page per worker so every process is spawned before timing.
+        await pool.render(path, [i % pages for i in range(workers)], dpi=dpi)
+        started = time.perf_counter()
+        results = await pool.render(path, list(range(pages)), dpi=dpi)
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.shutdown()
+    assert all("content" in item for item in results)
+    return pages / elapsed
+
+
+def _bench_inline(path: str, pages: int, dpi: int) -> float:
+    started = time.perf_counter()
+    _render_chunk(path, list(range(pages)), dpi, None, "png", None)
+    return pages / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--dpi", type=int, default=120)
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 4, cpu_count})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "deck.pdf")
+        _make_deck(path, args.pages)
+        print(f"{args.pages} pages at {args.dpi} DPI, {cpu_count} CPUs")
+        print(f"{'inline':<12} {_bench_inline(path, args.pages, args.dpi):8.1f} pages/s")
+        for workers in worker_counts:
+            rate = asyncio.run(_bench_pool(path, args.pages, args.dpi, workers))
+            print(f"{f'{workers} workers':<12} {rate:8.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
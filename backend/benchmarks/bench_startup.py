@@ -0,0 +1,141 @@
+"""
+Cold-start budget: `import main` time and time to the first 200 on /api/health.
+
+The backend sources are copied to a temp directory so the server runs against
+a throwaway SQLite database and uploads directory. One warm-up start creates
+the schema and the bytecode cache; each measured run then starts a fresh
+interpreter:
+- import: `import main` in a new process, and which lazily loaded
+  integrations (cloudinary, httpx, dnspython, PyMuPDF) it pulled in;
+- first 200: from spawning uvicorn until GET /api/health answers 200.
+
+The script exits with status 1 when a median is over its budget or an
+integration is imported at startup, so it can run as a regression check.
+Adjust the budgets when the baseline moves on purpose.
+
+Run with: python benchmarks/bench_startup.py [--runs 5] [--max-import-ms 2000] [--max-ready-ms 3000]
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets for the medians, in milliseconds.
+MAX_IMPORT_MS = 2000
+MAX_READY_MS = 3000
+# Integrations that must only load on first use.
+LAZY_MODULES = ("cloudinary", "httpx", "dns", "fitz")
+
+_IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{"import_ms": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _copy_backend(dest: str) -> None:
+    shutil.copytree(
+        BACKEND_DIR,
+        dest,
+        ignore=shutil.ignore_patterns("__pycache__", "benchmarks", "uploads", "venv", ".venv", "*.db", ".env"),
+    )
+
+
+def _env() -> dict:
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    # The background loops would only add noise to the measurement.
+    env.update({"MEDIA_RECONCILE_INTERVAL": "0", "DOMAIN_SWEEP_INTERVAL": "0", "JOB_WORKERS": "false"})
+    return env
+
+
+def _measure_import(cwd: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE], cwd=cwd, env=_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _measure_ready(cwd: str, timeout: float = 60.0) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/api/health"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd,
+        env=_env(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited: {server.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.005)
+        raise RuntimeError("server did not answer within the timeout")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=MAX_IMPORT_MS)
+    parser.add_argument("--max-ready-ms", type=float, default=MAX_READY_MS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = os.path.join(tmp, "backend")
+        _copy_backend(app_dir)
+        _measure_ready(app_dir)  # warm-up: schema and bytecode
+
+        imports = [_measure_import(app_dir) for _ in range(args.runs)]
+        ready = [_measure_ready(app_dir) for _ in range(args.runs)]
+
+    import_ms = statistics.median(run["import_ms"] for run in imports)
+    ready_ms = statistics.median(ready)
+    loaded = sorted({module for run in imports for module in run["loaded"]})
+
+    print(f"{args.runs} runs")
+    print(f"import main        median {import_ms:7.1f} ms  min {min(r['import_ms'] for r in imports):7.1f} ms  budget {args.max_import_ms:.0f} ms")
+    print(f"first 200 /health  median {ready_ms:7.1f} ms  min {min(ready):7.1f} ms  budget {args.max_ready_ms:.0f} ms")
+    print(f"integrations loaded at import: {', '.join(loaded) or 'none'}")
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append(f"import time {import_ms:.0f} ms is over {args.max_import_ms:.0f} ms")
+    if ready_ms > args.max_ready_ms:
+        failures.append(f"time to first 200 {ready_ms:.0f} ms is over {args.max_ready_ms:.0f} ms")
+    if loaded:
+        failures.append(f"imported at startup: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Per-tenant Cloudinary credentials.
+
+The cloudinary SDK keeps credentials on a process-wide config object, so
+configuring it per request races when tenants upload at the same time.
+Instead, each tenant's cloudinary:// URL is parsed once into the options the
+SDK accepts on every uploader/api call (cloud_name, api_key, api_secret) and
+cached per user; callers pass them as **options. An entry is only reused for
+the URL it was built from, and invalidate_cloudinary() drops it when the
+tenant's integrations setting changes.
+
+The SDK itself is imported on first use (here and in uploads/media), so
+processes that never talk to Cloudinary don't pay for loading it.
+"""
+import os
+from urllib.parse import urlparse
+
+from cache import MISSING, TTLCache
+
+CLOUDINARY_ACCOUNT_CACHE_SIZE = int(os.getenv("CLOUDINARY_ACCOUNT_CACHE_SIZE", "1024"))
+
+# user_id -> (cloudinary_url, options)
+_accounts = TTLCache(maxsize=CLOUDINARY_ACCOUNT_CACHE_SIZE, ttl=3600)
+
+
+def parse_cloudinary_url(cloudinary_url: str) -> dict:
+    parsed = urlparse(cloudinary_url)
+    if parsed.scheme != "cloudinary":
+        raise ValueError("Cloudinary URL must start with cloudinary://")
+    cloud_name = parsed.hostname
+    api_key = parsed.username
+    api_secret = parsed.password
+    if not cloud_name or not api_key or not api_secret:
+        raise ValueError("Cloudinary URL is missing cloud_name or credentials.")
+    return {"cloud_name": cloud_name, "api_key": api_key, "api_secret": api_secret, "secure": True}
+
+
+def cloudinary_options(user_id: int, cloudinary_url: str) -> dict:
+    """Options to pass to cloudinary.uploader / cloudinary.api calls for this tenant."""
+    cached = _accounts.get(user_id)
+    if cached is not MISSING and cached[0] == cloudinary_url:
+        return cached[1]
+    options = parse_cloudinary_url(cloudinary_url)
+    _accounts.set(user_id, (cloudinary_url, options))
+    return options
+
+
+def ping_cloudinary(options: dict) -> None:
+    """Check the tenant's credentials; raises on failure."""
+    import cloudinary.api
+
+    cloudinary.api.ping(**options)
+
+
+def invalidate_cloudinary(user_id: int) -> None:
+    _accounts.pop(user_id)
+
+
+def cloudinary_account_stats() -> dict:
+    return _accounts.stats()
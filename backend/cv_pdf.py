@@ -0,0 +1,357 @@
+"""
+CV PDF rendering with a content-addressed cache.
+
+The generated document depends only on the inputs passed to get_cv_pdf()
+(display name, cv and contact settings, featured projects). Their SHA-256 is
+the cache key, so any edit produces a new key; each user's previous entry is
+dropped when that happens. Bytes are kept in a size-bounded in-memory LRU and,
+when CV_PDF_CACHE_DIR is set, on disk. Concurrent requests for the same key
+share a single render.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import textwrap
+import threading
+from collections import OrderedDict
+
+from http_clients import get_client
+
+CV_PDF_CACHE_MAX_BYTES = int(os.getenv("CV_PDF_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CV_PDF_CACHE_DIR = os.getenv("CV_PDF_CACHE_DIR", "").strip()
+
+
+class _ByteLRU:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old)
+            self._data[key] = value
+            self.total_bytes += len(value)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_memory = _ByteLRU(CV_PDF_CACHE_MAX_BYTES)
+_latest_key_by_user: dict[int, str] = {}
+_inflight: dict[str, asyncio.Future] = {}
+_renders = 0
+
+
+def cv_cache_key(inputs: dict) -> str:
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _disk_path(key: str) -> str:
+    return os.path.join(CV_PDF_CACHE_DIR, f"{key}.pdf")
+
+
+def _read_disk(key: str) -> bytes | None:
+    if not CV_PDF_CACHE_DIR:
+        return None
+    try:
+        with open(_disk_path(key), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_disk(key: str, pdf_bytes: bytes) -> None:
+    if not CV_PDF_CACHE_DIR:
+        return
+    os.makedirs(CV_PDF_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{_disk_path(key)}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, _disk_path(key))
+
+
+def _forget(key: str) -> None:
+    _memory.pop(key)
+    if CV_PDF_CACHE_DIR:
+        try:
+            os.remove(_disk_path(key))
+        except OSError:
+            pass
+
+
+def _remember(user_id: int, key: str) -> None:
+    previous = _latest_key_by_user.get(user_id)
+    _latest_key_by_user[user_id] = key
+    if previous and previous != key and previous not in _latest_key_by_user.values():
+        _forget(previous)
+
+
+async def get_cv_pdf(user_id: int, inputs: dict) -> bytes:
+    """Return the rendered CV for `inputs`, rendering at most once per key."""
+    global _renders
+    key = cv_cache_key(inputs)
+    _remember(user_id, key)
+
+    cached = _memory.get(key)
+    if cached is not None:
+        return cached
+    cached = _read_disk(key)
+    if cached is not None:
+        _memory.set(key, cached)
+        return cached
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        _renders += 1
+        pdf_bytes = await render_cv_pdf(**inputs)
+        _memory.set(key, pdf_bytes)
+        _write_disk(key, pdf_bytes)
+        future.set_result(pdf_bytes)
+        return pdf_bytes
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        # Mark retrieved so a failure nobody else awaited is not logged.
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+def cv_pdf_cache_stats() -> dict:
+    return {
+        **_memory.stats(),
+        "renders": _renders,
+        "inflight": len(_inflight),
+        "disk": bool(CV_PDF_CACHE_DIR),
+    }
+
+
+async def render_cv_pdf(display_name: str, cv: dict, contact: dict, projects: list[dict]) -> bytes:
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)  # A4-ish
+    margin = 48.0
+    line_width = page.rect.width - (margin * 2)
+    y = margin
+
+    def new_page() -> None:
+        nonlocal page, y
+        page = doc.new_page(width=595, height=842)
+        y = margin
+
+    def ensure_space(height: float) -> None:
+        if y + height > page.rect.height - margin:
+            new_page()
+
+    def wrap_lines(text: str, fontsize: float, width: float) -> list[str]:
+        if not text:
+            return []
+        char_width = max(28, int(width / max(4.5, fontsize * 0.55)))
+        lines: list[str] = []
+        for para in str(text).splitlines() or [""]:
+            wrapped = textwrap.wrap(para, width=char_width) or [""]
+            lines.extend(wrapped)
+        return lines
+
+    def draw_text(
+        text: str,
+        *,
+        fontsize: float = 11,
+        bold: bool = False,
+        color: tuple[float, float, float] = (0, 0, 0),
+        indent: float = 0,
+        after: float = 6,
+        max_width: float | None = None,
+    ) -> None:
+        nonlocal y
+        clean = (text or "").strip()
+        if not clean:
+            return
+        width = max_width if max_width is not None else (line_width - indent)
+        lines = wrap_lines(clean, fontsize, width)
+        line_height = fontsize * 1.35
+        ensure_space((len(lines) * line_height) + after)
+        # "helvB" is not available in all PyMuPDF environments without an explicit font file.
+        # Use built-in Helvetica consistently for portability.
+        font = "helv"
+        x = margin + indent
+        for line in lines:
+            page.insert_text((x, y + fontsize), line, fontsize=fontsize, fontname=font, color=color)
+            y += line_height
+        y += after
+
+    photo_size = 96.0
+    header_width = line_width
+    photo_url = (cv.get("photo_url") or "").strip()
+    if photo_url:
+        try:
+            resp = await get_client("fetch").get(photo_url, timeout=10.0)
+            if resp.status_code < 400:
+                photo_rect = fitz.Rect(
+                    page.rect.width - margin - photo_size,
+                    y,
+                    page.rect.width - margin,
+                    y + photo_size,
+                )
+                page.insert_image(photo_rect, stream=resp.content, keep_proportion=True)
+                header_width = line_width - photo_size - 16
+        except Exception:
+            pass
+
+    draw_text(cv.get("title") or "Curriculum Vitae", fontsize=10, bold=True, color=(0.35, 0.35, 0.35), max_width=header_width)
+    draw_text(display_name, fontsize=22, bold=True, max_width=header_width, after=4)
+    draw_text(cv.get("headline") or "", fontsize=13, color=(0.35, 0.35, 0.35), max_width=header_width, after=3)
+    draw_text(cv.get("location") or "", fontsize=10, color=(0.4, 0.4, 0.4), max_width=header_width, after=6)
+
+    if header_width < line_width:
+        y = max(y, margin + photo_size + 6)
+
+    contact_rows = [
+        (contact.get("email") or "").strip(),
+        (contact.get("phone") or "").strip(),
+        (contact.get("linkedin") or "").strip(),
+        (contact.get("github") or "").strip(),
+        (cv.get("website") or "").strip(),
+    ]
+    for row in [r for r in contact_rows if r]:
+        draw_text(row, fontsize=10, color=(0.2, 0.2, 0.2), after=2)
+
+    if cv.get("summary"):
+        y += 4
+        draw_text(cv.get("summary") or "", fontsize=10.5, color=(0.25, 0.25, 0.25), after=8)
+
+    def draw_section_title(title: str) -> None:
+        nonlocal y
+        y += 4
+        draw_text(title, fontsize=15, bold=True, after=6)
+
+    experience = cv.get("experience") if isinstance(cv.get("experience"), list) else []
+    if experience:
+        draw_section_title("Experience")
+        for item in experience:
+            if not isinstance(item, dict):
+                continue
+            role = (item.get("role") or "").strip()
+            company = (item.get("company") or "").strip()
+            heading = " | ".join([v for v in [role, company] if v])
+            if heading:
+                draw_text(heading, fontsize=11.5, bold=True, after=2)
+            meta = " | ".join(
+                [
+                    v for v in [
+                        (item.get("location") or "").strip(),
+                        " - ".join([v for v in [(item.get("start") or "").strip(), (item.get("end") or "Present").strip()] if v]).strip(" -"),
+                    ] if v
+                ]
+            )
+            if meta:
+                draw_text(meta, fontsize=9.5, color=(0.45, 0.45, 0.45), after=3)
+            draw_text((item.get("summary") or "").strip(), fontsize=10, after=3)
+            highlights = item.get("highlights") if isinstance(item.get("highlights"), list) else []
+            for bullet in [str(h).strip() for h in highlights if str(h).strip()]:
+                draw_text(f"- {bullet}", fontsize=9.5, indent=8, after=1)
+            y += 4
+
+    education = cv.get("education") if isinstance(cv.get("education"), list) else []
+    if education:
+        draw_section_title("Education")
+        for item in education:
+            if not isinstance(item, dict):
+                continue
+            degree = (item.get("degree") or "").strip()
+            institution = (item.get("institution") or "").strip()
+            heading = " | ".join([v for v in [degree, institution] if v])
+            if heading:
+                draw_text(heading, fontsize=11, bold=True, after=2)
+            meta = " | ".join(
+                [v for v in [(item.get("field") or "").strip(), (item.get("location") or "").strip()] if v]
+            )
+            if meta:
+                draw_text(meta, fontsize=9.5, color=(0.45, 0.45, 0.45), after=2)
+            date_range = " - ".join([v for v in [(item.get("start") or "").strip(), (item.get("end") or "").strip()] if v])
+            if date_range:
+                draw_text(date_range, fontsize=9.5, color=(0.45, 0.45, 0.45), after=2)
+            draw_text((item.get("summary") or "").strip(), fontsize=9.5, after=4)
+
+    certifications = cv.get("certifications") if isinstance(cv.get("certifications"), list) else []
+    if certifications:
+        draw_section_title("Certifications")
+        for item in certifications:
+            if not isinstance(item, dict):
+                continue
+            name = (item.get("name") or "").strip()
+            issuer = (item.get("issuer") or "").strip()
+            year = (item.get("year") or "").strip()
+            heading = " | ".join([v for v in [name, issuer, year] if v])
+            draw_text(heading, fontsize=10, after=2)
+
+    awards = cv.get("awards") if isinstance(cv.get("awards"), list) else []
+    if awards:
+        draw_section_title("Awards")
+        for item in awards:
+            if not isinstance(item, dict):
+                continue
+            title = (item.get("title") or "").strip()
+            issuer = (item.get("issuer") or "").strip()
+            year = (item.get("year") or "").strip()
+            heading = " | ".join([v for v in [title, issuer, year] if v])
+            draw_text(heading, fontsize=10.5, bold=True, after=2)
+            draw_text((item.get("description") or "").strip(), fontsize=9.5, after=3)
+
+    if projects:
+        draw_section_title("Selected Projects")
+        for project in projects:
+            draw_text(project["title"], fontsize=10.5, bold=True, after=2)
+            draw_text(project["description"], fontsize=9.5, color=(0.25, 0.25, 0.25), after=2)
+            links = [v for v in [project["live_url"], project["github_link"]] if v]
+            if links:
+                draw_text(" | ".join(links), fontsize=8.8, color=(0.2, 0.2, 0.2), after=4)
+
+    pdf_bytes = doc.write()
+    doc.close()
+    return pdf_bytes
@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Use DATABASE_URL if provided (e.g., Railway Postgres). Fallback to local SQLite.
@@ -13,23 +14,50 @@ if DATABASE_URL:
     elif DATABASE_URL.startswith("postgresql://"):
         DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg://", 1)
     SQLALCHEMY_DATABASE_URL = DATABASE_URL
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
+    if DATABASE_URL.startswith("postgresql+psycopg://"):
+        # psycopg 3 serves both the sync and asyncio dialects under the same URL.
+        ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL
+    elif DATABASE_URL.startswith("sqlite://"):
+        ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    else:
+        raise RuntimeError(
+            "DATABASE_URL must be a postgres://, postgresql://, postgresql+psycopg:// or sqlite:// URL; "
+            "the app also opens it with an async driver, which is only set up for those."
+        )
+    connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite://") else {}
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True, connect_args=connect_args)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True)
 else:
     BASE_DIR = Path(__file__).resolve().parent
     DB_PATH = BASE_DIR / "portfolio.db"
     SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+    ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
     )
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes must stay readable after commit, since
+# lazy loads are not possible outside the session's greenlet context.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
 
+# The public routes run on get_async_db. Routes on get_db are plain `def`
+# functions, which FastAPI runs in its threadpool, or hand their database
+# work to asyncio.to_thread, so sync queries never block the event loop.
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
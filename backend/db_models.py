@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -15,6 +15,11 @@ class User(Base):
     super_admin = Column(Boolean, default=False, nullable=False)
     email = Column(String(255), nullable=True)
     custom_domain = Column(String(255), unique=True, nullable=True)
+    # Bumped on every write to public content; drives ETags and snapshots.
+    content_version = Column(Integer, default=0, nullable=False)
+    content_updated_at = Column(DateTime(timezone=True), nullable=True)
+    # Bumped to invalidate every token issued to the user.
+    token_version = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     projects = relationship("Project", back_populates="owner")
@@ -96,3 +101,91 @@ class DesignWork(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     owner = relationship("User", back_populates="design_works")
+
+
+class Media(Base):
+    """One stored file per (user, content hash, storage backend).
+
+    Also the tenant's media library index: rows found in Cloudinary by the
+    reconcile job have no sha256, since the bytes were never seen here.
+    """
+    __tablename__ = "media"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    sha256 = Column(String(64), nullable=True)
+    storage = Column(String(20), nullable=False)  # cloudinary, local
+    url = Column(String(500), nullable=False)
+    public_id = Column(String(255), nullable=False)  # Cloudinary public_id or local filename
+    resource_type = Column(String(20), nullable=False)  # image, video, raw
+    format = Column(String(20), nullable=True)
+    bytes = Column(Integer, nullable=False, default=0)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    synced_at = Column(DateTime(timezone=True), nullable=True)  # last seen by upload or reconcile
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "sha256", "storage", name="uq_user_media_content"),
+        UniqueConstraint("user_id", "storage", "public_id", name="uq_user_media_public_id"),
+    )
+
+
+class MediaSync(Base):
+    """When each tenant's media index was last reconciled with Cloudinary."""
+    __tablename__ = "media_sync"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    synced_at = Column(DateTime(timezone=True), nullable=True)
+    error = Column(Text, nullable=True)
+
+
+class Job(Base):
+    """A unit of background work run by the in-process workers in jobs.py."""
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    payload = Column(JSON, nullable=False, default=dict)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    progress = Column(Integer, nullable=False, default=0)  # percent
+    progress_message = Column(String(255), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    locked_by = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_type_run_after", "status", "type", "run_after"),
+    )
+
+
+class DomainStatus(Base):
+    """Latest verification result for each user's custom domain, kept fresh by the sweeper in domain_checks.py."""
+    __tablename__ = "domain_status"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    domain = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False)  # unconfigured, not_verified, verified
+    site_status = Column(String(20), nullable=True)  # unchecked, propagating, reachable
+    result = Column(JSON, nullable=False)
+    checked_at = Column(DateTime(timezone=True), nullable=False)
+    next_check_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    status_changed_at = Column(DateTime(timezone=True), nullable=False)
+    unchanged_checks = Column(Integer, nullable=False, default=0)  # consecutive checks with the same outcome
+
+
+class SchemaVersion(Base):
+    """Single row (id=1) holding the last applied step of migrate.py."""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
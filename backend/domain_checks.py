@@ -0,0 +1,308 @@
+"""
+Custom-domain verification: DNS lookups and reachability probes.
+
+The settings page polls the domain status while DNS propagates. Lookups use
+dnspython's async resolver, so they never block the event loop, and the
+CNAME, A and NS lookups (including every parent zone for NS) run
+concurrently. Answers are cached per (name, record type) for their DNS TTL,
+bounded by DNS_CACHE_MIN_TTL and DNS_CACHE_MAX_TTL; "no such record" answers
+are cached for DNS_NEGATIVE_TTL, and timeouts are not cached. Once a domain
+verifies, the HTTPS and HTTP probes also run concurrently, and their results
+are kept for DOMAIN_PROBE_CACHE_TTL seconds.
+
+Results are stored in the `domain_status` table, one row per user, so the
+status endpoint is a primary-key read. sweep_domains() re-checks rows that
+are due, with adaptive backoff: a domain that is still propagating is
+re-checked after DOMAIN_RECHECK_MIN seconds, doubling while the outcome does
+not change, up to DOMAIN_RECHECK_MAX; a reachable domain is re-checked every
+DOMAIN_RECHECK_VERIFIED seconds. Any change of outcome resets the backoff.
+Workers claim due rows with a conditional UPDATE, so each check runs once.
+
+dnspython is imported on the first lookup rather than at startup.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from cache import MISSING, TTLCache
+from database import SessionLocal
+from db_models import DomainStatus, User
+from http_clients import get_client
+
+DNS_TIMEOUT = float(os.getenv("DNS_TIMEOUT", "3"))
+DNS_CACHE_MIN_TTL = int(os.getenv("DNS_CACHE_MIN_TTL", "5"))
+DNS_CACHE_MAX_TTL = int(os.getenv("DNS_CACHE_MAX_TTL", "300"))
+DNS_NEGATIVE_TTL = int(os.getenv("DNS_NEGATIVE_TTL", "30"))
+DOMAIN_PROBE_CACHE_TTL = int(os.getenv("DOMAIN_PROBE_CACHE_TTL", "30"))
+DOMAIN_RECHECK_MIN = int(os.getenv("DOMAIN_RECHECK_MIN", "60"))
+DOMAIN_RECHECK_MAX = int(os.getenv("DOMAIN_RECHECK_MAX", "300"))
+DOMAIN_RECHECK_VERIFIED = int(os.getenv("DOMAIN_RECHECK_VERIFIED", str(6 * 3600)))
+DOMAIN_SWEEP_BATCH = int(os.getenv("DOMAIN_SWEEP_BATCH", "50"))
+DOMAIN_SWEEP_CONCURRENCY = int(os.getenv("DOMAIN_SWEEP_CONCURRENCY", "8"))
+
+logger = logging.getLogger(__name__)
+
+# How long a sweeping worker holds a claimed row before another may take it.
+_CLAIM_SECONDS = 300
+
+# (name, rdtype) -> list of record strings
+_records = TTLCache(maxsize=4096, ttl=DNS_CACHE_MAX_TTL)
+# url -> probe result dict
+_probes = TTLCache(maxsize=1024, ttl=DOMAIN_PROBE_CACHE_TTL)
+_resolver = None
+
+
+def _get_resolver():
+    global _resolver
+    if _resolver is None:
+        import dns.asyncresolver
+
+        _resolver = dns.asyncresolver.Resolver()
+        _resolver.lifetime = DNS_TIMEOUT
+    return _resolver
+
+
+def _record_text(rdtype: str, record) -> str:
+    if rdtype == "A":
+        return str(record.address)
+    return str(record.target).rstrip(".").lower()
+
+
+async def resolve_records(name: str, rdtype: str) -> list[str]:
+    """Record values for `name`, or [] if there are none or the lookup failed."""
+    key = (name.lower().rstrip("."), rdtype)
+    cached = _records.get(key)
+    if cached is not MISSING:
+        return cached
+    import dns.exception
+    import dns.resolver
+
+    try:
+        answer = await _get_resolver().resolve(key[0], rdtype)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+        _records.set(key, [], ttl=DNS_NEGATIVE_TTL)
+        return []
+    except (dns.exception.DNSException, OSError):
+        return []
+    values = [_record_text(rdtype, record) for record in answer]
+    ttl = min(max(answer.rrset.ttl if answer.rrset is not None else 0, DNS_CACHE_MIN_TTL), DNS_CACHE_MAX_TTL)
+    _records.set(key, values, ttl=ttl)
+    return values
+
+
+async def resolve_ns(host: str) -> list[str]:
+    """NS records of the closest zone at or above `host`."""
+    labels = host.strip(".").split(".")
+    candidates = [".".join(labels[i:]) for i in range(len(labels)) if labels[i]]
+    answers = await asyncio.gather(*(resolve_records(candidate, "NS") for candidate in candidates))
+    for records in answers:
+        if records:
+            return sorted(set(records))
+    return []
+
+
+async def _probe(url: str) -> dict:
+    cached = _probes.get(url)
+    if cached is not MISSING:
+        return cached
+    try:
+        response = await get_client("fetch").get(
+            url,
+            headers={"User-Agent": "folio-domain-check/1.0"},
+            timeout=5.0,
+        )
+        result = {"ok": response.status_code < 500, "status_code": response.status_code}
+    except Exception as exc:
+        result = {"ok": False, "error": exc.__class__.__name__}
+    _probes.set(url, result)
+    return result
+
+
+async def check_domain(domain: str) -> dict:
+    """DNS records and reachability of a custom domain against the DOMAIN_CHECK_* targets."""
+    if not domain:
+        return {"status": "not_set", "domain": None}
+
+    expected_cname = os.getenv("DOMAIN_CHECK_CNAME", "").strip().lower().rstrip(".")
+    expected_a = os.getenv("DOMAIN_CHECK_A", "").strip()
+    expected_ns = [
+        value.strip().lower().rstrip(".")
+        for value in os.getenv("DOMAIN_CHECK_NS", "").split(",")
+        if value.strip()
+    ]
+
+    if not expected_cname and not expected_a and not expected_ns:
+        return {"status": "unconfigured", "domain": domain}
+
+    cnames, a_records, ns_records = await asyncio.gather(
+        resolve_records(domain, "CNAME"),
+        resolve_records(domain, "A"),
+        resolve_ns(domain),
+    )
+    result = {
+        "status": "not_verified",
+        "domain": domain,
+        "expected_cname": expected_cname or None,
+        "expected_a": expected_a or None,
+        "expected_ns": expected_ns,
+        "found_cname": cnames[0] if cnames else None,
+        "found_a": a_records,
+        "found_ns": ns_records,
+        "site_status": "unchecked",
+        "site_checks": {
+            "https": None,
+            "http": None,
+        },
+    }
+
+    cname_ok = expected_cname and result["found_cname"] == expected_cname
+    a_ok = expected_a and expected_a in result["found_a"]
+    ns_ok = bool(expected_ns) and all(ns in result["found_ns"] for ns in expected_ns)
+
+    if cname_ok or a_ok or ns_ok:
+        result["status"] = "verified"
+        https, http = await asyncio.gather(_probe(f"https://{domain}"), _probe(f"http://{domain}"))
+        result["site_checks"] = {"https": https, "http": http}
+        result["site_status"] = "reachable" if https["ok"] or http["ok"] else "propagating"
+
+    return result
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; every timestamp stored here is UTC.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _recheck_delay(result: dict, unchanged_checks: int) -> float:
+    if result["status"] == "unconfigured" or result.get("site_status") == "reachable":
+        return DOMAIN_RECHECK_VERIFIED
+    return min(DOMAIN_RECHECK_MIN * 2 ** unchanged_checks, DOMAIN_RECHECK_MAX)
+
+
+def save_domain_check(db: Session, user_id: int, domain: str, result: dict) -> DomainStatus:
+    now = _now()
+    row = db.get(DomainStatus, user_id)
+    if row is None:
+        row = DomainStatus(user_id=user_id)
+        db.add(row)
+    outcome = (result["status"], result.get("site_status"))
+    if row.domain == domain and (row.status, row.site_status) == outcome:
+        row.unchanged_checks = (row.unchanged_checks or 0) + 1
+    else:
+        row.unchanged_checks = 0
+        row.status_changed_at = now
+    row.domain = domain
+    row.status, row.site_status = outcome
+    row.result = result
+    row.checked_at = now
+    row.next_check_at = now + timedelta(seconds=_recheck_delay(result, row.unchanged_checks))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker inserted the first row for this user; keep theirs.
+        db.rollback()
+        return db.get(DomainStatus, user_id)
+    # Load it here, in the caller's thread, rather than on first access.
+    db.refresh(row)
+    return row
+
+
+async def refresh_domain_status(db: Session, user_id: int, domain: str) -> DomainStatus:
+    """Check `domain` now and store the result (the write runs in a thread)."""
+    result = await check_domain(domain)
+    return await asyncio.to_thread(save_domain_check, db, user_id, domain, result)
+
+
+def get_domain_status_row(db: Session, user_id: int, domain: str) -> DomainStatus | None:
+    """The stored result for the user's current domain, if there is one."""
+    row = db.get(DomainStatus, user_id)
+    return row if row is not None and row.domain == domain else None
+
+
+def forget_domain_status(db: Session, user_id: int) -> None:
+    db.query(DomainStatus).filter(DomainStatus.user_id == user_id).delete(synchronize_session=False)
+    db.commit()
+
+
+def domain_status_response(row: DomainStatus) -> dict:
+    return {
+        **row.result,
+        "checked_at": _aware(row.checked_at).isoformat(),
+        "next_check_at": _aware(row.next_check_at).isoformat(),
+        "status_changed_at": _aware(row.status_changed_at).isoformat(),
+    }
+
+
+def _claim_due_domains() -> list[tuple[int, str]]:
+    db = SessionLocal()
+    try:
+        now = _now()
+        due = (
+            db.query(User.id, User.custom_domain, DomainStatus.next_check_at)
+            .outerjoin(DomainStatus, DomainStatus.user_id == User.id)
+            .filter(
+                User.custom_domain.isnot(None),
+                User.custom_domain != "",
+                or_(
+                    DomainStatus.user_id.is_(None),
+                    DomainStatus.domain != User.custom_domain,
+                    DomainStatus.next_check_at <= now,
+                ),
+            )
+            .limit(DOMAIN_SWEEP_BATCH)
+            .all()
+        )
+        claimed = []
+        for user_id, domain, next_check_at in due:
+            if next_check_at is not None:
+                won = db.execute(
+                    update(DomainStatus)
+                    .where(and_(DomainStatus.user_id == user_id, DomainStatus.next_check_at == next_check_at))
+                    .values(next_check_at=now + timedelta(seconds=_CLAIM_SECONDS))
+                ).rowcount
+                db.commit()
+                if not won:
+                    continue
+            claimed.append((user_id, domain.strip()))
+        return claimed
+    finally:
+        db.close()
+
+
+def _store_check(user_id: int, domain: str, result: dict) -> None:
+    db = SessionLocal()
+    try:
+        save_domain_check(db, user_id, domain, result)
+    finally:
+        db.close()
+
+
+async def sweep_domains() -> int:
+    """Re-check every custom domain that is due; returns how many were checked."""
+    claimed = await asyncio.to_thread(_claim_due_domains)
+    semaphore = asyncio.Semaphore(DOMAIN_SWEEP_CONCURRENCY)
+
+    async def check(user_id: int, domain: str) -> None:
+        try:
+            async with semaphore:
+                result = await check_domain(domain)
+            await asyncio.to_thread(_store_check, user_id, domain, result)
+        except Exception:
+            # The claim expires after _CLAIM_SECONDS and the row is retried.
+            logger.exception("Domain check for user %s (%s) failed", user_id, domain)
+
+    await asyncio.gather(*(check(user_id, domain) for user_id, domain in claimed))
+    return len(claimed)
+
+
+def domain_check_stats() -> dict:
+    return {"dns": _records.stats(), "probes": _probes.stats()}
@@ -0,0 +1,59 @@
+"""
+Conditional GET support for the public /api/u routes.
+
+Validators come from the tenant's content version (User.content_version),
+which every admin write bumps, so a matching If-None-Match can be answered
+with a 304 before any project, design or setting rows are loaded. The tenant
+lookup re-reads that column on every request, even when the User comes from
+the tenant cache, so a write on one worker changes the ETag on all of them.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+
+from db_models import User
+
+
+def validator_headers(user: User, request: Request) -> dict[str, str]:
+    """Return ETag/Last-Modified/Cache-Control headers for this tenant and URL."""
+    variant = f"{request.url.path}?{request.url.query}"
+    digest = hashlib.sha1(variant.encode("utf-8")).hexdigest()[:12]
+    headers = {
+        "ETag": f'"{user.id}-{user.content_version or 0}-{digest}"',
+        "Cache-Control": "no-cache",
+    }
+
+    modified = user.content_updated_at or user.created_at
+    if modified is not None:
+        if modified.tzinfo is None:
+            modified = modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def _parse_http_date(value: str) -> datetime | None:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def is_not_modified(request: Request, headers: dict[str, str]) -> bool:
+    """Evaluate If-None-Match (or, failing that, If-Modified-Since) against `headers`."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        return "*" in candidates or headers["ETag"] in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since and last_modified:
+        since = _parse_http_date(if_modified_since)
+        current = _parse_http_date(last_modified)
+        return since is not None and current is not None and current <= since
+    return False
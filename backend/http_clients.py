@@ -0,0 +1,95 @@
+"""
+Pooled outbound HTTP clients, one per upstream.
+
+get_client() creates each client on first use and keeps it, so TLS sessions
+and keep-alive connections are reused across requests; the FastAPI lifespan
+closes them on shutdown. The clients are shared by every tenant, so they
+never store cookies: one tenant's upstream could otherwise set a cookie
+that is sent along with another tenant's requests. httpx is imported with
+the first client, which keeps it off the startup path of processes that
+never make an outbound call.
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+
+# HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 without it.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# name -> (base_url, default read timeout, follow redirects, use HTTP/2)
+UPSTREAMS = {
+    "vercel": ("https://api.vercel.com", 30.0, False, True),
+    "screenshotone": (os.getenv("SCREENSHOTONE_BASE_URL", "https://api.screenshotone.com"), 60.0, False, True),
+    # Arbitrary user-supplied URLs: CV photos/PDFs and domain reachability probes.
+    "fetch": ("", 20.0, True, False),
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+_request_counts: dict[str, int] = {}
+
+
+def _create_client(name: str) -> httpx.AsyncClient:
+    import httpx
+
+    base_url, read_timeout, follow_redirects, http2 = UPSTREAMS[name]
+
+    async def _count_request(_request: httpx.Request) -> None:
+        _request_counts[name] = _request_counts.get(name, 0) + 1
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=http2 and HTTP2_AVAILABLE,
+        follow_redirects=follow_redirects,
+        timeout=httpx.Timeout(read_timeout, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        event_hooks={"request": [_count_request]},
+        # A policy that allows no domain: Set-Cookie responses are ignored.
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+    )
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _create_client(name)
+        _clients[name] = client
+    return client
+
+
+async def close_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def pool_stats() -> dict:
+    stats = {}
+    for name, client in _clients.items():
+        # httpx has no public pool API; read httpcore's connection list directly.
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        stats[name] = {
+            "http2": HTTP2_AVAILABLE and UPSTREAMS[name][3],
+            "requests": _request_counts.get(name, 0),
+            "connections": len(connections),
+            "idle": sum(1 for conn in connections if conn.is_idle()),
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive": HTTP_MAX_KEEPALIVE,
+        }
+    return stats
@@ -0,0 +1,91 @@
+"""
+Width-bucketed derivatives of locally stored images.
+
+Each locally stored image can also be fetched as
+/uploads/{sha256}/w{width}.{webp|jpg}, a downscaled copy whose width is one
+of UPLOAD_DERIVATIVE_WIDTHS. The sha256 is the content hash recorded in the
+media table. upload_storage.UploadStaticFiles generates variants lazily on
+first request, in a worker thread and at most once per file, and serves them
+from disk next to the original.
+
+WebP needs Pillow (see pdf_render.WEBP_AVAILABLE); without it only the JPEG
+variants exist.
+"""
+import os
+import re
+import tempfile
+
+from database import SessionLocal
+from db_models import Media
+from pdf_render import WEBP_AVAILABLE, encode_pixmap
+
+UPLOAD_DERIVATIVE_WIDTHS = sorted(
+    int(w) for w in os.getenv("UPLOAD_DERIVATIVE_WIDTHS", "320,640,960,1280,1920").split(",") if w.strip()
+)
+UPLOAD_DERIVATIVE_QUALITY = int(os.getenv("UPLOAD_DERIVATIVE_QUALITY", "80"))
+UPLOAD_DERIVATIVE_CONCURRENCY = int(os.getenv("UPLOAD_DERIVATIVE_CONCURRENCY", "2"))
+
+_VARIANT_PATH = re.compile(r"^([0-9a-f]{64})/w(\d+)\.(webp|jpg)$")
+
+
+def derivative_formats() -> list[str]:
+    return ["webp", "jpg"] if WEBP_AVAILABLE else ["jpg"]
+
+
+def parse_variant_path(path: str) -> tuple[str, int, str] | None:
+    """(sha256, width, format) for a servable variant path, else None."""
+    match = _VARIANT_PATH.match(path.replace(os.sep, "/"))
+    if not match:
+        return None
+    sha256, width, fmt = match.group(1), int(match.group(2)), match.group(3)
+    if width not in UPLOAD_DERIVATIVE_WIDTHS or fmt not in derivative_formats():
+        return None
+    return sha256, width, fmt
+
+
+def variant_urls(sha256: str, original_width: int | None) -> dict[str, dict[int, str]]:
+    """Variant URLs by format and width, for widths below the original's."""
+    widths = [w for w in UPLOAD_DERIVATIVE_WIDTHS if original_width is None or w < original_width]
+    return {fmt: {w: f"/uploads/{sha256}/w{w}.{fmt}" for w in widths} for fmt in derivative_formats()}
+
+
+def source_path(upload_dir: str, sha256: str) -> str | None:
+    db = SessionLocal()
+    try:
+        media = (
+            db.query(Media)
+            .filter(Media.sha256 == sha256, Media.storage == "local", Media.resource_type == "image")
+            .first()
+        )
+    finally:
+        db.close()
+    if media is None:
+        return None
+    path = os.path.join(upload_dir, media.public_id)
+    return path if os.path.exists(path) else None
+
+
+def render_variant(src_path: str, dest_path: str, width: int, fmt: str, quality: int) -> None:
+    """Downscale `src_path` to `width` (never upscaling) and write it atomically."""
+    import fitz  # PyMuPDF
+
+    pix = fitz.Pixmap(src_path)
+    if pix.colorspace is None or pix.colorspace.n != 3:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.width > width:
+        pix = fitz.Pixmap(pix, width, max(1, round(pix.height * width / pix.width)), None)
+    content, _ = encode_pixmap(pix, fmt, quality)
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        # mkstemp creates files as 0600; variants are served like the originals.
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,68 @@
+"""
+Cached lookup of a user's `integrations` setting.
+
+Upload, media, extract and screenshot routes read the integrations setting
+(Cloudinary URL, ScreenshotOne key), often more than once per request. The
+parsed value is cached at two levels:
+
+- per request, in the request's Session.info, so repeated lookups within one
+  request never query;
+- per process, in a TTLCache keyed by user id, so later requests skip the
+  query too. Other workers see an update after at most
+  INTEGRATION_CACHE_TTL seconds.
+
+update_setting/delete_setting call invalidate_integration_settings() when
+the `integrations` key changes. Returned dicts are shared; do not mutate them.
+"""
+import os
+
+from sqlalchemy.orm import Session
+
+from cache import MISSING, TTLCache
+from db_models import SiteSettings
+
+INTEGRATION_CACHE_SIZE = int(os.getenv("INTEGRATION_CACHE_SIZE", "1024"))
+INTEGRATION_CACHE_TTL = float(os.getenv("INTEGRATION_CACHE_TTL", "60"))
+
+_SESSION_KEY = "integration_settings"
+
+_settings = TTLCache(maxsize=INTEGRATION_CACHE_SIZE, ttl=INTEGRATION_CACHE_TTL)
+_counters = {"lookups": 0, "request_hits": 0, "process_hits": 0, "queries": 0}
+
+
+def get_integration_settings(db: Session, user_id: int) -> dict:
+    _counters["lookups"] += 1
+    per_request = db.info.setdefault(_SESSION_KEY, {})
+    value = per_request.get(user_id)
+    if value is not None:
+        _counters["request_hits"] += 1
+        return value
+
+    value = _settings.get(user_id)
+    if value is not MISSING:
+        _counters["process_hits"] += 1
+    else:
+        _counters["queries"] += 1
+        setting = (
+            db.query(SiteSettings)
+            .filter(SiteSettings.user_id == user_id, SiteSettings.key == "integrations")
+            .first()
+        )
+        value = setting.value if setting and isinstance(setting.value, dict) else {}
+        _settings.set(user_id, value)
+    per_request[user_id] = value
+    return value
+
+
+def invalidate_integration_settings(user_id: int, db: Session | None = None) -> None:
+    _settings.pop(user_id)
+    if db is not None:
+        db.info.get(_SESSION_KEY, {}).pop(user_id, None)
+
+
+def integration_cache_stats() -> dict:
+    return {
+        **_counters,
+        "queries_saved": _counters["request_hits"] + _counters["process_hits"],
+        "cache": _settings.stats(),
+    }
@@ -0,0 +1,394 @@
+"""
+Persistent background jobs for slow admin operations.
+
+PDF extraction, screenshot capture and domain checks can take up to a minute.
+Routes that support `background=true` store a row in the `jobs` table and
+answer 202 with the job's status right away; in-process workers then run it,
+and the client polls GET /api/admin/jobs/{id} and fetches .../result.
+
+Job types are registered with @job_type(name, ...) on an async handler that
+takes a JobContext and returns a JSON-serializable result. Each type has:
+- a concurrency limit, counted over running rows in the table, so it holds
+  across workers (two workers claiming at the same instant can overshoot it
+  briefly);
+- a retry budget: a failed attempt is queued again after an exponential
+  backoff, except for HTTPExceptions below 500, which are treated as final.
+
+Every worker process runs a JobRunner in the FastAPI lifespan. Workers claim
+queued rows with a conditional UPDATE, so a job runs once even with several
+workers polling. Running jobs send a heartbeat; a job whose worker stops
+heartbeating for JOB_STALE_AFTER seconds is picked up again. Finished jobs are
+deleted after JOB_RETENTION seconds. Set JOB_WORKERS=false on processes that
+should only enqueue.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from db_models import Job
+
+JOB_WORKERS = os.getenv("JOB_WORKERS", "true").lower() == "true"
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "300"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(7 * 24 * 3600)))
+# Per-type overrides of the registered concurrency, e.g. "pdf_extract=4,screenshot=1".
+JOB_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, _, limit in (item.partition("=") for item in os.getenv("JOB_CONCURRENCY", "").split(","))
+    if name.strip() and limit.strip().isdigit()
+}
+
+logger = logging.getLogger(__name__)
+
+_MAINTENANCE_INTERVAL = 30.0
+_MAX_RETRY_DELAY = 600.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobType:
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[["JobContext"], Awaitable[Any]],
+        concurrency: int,
+        max_attempts: int,
+        retry_delay: float,
+    ):
+        self.name = name
+        self.handler = handler
+        self.concurrency = JOB_CONCURRENCY.get(name, concurrency)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+
+_job_types: dict[str, JobType] = {}
+
+
+def job_type(name: str, *, concurrency: int = 1, max_attempts: int = 3, retry_delay: float = 5.0):
+    """Register an async handler for jobs of type `name`."""
+    def decorator(handler):
+        _job_types[name] = JobType(name, handler, concurrency, max_attempts, retry_delay)
+        return handler
+    return decorator
+
+
+class JobContext:
+    """What a handler gets: the job's fields, a DB session and progress reporting."""
+
+    def __init__(self, job_id: str, user_id: int, payload: dict, attempt: int, db: Session):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.payload = payload
+        self.attempt = attempt
+        self.db = db
+
+    async def progress(self, percent: float, message: str | None = None) -> None:
+        await asyncio.to_thread(_set_progress, self.job_id, percent, message)
+
+
+def _set_progress(job_id: str, percent: float, message: str | None) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "running")
+            .values(
+                progress=max(0, min(100, round(percent))),
+                progress_message=message[:255] if message else None,
+                heartbeat_at=_now(),
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def enqueue(db: Session, user_id: int, type: str, payload: dict) -> Job:
+    if type not in _job_types:
+        raise HTTPException(status_code=400, detail=f"Unknown job type: {type}")
+    job = Job(
+        id=secrets.token_hex(16),
+        user_id=user_id,
+        type=type,
+        status="queued",
+        payload=payload,
+        progress=0,
+        attempts=0,
+        max_attempts=_job_types[type].max_attempts,
+        run_after=_now(),
+        created_at=_now(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    job_runner.wake()
+    return job
+
+
+def get_job(db: Session, job_id: str, user_id: int) -> Job:
+    job = db.get(Job, job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def job_status(job: Job) -> dict:
+    def iso(value: datetime | None) -> str | None:
+        return value.isoformat() if value else None
+
+    return {
+        "id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "progress": job.progress,
+        "progress_message": job.progress_message,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "created_at": iso(job.created_at),
+        "started_at": iso(job.started_at),
+        "finished_at": iso(job.finished_at),
+        "status_url": f"/api/admin/jobs/{job.id}",
+        "result_url": f"/api/admin/jobs/{job.id}/result",
+    }
+
+
+class JobRunner:
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.recovered = 0
+        self._running: dict[str, asyncio.Task] = {}
+        self._wake: asyncio.Event | None = None
+        self._event_loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._event_loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        tasks = [task for task in (self._task, *self._running.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._wake = None
+
+    def wake(self) -> None:
+        # enqueue() also runs in worker threads; asyncio.Event is not thread-safe.
+        if self._wake is not None:
+            self._event_loop.call_soon_threadsafe(self._wake.set)
+
+    async def _loop(self) -> None:
+        last_maintenance = None
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if last_maintenance is None or loop.time() - last_maintenance >= _MAINTENANCE_INTERVAL:
+                    last_maintenance = loop.time()
+                    await asyncio.to_thread(self._maintain)
+                await self._dispatch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job runner %s: dispatch or maintenance failed", self.worker_id)
+            # asyncio.wait rather than wait_for: on 3.11, wait_for can swallow
+            # a cancel that arrives just as the event is set.
+            waiter = asyncio.create_task(self._wake.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=JOB_POLL_INTERVAL)
+            finally:
+                waiter.cancel()
+            self._wake.clear()
+
+    async def _dispatch(self) -> None:
+        for job_type in list(_job_types.values()):
+            claimed = await asyncio.to_thread(self._claim, job_type)
+            for job_id, user_id, payload, attempts in claimed:
+                task = asyncio.create_task(self._run(job_type, job_id, user_id, payload, attempts))
+                self._running[job_id] = task
+                task.add_done_callback(lambda _, job_id=job_id: self._running.pop(job_id, None))
+
+    def _claim(self, job_type: JobType) -> list[tuple]:
+        db = SessionLocal()
+        try:
+            running = db.query(func.count(Job.id)).filter(Job.type == job_type.name, Job.status == "running").scalar()
+            free = job_type.concurrency - running
+            if free <= 0:
+                return []
+            candidates = (
+                db.query(Job.id)
+                .filter(Job.type == job_type.name, Job.status == "queued", Job.run_after <= _now())
+                .order_by(Job.run_after, Job.created_at)
+                .limit(free)
+                .all()
+            )
+            claimed = []
+            for (job_id,) in candidates:
+                now = _now()
+                won = db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(
+                        status="running",
+                        locked_by=self.worker_id,
+                        attempts=Job.attempts + 1,
+                        started_at=now,
+                        heartbeat_at=now,
+                    )
+                ).rowcount
+                db.commit()
+                if won:
+                    job = db.get(Job, job_id)
+                    claimed.append((job.id, job.user_id, dict(job.payload or {}), job.attempts))
+            return claimed
+        finally:
+            db.close()
+
+    async def _run(self, job_type: JobType, job_id: str, user_id: int, payload: dict, attempt: int) -> None:
+        db = SessionLocal()
+        try:
+            result = await job_type.handler(JobContext(job_id, user_id, payload, attempt, db))
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without spending an attempt.
+            self._release(job_id)
+            raise
+        except Exception as e:
+            final = isinstance(e, HTTPException) and e.status_code < 500
+            error = e.detail if isinstance(e, HTTPException) else f"{e.__class__.__name__}: {e}"
+            if final:
+                logger.warning("Job %s (%s) failed on attempt %d: %s", job_id, job_type.name, attempt, error)
+            else:
+                logger.exception("Job %s (%s) failed on attempt %d", job_id, job_type.name, attempt)
+            await self._record(job_id, self._fail, job_type, job_id, str(error), final)
+        else:
+            await self._record(job_id, self._finish, job_id, result)
+        finally:
+            db.close()
+
+    async def _record(self, job_id: str, update_job: Callable, *args) -> None:
+        try:
+            await asyncio.to_thread(update_job, *args)
+        except Exception:
+            # The job stays "running"; stale recovery picks it up again.
+            logger.exception("Job %s: could not store its outcome", job_id)
+
+    def _finish(self, job_id: str, result: Any) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.locked_by == self.worker_id)
+                .values(status="succeeded", result=result, error=None, progress=100, finished_at=_now(), locked_by=None)
+            )
+            db.commit()
+            self.completed += 1
+        finally:
+            db.close()
+
+    def _fail(self, job_type: JobType, job_id: str, error: str, final: bool) -> None:
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            if job is None or job.locked_by != self.worker_id:
+                return
+            job.error = error[:2000]
+            job.locked_by = None
+            if final or job.attempts >= job.max_attempts:
+                job.status = "failed"
+                job.finished_at = _now()
+                self.failed += 1
+            else:
+                delay = min(job_type.retry_delay * 2 ** (job.attempts - 1), _MAX_RETRY_DELAY)
+                job.status = "queued"
+                job.run_after = _now() + timedelta(seconds=delay)
+                self.retried += 1
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, job_id: str) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.locked_by == self.worker_id, Job.status == "running")
+                .values(status="queued", locked_by=None, attempts=Job.attempts - 1, run_after=_now())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _maintain(self) -> None:
+        """Heartbeat our running jobs, requeue abandoned ones, purge old finished ones."""
+        db = SessionLocal()
+        try:
+            now = _now()
+            if self._running:
+                db.execute(
+                    update(Job)
+                    .where(Job.id.in_(list(self._running)), Job.locked_by == self.worker_id)
+                    .values(heartbeat_at=now)
+                )
+            stale = (
+                db.query(Job)
+                .filter(Job.status == "running", Job.heartbeat_at < now - timedelta(seconds=JOB_STALE_AFTER))
+                .all()
+            )
+            for job in stale:
+                job.locked_by = None
+                if job.attempts >= job.max_attempts:
+                    job.status = "failed"
+                    job.error = "Worker stopped while running the job"
+                    job.finished_at = now
+                else:
+                    job.status = "queued"
+                    job.run_after = now
+                self.recovered += 1
+            db.query(Job).filter(
+                Job.status.in_(("succeeded", "failed")),
+                Job.finished_at < now - timedelta(seconds=JOB_RETENTION),
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        db = SessionLocal()
+        try:
+            counts = db.query(Job.type, Job.status, func.count(Job.id)).group_by(Job.type, Job.status).all()
+        finally:
+            db.close()
+        queue: dict[str, dict[str, int]] = {}
+        for type_, status, count in counts:
+            queue.setdefault(type_, {})[status] = count
+        return {
+            "worker_id": self.worker_id,
+            "enabled": JOB_WORKERS,
+            "running_here": len(self._running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "recovered": self.recovered,
+            "concurrency": {name: job_type.concurrency for name, job_type in _job_types.items()},
+            "queue": queue,
+        }
+
+
+job_runner = JobRunner()
@@ -1,39 +1,68 @@
+import asyncio
+import io
+import json
+import logging
 import os
 import re
+import time
+from contextlib import asynccontextmanager
 from datetime import timedelta, datetime, timezone
-import shutil
-import tempfile
-import textwrap
-from urllib.parse import urlencode, urlparse
 
 from dotenv import load_dotenv
 load_dotenv()
 
-import httpx
-import dns.resolver
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Response, Query
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy import inspect, text
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import engine, get_db, Base, DATABASE_URL
-from db_models import User, Project, DesignWork, SiteSettings, Invite
+from database import engine, SessionLocal, get_db, get_async_db
+from migrate import ensure_schema_current
+from db_models import User, Project, DesignWork, SiteSettings, Invite, Job
 from schemas import (
     Token, UserCreate, UserResponse,
     ProjectCreate, ProjectUpdate, ProjectResponse,
     DesignWorkCreate, DesignWorkUpdate, DesignWorkResponse,
-    SettingUpdate, SettingResponse, AllSettingsResponse,
+    SettingUpdate, SettingResponse, AllSettingsResponse, JobSubmit,
 )
 from auth import (
-    get_password_hash, authenticate_user, create_access_token,
-    get_current_user, get_current_super_admin, ACCESS_TOKEN_EXPIRE_MINUTES
+    authenticate_user, create_access_token, user_token_claims,
+    get_current_user, get_current_user_async, get_current_super_admin,
+    auth_cache_stats, ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from tenant import get_user_by_username_or_404, get_user_by_domain
+from tenant import (
+    get_user_by_username_or_404_async, get_username_by_domain_async,
+    invalidate_tenant, tenant_cache_stats,
+)
+from http_cache import validator_headers, is_not_modified
+from http_clients import get_client, close_clients, pool_stats
+from cv_pdf import get_cv_pdf, cv_pdf_cache_stats
+from pdf_render import render_pool
+from pdf_sessions import pdf_sessions
+from passwords import password_hasher
+from image_derivatives import variant_urls
+from domain_checks import (
+    domain_check_stats, domain_status_response, forget_domain_status, get_domain_status_row,
+    refresh_domain_status, sweep_domains,
+)
+from jobs import JOB_WORKERS, JobContext, enqueue, get_job, job_runner, job_status, job_type
+from screenshots import normalize_url, screenshot_cache, screenshot_options
+from upload_storage import UploadStaticFiles, content_url, safe_extension, store_content
+from uploads import UploadSizeLimitMiddleware, check_upload_size, save_upload, upload_kind, upload_to_cloudinary
+from integration_settings import get_integration_settings, invalidate_integration_settings, integration_cache_stats
+from cloudinary_accounts import cloudinary_options, invalidate_cloudinary, cloudinary_account_stats, ping_cloudinary
+from media import (
+    sha256_bytes, sha256_file, read_probe, image_info,
+    find_reusable_media, record_media, record_cloudinary_upload,
+    reconcile_cloudinary, record_sync_error, last_synced_at, list_media_page,
+)
+from preview_images import MEDIA_TYPES, PDF_PREVIEW_URL_TTL, store_preview_image, get_preview_image, preview_image_stats
+from snapshot import get_snapshot, snapshot_generation, store_snapshot, invalidate_snapshot, build_bundle
+
+logger = logging.getLogger(__name__)
 
 # Reserved usernames that cannot be registered
 RESERVED_USERNAMES = {
@@ -41,132 +70,7 @@ RESERVED_USERNAMES = {
     "support", "static", "uploads", "_next", "favicon.ico", "robots.txt",
 }
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-
-def ensure_schema() -> None:
-    inspector = inspect(engine)
-    table_names = inspector.get_table_names()
-
-    # Migration: add primary_image and videos to design_works
-    if "design_works" in table_names:
-        columns = {col["name"] for col in inspector.get_columns("design_works")}
-        if "primary_image" not in columns:
-            with engine.begin() as conn:
-                conn.execute(
-                    text(
-                        "ALTER TABLE design_works "
-                        "ADD COLUMN primary_image INTEGER DEFAULT 0"
-                    )
-                )
-        if "videos" not in columns:
-            with engine.begin() as conn:
-                conn.execute(text("ALTER TABLE design_works ADD COLUMN videos JSON"))
-
-    # Migration: add multi-tenant columns
-    if "projects" in table_names:
-        columns = {col["name"] for col in inspector.get_columns("projects")}
-        if "user_id" not in columns:
-            _migrate_to_multi_tenant()
-        if "video_url" not in columns:
-            with engine.begin() as conn:
-                conn.execute(text("ALTER TABLE projects ADD COLUMN video_url VARCHAR(500)"))
-        if "gallery" not in columns:
-            with engine.begin() as conn:
-                conn.execute(text("ALTER TABLE projects ADD COLUMN gallery JSON"))
-        if "github_releases" not in columns:
-            with engine.begin() as conn:
-                conn.execute(text("ALTER TABLE projects ADD COLUMN github_releases BOOLEAN DEFAULT FALSE"))
-
-    if "users" in table_names:
-        columns = {col["name"] for col in inspector.get_columns("users")}
-        with engine.begin() as conn:
-            if "custom_domain" not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN custom_domain VARCHAR(255)"))
-            if "email" not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN email VARCHAR(255)"))
-            if "super_admin" not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN super_admin BOOLEAN DEFAULT FALSE"))
-            conn.execute(text("UPDATE users SET super_admin = FALSE WHERE super_admin IS NULL"))
-
-
-def _migrate_to_multi_tenant() -> None:
-    """Add user_id columns and assign existing data to the first user."""
-    is_postgres = DATABASE_URL and "postgresql" in DATABASE_URL
-
-    if is_postgres:
-        with engine.begin() as conn:
-            # Get first user id
-            result = conn.execute(text("SELECT id FROM users ORDER BY id LIMIT 1"))
-            row = result.fetchone()
-            if not row:
-                # No users yet — just add nullable columns; they'll be set on first use
-                conn.execute(text("ALTER TABLE projects ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-                conn.execute(text("ALTER TABLE design_works ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-                conn.execute(text("ALTER TABLE site_settings ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-                # Drop old unique constraint on site_settings.key
-                conn.execute(text("ALTER TABLE site_settings DROP CONSTRAINT IF EXISTS site_settings_key_key"))
-                return
-
-            first_user_id = row[0]
-
-            # Add columns as nullable first
-            conn.execute(text("ALTER TABLE projects ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-            conn.execute(text("ALTER TABLE design_works ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-            conn.execute(text("ALTER TABLE site_settings ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-
-            # Assign all existing rows to the first user
-            conn.execute(text(f"UPDATE projects SET user_id = {first_user_id}"))
-            conn.execute(text(f"UPDATE design_works SET user_id = {first_user_id}"))
-            conn.execute(text(f"UPDATE site_settings SET user_id = {first_user_id}"))
-
-            # Set NOT NULL
-            conn.execute(text("ALTER TABLE projects ALTER COLUMN user_id SET NOT NULL"))
-            conn.execute(text("ALTER TABLE design_works ALTER COLUMN user_id SET NOT NULL"))
-            conn.execute(text("ALTER TABLE site_settings ALTER COLUMN user_id SET NOT NULL"))
-
-            # Drop old unique constraint/index on site_settings.key, add composite
-            conn.execute(text("ALTER TABLE site_settings DROP CONSTRAINT IF EXISTS site_settings_key_key"))
-            conn.execute(text("DROP INDEX IF EXISTS ix_site_settings_key"))
-            conn.execute(text(
-                "ALTER TABLE site_settings ADD CONSTRAINT uq_user_setting UNIQUE (user_id, key)"
-            ))
-    else:
-        # SQLite: recreate tables with new schema
-        # For dev: just drop and recreate (data will be lost, which is fine locally)
-        with engine.begin() as conn:
-            # Get first user
-            result = conn.execute(text("SELECT id FROM users ORDER BY id LIMIT 1"))
-            row = result.fetchone()
-            first_user_id = row[0] if row else None
-
-            if first_user_id:
-                # Add columns (SQLite supports ADD COLUMN)
-                conn.execute(text("ALTER TABLE projects ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-                conn.execute(text("ALTER TABLE design_works ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-                conn.execute(text("ALTER TABLE site_settings ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-
-                conn.execute(text(f"UPDATE projects SET user_id = {first_user_id}"))
-                conn.execute(text(f"UPDATE design_works SET user_id = {first_user_id}"))
-                conn.execute(text(f"UPDATE site_settings SET user_id = {first_user_id}"))
-            else:
-                conn.execute(text("ALTER TABLE projects ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-                conn.execute(text("ALTER TABLE design_works ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-                conn.execute(text("ALTER TABLE site_settings ADD COLUMN user_id INTEGER REFERENCES users(id)"))
-
-
-ensure_schema()
-
-
-# Fix: Drop old unique index on site_settings.key that breaks multi-tenant
-def fix_site_settings_index():
-    if "postgresql" in str(engine.url):
-        with engine.begin() as conn:
-            conn.execute(text("DROP INDEX IF EXISTS ix_site_settings_key"))
-
-
-fix_site_settings_index()
+ensure_schema_current(engine)
 
 # Cloudinary configuration
 DEFAULT_CLOUDINARY_URL = os.getenv("CLOUDINARY_URL")
@@ -180,11 +84,16 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 PDF_PREVIEW_DPI = int(os.getenv("PDF_PREVIEW_DPI", "120"))
 PDF_PREVIEW_MAX_PAGES = int(os.getenv("PDF_PREVIEW_MAX_PAGES", "40"))
+PDF_PREVIEW_QUALITY = int(os.getenv("PDF_PREVIEW_QUALITY", "70"))
+PDF_PREVIEW_MAX_DIM = int(os.getenv("PDF_PREVIEW_MAX_DIM", "2400"))
 PDF_EXTRACT_DPI = int(os.getenv("PDF_EXTRACT_DPI", "220"))
 PDF_EXTRACT_MAX_PAGES = int(os.getenv("PDF_EXTRACT_MAX_PAGES", "20"))
 PDF_EXTRACT_MAX_DIM = int(os.getenv("PDF_EXTRACT_MAX_DIM", "2400"))
 PDF_EXTRACT_FORMAT = os.getenv("PDF_EXTRACT_FORMAT", "jpeg").lower()
 PDF_EXTRACT_QUALITY = int(os.getenv("PDF_EXTRACT_QUALITY", "80"))
+PDF_EXTRACT_UPLOAD_CONCURRENCY = int(os.getenv("PDF_EXTRACT_UPLOAD_CONCURRENCY", "4"))
+MEDIA_RECONCILE_INTERVAL = int(os.getenv("MEDIA_RECONCILE_INTERVAL", "900"))
+DOMAIN_SWEEP_INTERVAL = int(os.getenv("DOMAIN_SWEEP_INTERVAL", "30"))
 REQUIRE_INVITE = os.getenv("REQUIRE_INVITE", "false").lower() == "true"
 
 PLATFORM_HERO_DEFAULT = {
@@ -201,17 +110,37 @@ PLATFORM_HERO_DEFAULT = {
     "subtitle_color": "",
 }
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reconcile_task = asyncio.create_task(_media_reconcile_loop()) if MEDIA_RECONCILE_INTERVAL > 0 else None
+    domain_sweep_task = asyncio.create_task(_domain_sweep_loop()) if DOMAIN_SWEEP_INTERVAL > 0 else None
+    if JOB_WORKERS:
+        job_runner.start()
+    yield
+    await job_runner.stop()
+    if domain_sweep_task is not None:
+        domain_sweep_task.cancel()
+    if reconcile_task is not None:
+        reconcile_task.cancel()
+    await close_clients()
+    render_pool.shutdown()
+    password_hasher.shutdown()
+
+
 app = FastAPI(
     title="Portfolio API",
     description="Backend API for the multi-tenant portfolio platform",
-    version="3.0.0"
+    version="3.0.0",
+    lifespan=lifespan,
 )
 
 # Mount static files for uploads
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/uploads", UploadStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # CORS configuration
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
+# Added before CORS so its 413 responses still carry CORS headers.
+app.add_middleware(UploadSizeLimitMiddleware, path="/api/admin/upload")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -222,14 +151,7 @@ app.add_middleware(
 
 
 def _get_integration_settings(db: Session, user: User) -> dict:
-    setting = (
-        db.query(SiteSettings)
-        .filter(SiteSettings.user_id == user.id, SiteSettings.key == "integrations")
-        .first()
-    )
-    if setting and isinstance(setting.value, dict):
-        return setting.value
-    return {}
+    return get_integration_settings(db, user.id)
 
 
 def _get_cloudinary_url(db: Session, user: User) -> str | None:
@@ -252,21 +174,74 @@ def _get_screenshotone_key(db: Session, user: User) -> str | None:
     return None
 
 
-def _configure_cloudinary(cloudinary_url: str) -> None:
-    parsed = urlparse(cloudinary_url)
-    if parsed.scheme != "cloudinary":
-        raise ValueError("Cloudinary URL must start with cloudinary://")
-    cloud_name = parsed.hostname
-    api_key = parsed.username
-    api_secret = parsed.password
-    if not cloud_name or not api_key or not api_secret:
-        raise ValueError("Cloudinary URL is missing cloud_name or credentials.")
-    cloudinary.config(
-        cloud_name=cloud_name,
-        api_key=api_key,
-        api_secret=api_secret,
-        secure=True
-    )
+# ============== Media Library Index ==============
+
+_media_reconciles: dict[int, asyncio.Task] = {}
+
+
+def _reconcile_user_media(user_id: int) -> str | None:
+    """Reconcile one tenant's media index; returns the error message, if any.
+
+    Runs in a worker thread with its own session.
+    """
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        cloudinary_url = _get_cloudinary_url(db, user) if user else None
+        if not cloudinary_url:
+            return None
+        try:
+            reconcile_cloudinary(
+                db, user.id, f"portfolio/{user.username}/", cloudinary_options(user.id, cloudinary_url)
+            )
+        except Exception as e:
+            logger.exception("Media reconcile failed for user %s", user_id)
+            record_sync_error(db, user_id, str(e))
+            return str(e)
+        return None
+    finally:
+        db.close()
+
+
+def _reconcile_media(user_id: int) -> asyncio.Task:
+    """Start a reconcile for `user_id`, or join the one already running."""
+    task = _media_reconciles.get(user_id)
+    if task is None or task.done():
+        task = asyncio.create_task(asyncio.to_thread(_reconcile_user_media, user_id))
+        _media_reconciles[user_id] = task
+    return task
+
+
+def _media_index_is_stale(synced_at: datetime | None) -> bool:
+    return synced_at is None or datetime.now(timezone.utc) - synced_at > timedelta(seconds=MEDIA_RECONCILE_INTERVAL)
+
+
+def _users_with_stale_media() -> list[int]:
+    db = SessionLocal()
+    try:
+        return [
+            user.id
+            for user in db.query(User).all()
+            if _media_index_is_stale(last_synced_at(db, user.id)) and _get_cloudinary_url(db, user)
+        ]
+    finally:
+        db.close()
+
+
+async def _media_reconcile_loop() -> None:
+    while True:
+        await asyncio.sleep(MEDIA_RECONCILE_INTERVAL)
+        try:
+            user_ids = await asyncio.to_thread(_users_with_stale_media)
+        except Exception:
+            logger.exception("Media reconcile: could not list tenants to sync")
+            continue
+        for user_id in user_ids:
+            try:
+                await _reconcile_media(user_id)
+            except Exception:
+                # Keep going with the other tenants.
+                logger.exception("Media reconcile failed for user %s", user_id)
 
 
 @app.post("/api/admin/integrations/cloudinary/test")
@@ -274,18 +249,30 @@ async def test_cloudinary(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    cloudinary_url = _get_cloudinary_url(db, current_user)
+    cloudinary_url = await asyncio.to_thread(_get_cloudinary_url, db, current_user)
     if not cloudinary_url:
         raise HTTPException(status_code=400, detail="Cloudinary URL is not configured.")
     try:
-        _configure_cloudinary(cloudinary_url)
-        cloudinary.api.ping()
+        await asyncio.to_thread(ping_cloudinary, cloudinary_options(current_user.id, cloudinary_url))
         return {"ok": True}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Cloudinary test failed: {str(e)}")
 
 
-def _seed_default_settings(db: Session, user_id: int) -> None:
+def _touch_public_content(user: User) -> None:
+    """Bump the user's content version; call before committing a public-facing write."""
+    # Incremented in SQL so concurrent writes never store the same version.
+    user.content_version = User.content_version + 1
+    user.content_updated_at = datetime.now(timezone.utc)
+
+
+def _public_content_changed(user: User, *domains: str | None) -> None:
+    """Drop per-process caches after a committed public-facing write."""
+    invalidate_snapshot(user.username)
+    invalidate_tenant(user.username, *domains)
+
+
+async def _seed_default_settings(db: AsyncSession, user_id: int) -> None:
     """Seed default settings for a new user."""
     defaults = {
         "hero": {
@@ -345,7 +332,7 @@ def _seed_default_settings(db: Session, user_id: int) -> None:
     for key, value in defaults.items():
         setting = SiteSettings(key=key, value=value, user_id=user_id)
         db.add(setting)
-    db.commit()
+    await db.commit()
 
 
 # ============== Health & Root ==============
@@ -360,10 +347,29 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/api/superadmin/diagnostics")
+async def get_diagnostics(current_user: User = Depends(get_current_super_admin)):
+    return {
+        "auth": auth_cache_stats(),
+        "tenant_cache": tenant_cache_stats(),
+        "http_pools": pool_stats(),
+        "cv_pdf_cache": cv_pdf_cache_stats(),
+        "pdf_render_pool": render_pool.stats(),
+        "password_hashing": password_hasher.stats(),
+        "pdf_preview_images": preview_image_stats(),
+        "pdf_sessions": pdf_sessions.stats(),
+        "screenshots": screenshot_cache.stats(),
+        "jobs": await asyncio.to_thread(job_runner.stats),
+        "domain_checks": domain_check_stats(),
+        "cloudinary_accounts": cloudinary_account_stats(),
+        "integration_settings": integration_cache_stats(),
+    }
+
+
 # ============== Authentication ==============
 
 @app.post("/api/auth/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     if REQUIRE_INVITE:
         token = (user.invite_token or "").strip()
         if not token:
@@ -371,7 +377,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invite token is required."
             )
-        invite = db.query(Invite).filter(Invite.token == token).first()
+        invite = await db.scalar(select(Invite).where(Invite.token == token))
         if not invite:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -407,7 +413,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
 
     # Check for duplicate username
-    existing = db.query(User).filter(User.username == username_lower).first()
+    existing = await db.scalar(select(User.id).where(User.username == username_lower))
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -416,28 +422,29 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 
     db_user = User(
         username=username_lower,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=await password_hasher.hash(user.password),
         is_admin=True,
         super_admin=False,
         email=user.email,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     if REQUIRE_INVITE:
         invite.used_by_user_id = db_user.id
         invite.used_at = datetime.now(timezone.utc)
-        db.commit()
+        await db.commit()
 
     # Seed default settings
-    _seed_default_settings(db, db_user.id)
+    await _seed_default_settings(db, db_user.id)
+    invalidate_tenant(db_user.username)
 
     return db_user
 
 
 @app.get("/api/admin/invites")
-async def list_invites(
+def list_invites(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -460,7 +467,7 @@ async def list_invites(
 
 
 @app.post("/api/admin/invites")
-async def create_invite(
+def create_invite(
     expires_in_days: int | None = Form(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -486,7 +493,7 @@ async def create_invite(
 
 
 @app.delete("/api/admin/invites/{invite_id}")
-async def delete_invite(
+def delete_invite(
     invite_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -508,9 +515,9 @@ async def delete_invite(
 @app.post("/api/auth/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -519,53 +526,99 @@ async def login(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=user_token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # The auth cache only holds identity columns; load the profile ones.
+    await db.refresh(current_user, ["email", "custom_domain"])
     return current_user
 
 
 # ============== Domain Resolution ==============
 
 @app.get("/api/resolve-domain")
-async def resolve_domain(domain: str = Query(...), db: Session = Depends(get_db)):
-    user = get_user_by_domain(domain, db)
-    if not user:
+async def resolve_domain(domain: str = Query(...), db: AsyncSession = Depends(get_async_db)):
+    username = await get_username_by_domain_async(domain, db)
+    if not username:
         raise HTTPException(status_code=404, detail="No user found for this domain")
-    return {"username": user.username}
+    return {"username": username}
 
 
 # ============== Public User-Scoped Routes ==============
 
+@app.get("/api/u/{username}/bundle")
+async def get_user_bundle(username: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Profile, projects, designs and public settings in a single response."""
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    content_version = user.content_version or 0
+    payload = get_snapshot(username, content_version)
+    if payload is None:
+        generation = snapshot_generation(username)
+        payload = await build_bundle(user, db)
+        store_snapshot(username, payload, generation, content_version)
+    return Response(content=payload, media_type="application/json", headers=validators)
+
+
 @app.get("/api/u/{username}/profile", response_model=UserResponse)
-async def get_user_profile(username: str, db: Session = Depends(get_db)):
-    user = get_user_by_username_or_404(username, db)
+async def get_user_profile(
+    username: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
     return user
 
 
 @app.get("/api/u/{username}/projects", response_model=list[ProjectResponse])
-async def get_user_projects(username: str, db: Session = Depends(get_db)):
-    user = get_user_by_username_or_404(username, db)
-    projects = (
-        db.query(Project)
-        .filter(Project.user_id == user.id)
+async def get_user_projects(
+    username: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    projects = await db.scalars(
+        select(Project)
+        .where(Project.user_id == user.id)
         .order_by(Project.order, Project.id.desc())
-        .all()
     )
-    return projects
+    return projects.all()
 
 
 @app.get("/api/u/{username}/projects/{project_id}", response_model=ProjectResponse)
-async def get_user_project(username: str, project_id: int, db: Session = Depends(get_db)):
-    user = get_user_by_username_or_404(username, db)
-    project = (
-        db.query(Project)
-        .filter(Project.id == project_id, Project.user_id == user.id)
-        .first()
+async def get_user_project(
+    username: str,
+    project_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    project = await db.scalar(
+        select(Project).where(Project.id == project_id, Project.user_id == user.id)
     )
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -575,24 +628,38 @@ async def get_user_project(username: str, project_id: int, db: Session = Depends
 @app.get("/api/u/{username}/designs", response_model=list[DesignWorkResponse])
 async def get_user_designs(
     username: str,
+    request: Request,
+    response: Response,
     category: str | None = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = get_user_by_username_or_404(username, db)
-    query = db.query(DesignWork).filter(DesignWork.user_id == user.id)
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    query = select(DesignWork).where(DesignWork.user_id == user.id)
     if category:
-        query = query.filter(DesignWork.category == category)
-    designs = query.order_by(DesignWork.order, DesignWork.id.desc()).all()
-    return designs
+        query = query.where(DesignWork.category == category)
+    designs = await db.scalars(query.order_by(DesignWork.order, DesignWork.id.desc()))
+    return designs.all()
 
 
 @app.get("/api/u/{username}/designs/{design_id}", response_model=DesignWorkResponse)
-async def get_user_design(username: str, design_id: int, db: Session = Depends(get_db)):
-    user = get_user_by_username_or_404(username, db)
-    design = (
-        db.query(DesignWork)
-        .filter(DesignWork.id == design_id, DesignWork.user_id == user.id)
-        .first()
+async def get_user_design(
+    username: str,
+    design_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    design = await db.scalar(
+        select(DesignWork).where(DesignWork.id == design_id, DesignWork.user_id == user.id)
     )
     if not design:
         raise HTTPException(status_code=404, detail="Design work not found")
@@ -600,9 +667,18 @@ async def get_user_design(username: str, design_id: int, db: Session = Depends(g
 
 
 @app.get("/api/u/{username}/settings", response_model=AllSettingsResponse)
-async def get_user_settings(username: str, db: Session = Depends(get_db)):
-    user = get_user_by_username_or_404(username, db)
-    settings = db.query(SiteSettings).filter(SiteSettings.user_id == user.id).all()
+async def get_user_settings(
+    username: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    settings = await db.scalars(select(SiteSettings).where(SiteSettings.user_id == user.id))
     result = {}
     for setting in settings:
         if setting.key == "integrations":
@@ -612,12 +688,20 @@ async def get_user_settings(username: str, db: Session = Depends(get_db)):
 
 
 @app.get("/api/u/{username}/settings/{key}")
-async def get_user_setting(username: str, key: str, db: Session = Depends(get_db)):
-    user = get_user_by_username_or_404(username, db)
-    setting = (
-        db.query(SiteSettings)
-        .filter(SiteSettings.user_id == user.id, SiteSettings.key == key)
-        .first()
+async def get_user_setting(
+    username: str,
+    key: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    setting = await db.scalar(
+        select(SiteSettings).where(SiteSettings.user_id == user.id, SiteSettings.key == key)
     )
     if not setting:
         raise HTTPException(status_code=404, detail="Setting not found")
@@ -625,12 +709,13 @@ async def get_user_setting(username: str, key: str, db: Session = Depends(get_db
 
 
 @app.get("/api/u/{username}/cv/pdf")
-async def get_user_cv_pdf(username: str, db: Session = Depends(get_db)):
-    user = get_user_by_username_or_404(username, db)
-    cv_setting = (
-        db.query(SiteSettings)
-        .filter(SiteSettings.user_id == user.id, SiteSettings.key == "cv")
-        .first()
+async def get_user_cv_pdf(username: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    user = await get_user_by_username_or_404_async(username, db)
+    validators = validator_headers(user, request)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    cv_setting = await db.scalar(
+        select(SiteSettings).where(SiteSettings.user_id == user.id, SiteSettings.key == "cv")
     )
     if not cv_setting or not isinstance(cv_setting.value, dict):
         raise HTTPException(status_code=404, detail="CV not found")
@@ -639,15 +724,11 @@ async def get_user_cv_pdf(username: str, db: Session = Depends(get_db)):
     if not cv.get("enabled"):
         raise HTTPException(status_code=404, detail="CV is not published")
 
-    hero_setting = (
-        db.query(SiteSettings)
-        .filter(SiteSettings.user_id == user.id, SiteSettings.key == "hero")
-        .first()
+    hero_setting = await db.scalar(
+        select(SiteSettings).where(SiteSettings.user_id == user.id, SiteSettings.key == "hero")
     )
-    contact_setting = (
-        db.query(SiteSettings)
-        .filter(SiteSettings.user_id == user.id, SiteSettings.key == "contact")
-        .first()
+    contact_setting = await db.scalar(
+        select(SiteSettings).where(SiteSettings.user_id == user.id, SiteSettings.key == "contact")
     )
 
     hero = hero_setting.value if hero_setting and isinstance(hero_setting.value, dict) else {}
@@ -659,8 +740,7 @@ async def get_user_cv_pdf(username: str, db: Session = Depends(get_db)):
 
     if custom_pdf_url:
         try:
-            async with httpx.AsyncClient(timeout=20.0, follow_redirects=True) as client:
-                custom_resp = await client.get(custom_pdf_url)
+            custom_resp = await get_client("fetch").get(custom_pdf_url)
             if custom_resp.status_code < 400 and custom_resp.content:
                 custom_content_type = (custom_resp.headers.get("content-type") or "").lower()
                 is_pdf_like = custom_resp.content.startswith(b"%PDF") or "pdf" in custom_content_type
@@ -668,216 +748,44 @@ async def get_user_cv_pdf(username: str, db: Session = Depends(get_db)):
                     return Response(
                         content=custom_resp.content,
                         media_type="application/pdf",
-                        headers={"Content-Disposition": f'attachment; filename="{download_filename}"'},
+                        headers={"Content-Disposition": f'attachment; filename="{download_filename}"', **validators},
                     )
         except Exception:
             # Fall back to generated PDF below if custom file fetch fails.
             pass
 
-    import fitz  # PyMuPDF
-
-    doc = fitz.open()
-    page = doc.new_page(width=595, height=842)  # A4-ish
-    margin = 48.0
-    line_width = page.rect.width - (margin * 2)
-    y = margin
-
-    def new_page() -> None:
-        nonlocal page, y
-        page = doc.new_page(width=595, height=842)
-        y = margin
-
-    def ensure_space(height: float) -> None:
-        if y + height > page.rect.height - margin:
-            new_page()
-
-    def wrap_lines(text: str, fontsize: float, width: float) -> list[str]:
-        if not text:
-            return []
-        char_width = max(28, int(width / max(4.5, fontsize * 0.55)))
-        lines: list[str] = []
-        for para in str(text).splitlines() or [""]:
-            wrapped = textwrap.wrap(para, width=char_width) or [""]
-            lines.extend(wrapped)
-        return lines
-
-    def draw_text(
-        text: str,
-        *,
-        fontsize: float = 11,
-        bold: bool = False,
-        color: tuple[float, float, float] = (0, 0, 0),
-        indent: float = 0,
-        after: float = 6,
-        max_width: float | None = None,
-    ) -> None:
-        nonlocal y
-        clean = (text or "").strip()
-        if not clean:
-            return
-        width = max_width if max_width is not None else (line_width - indent)
-        lines = wrap_lines(clean, fontsize, width)
-        line_height = fontsize * 1.35
-        ensure_space((len(lines) * line_height) + after)
-        # "helvB" is not available in all PyMuPDF environments without an explicit font file.
-        # Use built-in Helvetica consistently for portability.
-        font = "helv"
-        x = margin + indent
-        for line in lines:
-            page.insert_text((x, y + fontsize), line, fontsize=fontsize, fontname=font, color=color)
-            y += line_height
-        y += after
-
-    photo_size = 96.0
-    header_width = line_width
-    photo_url = (cv.get("photo_url") or "").strip()
-    if photo_url:
-        try:
-            async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-                resp = await client.get(photo_url)
-                if resp.status_code < 400:
-                    photo_rect = fitz.Rect(
-                        page.rect.width - margin - photo_size,
-                        y,
-                        page.rect.width - margin,
-                        y + photo_size,
-                    )
-                    page.insert_image(photo_rect, stream=resp.content, keep_proportion=True)
-                    header_width = line_width - photo_size - 16
-        except Exception:
-            pass
-
-    draw_text(cv.get("title") or "Curriculum Vitae", fontsize=10, bold=True, color=(0.35, 0.35, 0.35), max_width=header_width)
-    draw_text(display_name, fontsize=22, bold=True, max_width=header_width, after=4)
-    draw_text(cv.get("headline") or "", fontsize=13, color=(0.35, 0.35, 0.35), max_width=header_width, after=3)
-    draw_text(cv.get("location") or "", fontsize=10, color=(0.4, 0.4, 0.4), max_width=header_width, after=6)
-
-    if header_width < line_width:
-        y = max(y, margin + photo_size + 6)
-
-    contact_rows = [
-        (contact.get("email") or "").strip(),
-        (contact.get("phone") or "").strip(),
-        (contact.get("linkedin") or "").strip(),
-        (contact.get("github") or "").strip(),
-        (cv.get("website") or "").strip(),
-    ]
-    for row in [r for r in contact_rows if r]:
-        draw_text(row, fontsize=10, color=(0.2, 0.2, 0.2), after=2)
-
-    if cv.get("summary"):
-        y += 4
-        draw_text(cv.get("summary") or "", fontsize=10.5, color=(0.25, 0.25, 0.25), after=8)
-
-    def draw_section_title(title: str) -> None:
-        nonlocal y
-        y += 4
-        draw_text(title, fontsize=15, bold=True, after=6)
-
-    experience = cv.get("experience") if isinstance(cv.get("experience"), list) else []
-    if experience:
-        draw_section_title("Experience")
-        for item in experience:
-            if not isinstance(item, dict):
-                continue
-            role = (item.get("role") or "").strip()
-            company = (item.get("company") or "").strip()
-            heading = " | ".join([v for v in [role, company] if v])
-            if heading:
-                draw_text(heading, fontsize=11.5, bold=True, after=2)
-            meta = " | ".join(
-                [
-                    v for v in [
-                        (item.get("location") or "").strip(),
-                        " - ".join([v for v in [(item.get("start") or "").strip(), (item.get("end") or "Present").strip()] if v]).strip(" -"),
-                    ] if v
-                ]
-            )
-            if meta:
-                draw_text(meta, fontsize=9.5, color=(0.45, 0.45, 0.45), after=3)
-            draw_text((item.get("summary") or "").strip(), fontsize=10, after=3)
-            highlights = item.get("highlights") if isinstance(item.get("highlights"), list) else []
-            for bullet in [str(h).strip() for h in highlights if str(h).strip()]:
-                draw_text(f"- {bullet}", fontsize=9.5, indent=8, after=1)
-            y += 4
-
-    education = cv.get("education") if isinstance(cv.get("education"), list) else []
-    if education:
-        draw_section_title("Education")
-        for item in education:
-            if not isinstance(item, dict):
-                continue
-            degree = (item.get("degree") or "").strip()
-            institution = (item.get("institution") or "").strip()
-            heading = " | ".join([v for v in [degree, institution] if v])
-            if heading:
-                draw_text(heading, fontsize=11, bold=True, after=2)
-            meta = " | ".join(
-                [v for v in [(item.get("field") or "").strip(), (item.get("location") or "").strip()] if v]
-            )
-            if meta:
-                draw_text(meta, fontsize=9.5, color=(0.45, 0.45, 0.45), after=2)
-            date_range = " - ".join([v for v in [(item.get("start") or "").strip(), (item.get("end") or "").strip()] if v])
-            if date_range:
-                draw_text(date_range, fontsize=9.5, color=(0.45, 0.45, 0.45), after=2)
-            draw_text((item.get("summary") or "").strip(), fontsize=9.5, after=4)
-
-    certifications = cv.get("certifications") if isinstance(cv.get("certifications"), list) else []
-    if certifications:
-        draw_section_title("Certifications")
-        for item in certifications:
-            if not isinstance(item, dict):
-                continue
-            name = (item.get("name") or "").strip()
-            issuer = (item.get("issuer") or "").strip()
-            year = (item.get("year") or "").strip()
-            heading = " | ".join([v for v in [name, issuer, year] if v])
-            draw_text(heading, fontsize=10, after=2)
-
-    awards = cv.get("awards") if isinstance(cv.get("awards"), list) else []
-    if awards:
-        draw_section_title("Awards")
-        for item in awards:
-            if not isinstance(item, dict):
-                continue
-            title = (item.get("title") or "").strip()
-            issuer = (item.get("issuer") or "").strip()
-            year = (item.get("year") or "").strip()
-            heading = " | ".join([v for v in [title, issuer, year] if v])
-            draw_text(heading, fontsize=10.5, bold=True, after=2)
-            draw_text((item.get("description") or "").strip(), fontsize=9.5, after=3)
-
-    featured_projects = (
-        db.query(Project)
-        .filter(Project.user_id == user.id, Project.featured == True)  # noqa: E712
+    featured_projects = (await db.scalars(
+        select(Project)
+        .where(Project.user_id == user.id, Project.featured == True)  # noqa: E712
         .order_by(Project.order, Project.id.desc())
         .limit(4)
-        .all()
-    )
-    if featured_projects:
-        draw_section_title("Selected Projects")
-        for project in featured_projects:
-            draw_text(project.title, fontsize=10.5, bold=True, after=2)
-            draw_text(project.description, fontsize=9.5, color=(0.25, 0.25, 0.25), after=2)
-            links = [v for v in [project.live_url, project.github_link] if v]
-            if links:
-                draw_text(" | ".join(links), fontsize=8.8, color=(0.2, 0.2, 0.2), after=4)
-
-    pdf_bytes = doc.write()
-    doc.close()
+    )).all()
+    inputs = {
+        "display_name": display_name,
+        "cv": cv,
+        "contact": contact,
+        "projects": [
+            {
+                "title": project.title,
+                "description": project.description,
+                "live_url": project.live_url,
+                "github_link": project.github_link,
+            }
+            for project in featured_projects
+        ],
+    }
+    pdf_bytes = await get_cv_pdf(user.id, inputs)
 
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{download_filename}"'},
+        headers={"Content-Disposition": f'attachment; filename="{download_filename}"', **validators},
     )
 
 
-def _get_platform_hero_for_user(db: Session, user_id: int) -> dict:
-    setting = (
-        db.query(SiteSettings)
-        .filter(SiteSettings.user_id == user_id, SiteSettings.key == "platform_hero")
-        .first()
+async def _get_platform_hero_for_user(db: AsyncSession, user_id: int) -> dict:
+    setting = await db.scalar(
+        select(SiteSettings).where(SiteSettings.user_id == user_id, SiteSettings.key == "platform_hero")
     )
     if setting and isinstance(setting.value, dict):
         return setting.value
@@ -885,28 +793,25 @@ def _get_platform_hero_for_user(db: Session, user_id: int) -> dict:
 
 
 @app.get("/api/platform/hero")
-async def get_platform_hero(db: Session = Depends(get_db)):
-    super_admin_user = (
-        db.query(User)
-        .filter(User.super_admin.is_(True))
-        .order_by(User.id.asc())
-        .first()
+async def get_platform_hero(db: AsyncSession = Depends(get_async_db)):
+    super_admin_id = await db.scalar(
+        select(User.id).where(User.super_admin.is_(True)).order_by(User.id.asc()).limit(1)
     )
-    if not super_admin_user:
+    if super_admin_id is None:
         return PLATFORM_HERO_DEFAULT
-    return _get_platform_hero_for_user(db, super_admin_user.id)
+    return await _get_platform_hero_for_user(db, super_admin_id)
 
 
 @app.get("/api/superadmin/platform/hero")
 async def get_super_admin_platform_hero(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_super_admin)
 ):
-    return _get_platform_hero_for_user(db, current_user.id)
+    return await _get_platform_hero_for_user(db, current_user.id)
 
 
 @app.put("/api/superadmin/platform/hero", response_model=SettingResponse)
-async def update_super_admin_platform_hero(
+def update_super_admin_platform_hero(
     data: SettingUpdate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_super_admin)
@@ -923,7 +828,9 @@ async def update_super_admin_platform_hero(
         setting = SiteSettings(key="platform_hero", value=data.value, user_id=current_user.id)
         db.add(setting)
 
+    _touch_public_content(current_user)
     db.commit()
+    _public_content_changed(current_user)
     db.refresh(setting)
     return setting
 
@@ -931,20 +838,22 @@ async def update_super_admin_platform_hero(
 # ============== Admin Projects (Scoped to authenticated user) ==============
 
 @app.post("/api/admin/projects", response_model=ProjectResponse)
-async def create_project(
+def create_project(
     project: ProjectCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     db_project = Project(**project.model_dump(), user_id=current_user.id)
     db.add(db_project)
+    _touch_public_content(current_user)
     db.commit()
+    _public_content_changed(current_user)
     db.refresh(db_project)
     return db_project
 
 
 @app.put("/api/admin/projects/{project_id}", response_model=ProjectResponse)
-async def update_project(
+def update_project(
     project_id: int,
     project: ProjectUpdate,
     db: Session = Depends(get_db),
@@ -962,13 +871,15 @@ async def update_project(
     for field, value in update_data.items():
         setattr(db_project, field, value)
 
+    _touch_public_content(current_user)
     db.commit()
+    _public_content_changed(current_user)
     db.refresh(db_project)
     return db_project
 
 
 @app.delete("/api/admin/projects/{project_id}")
-async def delete_project(
+def delete_project(
     project_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -982,27 +893,31 @@ async def delete_project(
         raise HTTPException(status_code=404, detail="Project not found")
 
     db.delete(db_project)
+    _touch_public_content(current_user)
     db.commit()
+    _public_content_changed(current_user)
     return {"message": "Project deleted"}
 
 
 # ============== Admin Design Work (Scoped to authenticated user) ==============
 
 @app.post("/api/admin/designs", response_model=DesignWorkResponse)
-async def create_design(
+def create_design(
     design: DesignWorkCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     db_design = DesignWork(**design.model_dump(), user_id=current_user.id)
     db.add(db_design)
+    _touch_public_content(current_user)
     db.commit()
+    _public_content_changed(current_user)
     db.refresh(db_design)
     return db_design
 
 
 @app.put("/api/admin/designs/{design_id}", response_model=DesignWorkResponse)
-async def update_design(
+def update_design(
     design_id: int,
     design: DesignWorkUpdate,
     db: Session = Depends(get_db),
@@ -1020,13 +935,15 @@ async def update_design(
     for field, value in update_data.items():
         setattr(db_design, field, value)
 
+    _touch_public_content(current_user)
     db.commit()
+    _public_content_changed(current_user)
     db.refresh(db_design)
     return db_design
 
 
 @app.delete("/api/admin/designs/{design_id}")
-async def delete_design(
+def delete_design(
     design_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -1040,7 +957,9 @@ async def delete_design(
         raise HTTPException(status_code=404, detail="Design work not found")
 
     db.delete(db_design)
+    _touch_public_content(current_user)
     db.commit()
+    _public_content_changed(current_user)
     return {"message": "Design work deleted"}
 
 
@@ -1055,18 +974,33 @@ async def upload_file(
 ):
     allowed_resource_types = {"auto", "image", "video", "raw"}
     safe_resource_type = resource_type if resource_type in allowed_resource_types else "auto"
+    check_upload_size(file.size, safe_resource_type, file.content_type)
 
     try:
-        content = await file.read()
+        sha256, size = await asyncio.to_thread(sha256_file, file.file)
+        cloudinary_url = await asyncio.to_thread(_get_cloudinary_url, db, current_user)
+        storage = "cloudinary" if cloudinary_url else "local"
+        upload_options = cloudinary_options(current_user.id, cloudinary_url) if cloudinary_url else {}
+        existing = await asyncio.to_thread(
+            find_reusable_media, db, current_user.id, sha256, storage, UPLOAD_DIR, upload_options.get("cloud_name")
+        )
+        if existing is not None:
+            response = {"filename": existing.public_id, "url": existing.url, "deduplicated": True}
+            if storage == "local" and existing.resource_type == "image" and existing.width:
+                response["variants"] = variant_urls(sha256, existing.width)
+            return response
 
-        cloudinary_url = _get_cloudinary_url(db, current_user)
         if cloudinary_url:
-            _configure_cloudinary(cloudinary_url)
-            result = cloudinary.uploader.upload(
-                content,
+            result = await asyncio.to_thread(
+                upload_to_cloudinary,
+                file.file,
+                size,
                 folder=f"portfolio/{current_user.username}",
-                resource_type=safe_resource_type
+                resource_type=safe_resource_type,
+                filename=file.filename,
+                **upload_options,
             )
+            await asyncio.to_thread(record_cloudinary_upload, db, current_user.id, sha256, result)
             return {
                 "filename": result["public_id"],
                 "url": result["secure_url"]
@@ -1078,15 +1012,38 @@ async def upload_file(
                 detail="Image hosting not configured. Add a Cloudinary URL in Settings -> Integrations."
             )
 
-        import uuid
-        ext = file.filename.split(".")[-1] if "." in file.filename else ""
-        filename = f"{uuid.uuid4()}.{ext}" if ext else str(uuid.uuid4())
-        filepath = os.path.join(UPLOAD_DIR, filename)
+        ext = safe_extension(file.filename)
+        url = content_url(sha256, ext)
 
-        with open(filepath, "wb") as f:
-            f.write(content)
+        info = image_info(await asyncio.to_thread(read_probe, file.file))
+        public_id = await asyncio.to_thread(
+            store_content,
+            UPLOAD_DIR,
+            sha256,
+            ext,
+            lambda path: save_upload(file.file, path, safe_resource_type, file.content_type),
+        )
+        media = await asyncio.to_thread(
+            record_media,
+            db,
+            user_id=current_user.id,
+            sha256=sha256,
+            storage="local",
+            url=url,
+            public_id=public_id,
+            resource_type=upload_kind(safe_resource_type, file.content_type),
+            size=size,
+            format=info[0] if info else (ext or None),
+            width=info[1] if info else None,
+            height=info[2] if info else None,
+        )
 
-        return {"filename": filename, "url": f"/uploads/{filename}"}
+        response = {"filename": public_id, "url": url}
+        if media.resource_type == "image" and media.width:
+            response["variants"] = variant_urls(sha256, media.width)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
@@ -1100,127 +1057,401 @@ async def list_media(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    cloudinary_url = _get_cloudinary_url(db, current_user)
+    """Page through the tenant's Cloudinary media from the local index.
+
+    The index is built on first use, refreshed in the background once it is
+    older than MEDIA_RECONCILE_INTERVAL, and kept current by our uploads.
+    """
+    cloudinary_url = await asyncio.to_thread(_get_cloudinary_url, db, current_user)
     if not cloudinary_url:
         raise HTTPException(
             status_code=400,
             detail="Cloudinary is not configured. Add your Cloudinary URL in Settings -> Integrations.",
         )
 
-    _configure_cloudinary(cloudinary_url)
-    folder_prefix = f"portfolio/{current_user.username}/"
     page_size = max(1, min(max_results, 100))
     allowed_resource_types = {"image", "video"}
     safe_resource_type = resource_type if resource_type in allowed_resource_types else "image"
 
-    try:
-        result = cloudinary.api.resources(
-            type="upload",
-            resource_type=safe_resource_type,
-            prefix=folder_prefix,
-            max_results=page_size,
-            next_cursor=cursor,
-        )
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to load media library: {str(exc)}")
-
-    resources = []
-    search_term = (search or "").strip().lower()
-    for item in result.get("resources", []):
-        public_id = str(item.get("public_id", ""))
-        filename = public_id.split("/")[-1] if public_id else ""
-        secure_url = item.get("secure_url")
-        if not secure_url:
-            continue
-        if search_term and search_term not in filename.lower() and search_term not in public_id.lower():
-            continue
-        resources.append(
-            {
-                "public_id": public_id,
-                "url": secure_url,
-                "format": item.get("format"),
-                "bytes": item.get("bytes"),
-                "width": item.get("width"),
-                "height": item.get("height"),
-                "created_at": item.get("created_at"),
-                "filename": filename,
-                "resource_type": item.get("resource_type"),
-            }
-        )
+    synced_at = await asyncio.to_thread(last_synced_at, db, current_user.id)
+    if synced_at is None:
+        error = await _reconcile_media(current_user.id)
+        if error:
+            raise HTTPException(status_code=500, detail=f"Failed to load media library: {error}")
+    elif _media_index_is_stale(synced_at):
+        _reconcile_media(current_user.id)
+
+    rows, next_cursor = await asyncio.to_thread(
+        list_media_page,
+        db,
+        current_user.id,
+        storage="cloudinary",
+        resource_type=safe_resource_type,
+        limit=page_size,
+        cursor=cursor,
+        search=(search or "").strip(),
+    )
+    resources = [
+        {
+            "public_id": media.public_id,
+            "url": media.url,
+            "format": media.format,
+            "bytes": media.bytes,
+            "width": media.width,
+            "height": media.height,
+            "created_at": media.created_at.isoformat() if media.created_at else None,
+            "filename": media.public_id.split("/")[-1],
+            "resource_type": media.resource_type,
+        }
+        for media in rows
+    ]
 
     return {
         "resources": resources,
-        "next_cursor": result.get("next_cursor"),
+        "next_cursor": next_cursor,
     }
 
 
 # ============== PDF Processing ==============
 
+PDF_PREVIEW_FORMATS = {"png", "jpeg", "jpg", "webp"}
+
+
+def _preview_entry(item: dict, delivery: str) -> dict:
+    """Page dict for a rendered preview, as a data URI or a short-lived URL."""
+    import base64
+
+    if delivery == "url":
+        preview = store_preview_image(item["content"], item["ext"])
+    else:
+        b64 = base64.b64encode(item["content"]).decode("utf-8")
+        preview = f"data:{MEDIA_TYPES[item['ext']]};base64,{b64}"
+    return {
+        "page": item["page"],
+        "preview": preview,
+        "width": item["width"],
+        "height": item["height"]
+    }
+
+
+async def _stream_preview(pdf_path: str, meta: dict, render_options: dict, delivery: str):
+    """NDJSON lines: one `meta` line, then a `page` or `error` line per page as
+    it finishes rendering, then `done`."""
+    def line(payload: dict) -> bytes:
+        return (json.dumps(payload) + "\n").encode("utf-8")
+
+    yield line({"type": "meta", **meta})
+    try:
+        page_numbers = [p["page"] for p in meta["pages"]]
+        async for item in render_pool.render_iter(pdf_path, page_numbers, **render_options):
+            if "error" in item:
+                yield line({"type": "error", "page": item["page"], "error": item["error"]})
+            else:
+                yield line({"type": "page", **_preview_entry(item, delivery)})
+    except HTTPException as e:
+        yield line({"type": "error", "page": None, "error": e.detail})
+    yield line({"type": "done"})
+
+
+async def _open_pdf_session(file: UploadFile | None, session_id: str | None, user: User) -> dict:
+    """Resolve the PDF for a request: a new upload, or an existing session."""
+    if file is not None:
+        return await pdf_sessions.create(user.id, file.file)
+    if session_id:
+        return pdf_sessions.get(session_id, user.id)
+    raise HTTPException(status_code=400, detail="Upload a PDF file or pass a session_id")
+
+
 @app.post("/api/admin/pdf/preview")
 async def preview_pdf(
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    session_id: str | None = Form(None),
+    stream: bool = Form(False),
+    image_format: str = Form("png"),
+    delivery: str = Form("inline"),
+    max_dim: int | None = Form(None),
     current_user: User = Depends(get_current_user)
 ):
-    """Upload PDF and get page count + thumbnail previews"""
+    """Upload PDF and get page count + thumbnail previews.
+
+    The upload is kept as a PDF session; pass the returned `session_id` to
+    preview or extract again without re-uploading. `stream=true` returns
+    NDJSON (page metadata first, then each page as soon as it is rendered).
+    `image_format` picks png, jpeg or webp thumbnails and `delivery=url`
+    returns short-lived image URLs instead of data URIs.
+    """
     import fitz  # PyMuPDF
-    import base64
-
-    tmp_path = None
-    doc = None
+    from pdf_render import page_scale
+
+    image_format = image_format.lower()
+    if image_format not in PDF_PREVIEW_FORMATS:
+        raise HTTPException(status_code=400, detail="image_format must be png, jpeg or webp")
+    if delivery not in ("inline", "url"):
+        raise HTTPException(status_code=400, detail="delivery must be inline or url")
+    if max_dim is not None and not 1 <= max_dim <= PDF_PREVIEW_MAX_DIM:
+        raise HTTPException(status_code=400, detail=f"max_dim must be between 1 and {PDF_PREVIEW_MAX_DIM}")
+
+    render_options = {
+        "dpi": PDF_PREVIEW_DPI,
+        "max_dim": max_dim,
+        "fmt": image_format,
+        "quality": PDF_PREVIEW_QUALITY if image_format != "png" else None,
+    }
+    session = await _open_pdf_session(file, session_id, current_user)
+    pdf_path = session["path"]
+    total_pages = session["page_count"]
+    preview_count = min(total_pages, PDF_PREVIEW_MAX_PAGES)
 
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
+        if stream:
+            with fitz.open(pdf_path) as doc:
+                page_sizes = []
+                for page_num in range(preview_count):
+                    rect = doc[page_num].rect
+                    scale = page_scale(rect.width, rect.height, PDF_PREVIEW_DPI, max_dim)
+                    page_sizes.append({"page": page_num, "width": rect.width * scale, "height": rect.height * scale})
+            meta = {
+                "session_id": session["id"],
+                "page_count": total_pages,
+                "preview_count": preview_count,
+                "truncated": total_pages > preview_count,
+                "pages": page_sizes,
+            }
+            return StreamingResponse(
+                _stream_preview(pdf_path, meta, render_options, delivery),
+                media_type="application/x-ndjson",
+                headers={"Cache-Control": "no-store"},
+            )
 
-        doc = fitz.open(tmp_path)
+        rendered = await render_pool.render(pdf_path, list(range(preview_count)), **render_options)
         pages = []
-        total_pages = len(doc)
-        preview_count = min(total_pages, PDF_PREVIEW_MAX_PAGES)
-
-        for page_num in range(preview_count):
-            page = doc[page_num]
-            pix = page.get_pixmap(
-                matrix=fitz.Matrix(PDF_PREVIEW_DPI / 72, PDF_PREVIEW_DPI / 72),
-                alpha=False
-            )
-            img_bytes = pix.tobytes("png")
-            del pix
-            b64 = base64.b64encode(img_bytes).decode("utf-8")
-            pages.append({
-                "page": page_num,
-                "preview": f"data:image/png;base64,{b64}",
-                "width": page.rect.width * (PDF_PREVIEW_DPI / 72),
-                "height": page.rect.height * (PDF_PREVIEW_DPI / 72)
-            })
+        for item in rendered:
+            if "error" in item:
+                raise RuntimeError(item["error"])
+            pages.append(_preview_entry(item, delivery))
 
         return {
+            "session_id": session["id"],
             "page_count": total_pages,
             "pages": pages,
             "preview_count": len(pages),
             "truncated": total_pages > len(pages)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to process PDF: {str(e)}")
+
+
+@app.delete("/api/admin/pdf/sessions/{session_id}")
+async def delete_pdf_session(session_id: str, current_user: User = Depends(get_current_user)):
+    """Discard a stored PDF before its session expires."""
+    pdf_sessions.delete(session_id, current_user.id)
+    return {"message": "PDF session deleted"}
+
+
+@app.get("/api/pdf/preview-images/{token}")
+async def get_pdf_preview_image(token: str):
+    """Serve a preview page stored by preview_pdf with delivery=url."""
+    entry = get_preview_image(token)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Preview expired or not found")
+    content, media_type = entry
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Cache-Control": f"private, max-age={PDF_PREVIEW_URL_TTL}"},
+    )
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+async def _extract_pipeline(pdf_path: str, page_numbers: list[int], store_image):
+    """
+    Render pages in the process pool and hand each one to the async
+    `store_image` as soon as it is ready, so uploads overlap with rendering.
+    At most PDF_EXTRACT_UPLOAD_CONCURRENCY uploads run at a time. Yields one
+    result per page in completion order, each with per-page timings.
+    """
+    results: asyncio.Queue[dict] = asyncio.Queue()
+    semaphore = asyncio.Semaphore(PDF_EXTRACT_UPLOAD_CONCURRENCY)
+    uploads: set[asyncio.Task] = set()
+
+    async def upload(item: dict) -> None:
+        queued = time.perf_counter()
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                url = await store_image(item)
+                result = {"page": item["page"], "url": url}
+            except Exception as e:
+                result = {"page": item["page"], "error": str(e)}
+        result["timings"] = {
+            "render_ms": item["render_ms"],
+            "upload_wait_ms": round((started - queued) * 1000, 1),
+            "upload_ms": _elapsed_ms(started),
+        }
+        results.put_nowait(result)
+
+    async def render() -> None:
+        try:
+            async for item in render_pool.render_iter(
+                pdf_path,
+                page_numbers,
+                dpi=PDF_EXTRACT_DPI,
+                max_dim=PDF_EXTRACT_MAX_DIM,
+                fmt=PDF_EXTRACT_FORMAT,
+                quality=PDF_EXTRACT_QUALITY,
+            ):
+                if "error" in item:
+                    results.put_nowait({"page": item["page"], "error": item["error"]})
+                else:
+                    task = asyncio.create_task(upload(item))
+                    uploads.add(task)
+                    task.add_done_callback(uploads.discard)
+        except Exception as e:
+            results.put_nowait({"fatal": e})
+
+    render_task = asyncio.create_task(render())
+    try:
+        for _ in page_numbers:
+            result = await results.get()
+            if "fatal" in result:
+                raise result["fatal"]
+            yield result
     finally:
-        if doc is not None:
-            doc.close()
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
+        render_task.cancel()
+        for task in list(uploads):
+            task.cancel()
+
+
+def _image_store(db: Session, user: User):
+    """
+    The async store_image for _extract_pipeline: uploads a rendered page to
+    the user's image host, reusing an identical earlier upload.
+
+    Queries the integrations setting; call it through asyncio.to_thread.
+    """
+    cloudinary_url = _get_cloudinary_url(db, user)
+    use_local_uploads = ALLOW_LOCAL_UPLOADS
+    if not cloudinary_url and not use_local_uploads:
+        raise HTTPException(
+            status_code=400,
+            detail="Image hosting not configured. Add a Cloudinary URL in Settings -> Integrations."
+        )
+
+    storage = "cloudinary" if cloudinary_url else "local"
+    upload_options = {}
+    if cloudinary_url:
+        try:
+            upload_options = cloudinary_options(user.id, cloudinary_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    folder = f"portfolio/{user.username}"
+
+    def write_local(sha256: str, ext: str, content: bytes) -> str:
+        def write(path: str) -> None:
+            with open(path, "wb") as f:
+                f.write(content)
+        return store_content(UPLOAD_DIR, sha256, ext, write)
+
+    # Pages are stored concurrently, but the caller's Session must only be
+    # used by one thread at a time.
+    registry_lock = asyncio.Lock()
+
+    async def registry(fn, *args, **kwargs):
+        async with registry_lock:
+            return await asyncio.to_thread(fn, db, *args, **kwargs)
+
+    async def store_image(item: dict) -> str:
+        content = item["content"]
+        sha256 = sha256_bytes(content)
+        existing = await registry(find_reusable_media, user.id, sha256, storage, UPLOAD_DIR, upload_options.get("cloud_name"))
+        if existing is not None:
+            return existing.url
+        if cloudinary_url:
+            result = await asyncio.to_thread(
+                upload_to_cloudinary,
+                io.BytesIO(content),
+                len(content),
+                folder=folder,
+                resource_type="image",
+                **upload_options,
+            )
+            return (await registry(record_cloudinary_upload, user.id, sha256, result)).url
+        public_id = await asyncio.to_thread(write_local, sha256, item["ext"], content)
+        media = await registry(
+            record_media,
+            user_id=user.id,
+            sha256=sha256,
+            storage="local",
+            url=content_url(sha256, item["ext"]),
+            public_id=public_id,
+            resource_type="image",
+            size=len(content),
+            format=item["ext"],
+            width=round(item["width"]),
+            height=round(item["height"]),
+        )
+        return media.url
+
+    return store_image
+
+
+def _split_pages(page_numbers: list[int], total_pages: int) -> tuple[list[dict], list[int]]:
+    """(errors for pages outside the document, pages inside it)."""
+    out_of_range = [
+        {"page": page_num, "error": "Page number out of range"}
+        for page_num in page_numbers
+        if page_num < 0 or page_num >= total_pages
+    ]
+    return out_of_range, [page_num for page_num in page_numbers if 0 <= page_num < total_pages]
+
+
+async def _collect_extract(results, page_numbers: list[int], out_of_range: list[dict], started: float, progress=None) -> dict:
+    """Gather _extract_pipeline results into the non-streaming extract response."""
+    extracted_images = []
+    failed_pages = list(out_of_range)
+    async for result in results:
+        if "url" in result:
+            extracted_images.append(result)
+        else:
+            failed_pages.append(result)
+        if progress is not None:
+            done = len(extracted_images) + len(failed_pages)
+            await progress(100 * done / len(page_numbers), f"{done}/{len(page_numbers)} pages")
+
+    extracted_images.sort(key=lambda i: i["page"])
+    failed_pages.sort(key=lambda f: f["page"])
+    return {
+        "images": extracted_images,
+        "failed": failed_pages,
+        "total_requested": len(page_numbers),
+        "total_extracted": len(extracted_images),
+        "elapsed_ms": _elapsed_ms(started),
+    }
 
 
 @app.post("/api/admin/pdf/extract")
 async def extract_pdf_pages(
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    session_id: str | None = Form(None),
     pages: str = Form(""),
+    stream: bool = Form(False),
+    background: bool = Form(False),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Extract selected pages from PDF as high-quality images."""
-    import fitz  # PyMuPDF
-    import uuid
+    """Extract selected pages from PDF as high-quality images.
 
+    Accepts either the PDF itself or a `session_id` returned by preview.
+    `stream=true` returns NDJSON with an `image` or `error` line per page as
+    it finishes, then a `done` line with the totals. `background=true` queues
+    a `pdf_extract` job and answers 202 with its status instead.
+    """
     page_numbers = [int(p.strip()) for p in pages.split(",") if p.strip().isdigit()]
     page_numbers = sorted(set(page_numbers))
 
@@ -1232,158 +1463,143 @@ async def extract_pdf_pages(
             detail=f"Too many pages requested. Limit is {PDF_EXTRACT_MAX_PAGES} pages per extract."
         )
 
-    tmp_path = None
-    doc = None
+    session = await _open_pdf_session(file, session_id, current_user)
+    store_image = await asyncio.to_thread(_image_store, db, current_user)
+    if background:
+        job = await asyncio.to_thread(
+            enqueue, db, current_user.id, "pdf_extract", {"session_id": session["id"], "pages": page_numbers}
+        )
+        return JSONResponse(status_code=202, content=job_status(job))
 
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
+    started = time.perf_counter()
+    out_of_range, in_range = _split_pages(page_numbers, session["page_count"])
+    results = _extract_pipeline(session["path"], in_range, store_image)
 
-        doc = fitz.open(tmp_path)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to open PDF: {str(e)}")
+    if stream:
+        async def lines():
+            def line(payload: dict) -> bytes:
+                return (json.dumps(payload) + "\n").encode("utf-8")
 
-    extracted_images = []
-    failed_pages = []
-    cloudinary_url = _get_cloudinary_url(db, current_user)
-    use_local_uploads = ALLOW_LOCAL_UPLOADS
-    if not cloudinary_url and not use_local_uploads:
-        raise HTTPException(
-            status_code=400,
-            detail="Image hosting not configured. Add a Cloudinary URL in Settings -> Integrations."
-        )
+            extracted = 0
+            for failed in out_of_range:
+                yield line({"type": "error", **failed})
+            try:
+                async for result in results:
+                    if "url" in result:
+                        extracted += 1
+                        yield line({"type": "image", **result})
+                    else:
+                        yield line({"type": "error", **result})
+            except HTTPException as e:
+                yield line({"type": "error", "page": None, "error": e.detail})
+            yield line({
+                "type": "done",
+                "total_requested": len(page_numbers),
+                "total_extracted": extracted,
+                "elapsed_ms": _elapsed_ms(started),
+            })
 
-    for page_num in page_numbers:
-        if page_num < 0 or page_num >= len(doc):
-            failed_pages.append({"page": page_num, "error": "Page number out of range"})
-            continue
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Cache-Control": "no-store"})
 
-        try:
-            page = doc[page_num]
-            base_scale = PDF_EXTRACT_DPI / 72
-            max_side = max(page.rect.width, page.rect.height)
-            if max_side > 0:
-                scale_cap = PDF_EXTRACT_MAX_DIM / max_side
-                scale = min(base_scale, scale_cap)
-            else:
-                scale = base_scale
+    return await _collect_extract(results, page_numbers, out_of_range, started)
 
-            pix = page.get_pixmap(
-                matrix=fitz.Matrix(scale, scale),
-                alpha=False
-            )
-            if PDF_EXTRACT_FORMAT in ("jpg", "jpeg"):
-                try:
-                    img_bytes = pix.tobytes("jpg", quality=PDF_EXTRACT_QUALITY)
-                except TypeError:
-                    img_bytes = pix.tobytes("jpg")
-                file_ext = "jpg"
-            else:
-                img_bytes = pix.tobytes("png")
-                file_ext = "png"
-            del pix
-
-            if cloudinary_url:
-                _configure_cloudinary(cloudinary_url)
-                result = cloudinary.uploader.upload(
-                    img_bytes,
-                    folder=f"portfolio/{current_user.username}",
-                    resource_type="image"
-                )
-                extracted_images.append({
-                    "page": page_num,
-                    "url": result["secure_url"]
-                })
-            elif use_local_uploads:
-                filename = f"{uuid.uuid4()}.{file_ext}"
-                filepath = os.path.join(UPLOAD_DIR, filename)
-                with open(filepath, "wb") as f:
-                    f.write(img_bytes)
-                extracted_images.append({
-                    "page": page_num,
-                    "url": f"/uploads/{filename}"
-                })
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Image hosting not configured. Add a Cloudinary URL in Settings -> Integrations."
-                )
-        except Exception as e:
-            failed_pages.append({"page": page_num, "error": str(e)})
 
-    try:
-        return {
-            "images": extracted_images,
-            "failed": failed_pages,
-            "total_requested": len(page_numbers),
-            "total_extracted": len(extracted_images)
-        }
-    finally:
-        if doc is not None:
-            doc.close()
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
+@job_type("pdf_extract", concurrency=2)
+async def _run_extract_job(ctx: JobContext) -> dict:
+    user = await asyncio.to_thread(ctx.db.get, User, ctx.user_id)
+    session = pdf_sessions.get(ctx.payload.get("session_id"), ctx.user_id)
+    page_numbers = sorted({int(p) for p in ctx.payload.get("pages") or []})
+    if not page_numbers or len(page_numbers) > PDF_EXTRACT_MAX_PAGES:
+        raise HTTPException(status_code=400, detail=f"Pass between 1 and {PDF_EXTRACT_MAX_PAGES} pages")
+    store_image = await asyncio.to_thread(_image_store, ctx.db, user)
+    started = time.perf_counter()
+    out_of_range, in_range = _split_pages(page_numbers, session["page_count"])
+    results = _extract_pipeline(session["path"], in_range, store_image)
+    return await _collect_extract(results, page_numbers, out_of_range, started, ctx.progress)
 
 
 # ============== Project Screenshot ==============
 
+def _screenshot_key(db: Session, user: User) -> str:
+    access_key = _get_screenshotone_key(db, user)
+    if not access_key:
+        raise HTTPException(
+            status_code=400,
+            detail="Screenshot service not configured. Add a ScreenshotOne access key in Settings -> Integrations."
+        )
+    return access_key
+
+
 @app.post("/api/admin/projects/screenshot")
 async def capture_project_screenshot(
     url: str = Form(...),
+    viewport_width: int | None = Form(None),
+    viewport_height: int | None = Form(None),
+    full_page: bool | None = Form(None),
+    refresh: bool = Form(False),
+    background: bool = Form(False),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Capture a screenshot of a live URL using ScreenshotOne API."""
-    url = url.strip()
-    if not url:
+    """
+    Capture a screenshot of a live URL using ScreenshotOne API.
+
+    Captures are cached per URL and viewport (see screenshots.py); pass
+    `refresh=true` to take a new one. X-Screenshot-Cache says which it was.
+    `background=true` queues a `screenshot` job instead; its result links to
+    the cached image.
+    """
+    if not url.strip():
         raise HTTPException(status_code=400, detail="URL is required")
-    if not url.startswith(("http://", "https://")):
-        url = f"https://{url}"
+    url = normalize_url(url)
+    access_key = await asyncio.to_thread(_screenshot_key, db, current_user)
+    options = screenshot_options(viewport_width, viewport_height, full_page)
 
-    screenshotone_access_key = _get_screenshotone_key(db, current_user)
-    if not screenshotone_access_key:
-        raise HTTPException(
-            status_code=400,
-            detail="Screenshot service not configured. Add a ScreenshotOne access key in Settings -> Integrations."
+    if background:
+        job = await asyncio.to_thread(
+            enqueue, db, current_user.id, "screenshot", {"url": url, "options": options, "refresh": refresh}
         )
+        return JSONResponse(status_code=202, content=job_status(job))
 
-    try:
-        params = {
-            "access_key": screenshotone_access_key,
-            "url": url,
-            "viewport_width": 1280,
-            "viewport_height": 720,
-            "full_page": "true",
-            "format": "png",
-            "block_ads": "true",
-            "block_cookie_banners": "true",
-            "delay": 2,
-        }
-        api_url = f"https://api.screenshotone.com/take?{urlencode(params)}"
+    content, cached = await screenshot_cache.get_or_capture(
+        current_user.id, access_key, url, options, refresh=refresh
+    )
+    return Response(
+        content=content,
+        media_type="image/png",
+        headers={"X-Screenshot-Cache": "hit" if cached else "miss"},
+    )
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(api_url)
 
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Screenshot API error: {response.text}"
-                )
+@app.get("/api/admin/projects/screenshot/{key}")
+async def get_cached_screenshot(key: str, current_user: User = Depends(get_current_user)):
+    """Serve a capture from the screenshot cache, e.g. the result of a screenshot job."""
+    content = await screenshot_cache.get(key, current_user.id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Screenshot expired or not found")
+    return Response(content=content, media_type="image/png", headers={"Cache-Control": "private, no-cache"})
 
-            return Response(content=response.content, media_type="image/png")
-    except httpx.TimeoutException:
-        raise HTTPException(status_code=408, detail="Screenshot request timed out")
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to capture screenshot: {str(e)}")
+
+@job_type("screenshot", concurrency=2, max_attempts=2)
+async def _run_screenshot_job(ctx: JobContext) -> dict:
+    user = await asyncio.to_thread(ctx.db.get, User, ctx.user_id)
+    url = normalize_url(str(ctx.payload.get("url") or ""))
+    requested = ctx.payload.get("options") or {}
+    options = screenshot_options(
+        requested.get("viewport_width"), requested.get("viewport_height"), requested.get("full_page")
+    )
+    access_key = await asyncio.to_thread(_screenshot_key, ctx.db, user)
+    _, cached = await screenshot_cache.get_or_capture(
+        ctx.user_id, access_key, url, options, refresh=bool(ctx.payload.get("refresh"))
+    )
+    key = screenshot_cache.cache_key(ctx.user_id, url, options)
+    return {"url": url, "options": options, "cached": cached, "image_url": f"/api/admin/projects/screenshot/{key}"}
 
 
 # ============== Admin Site Settings (Scoped to authenticated user) ==============
 
 @app.get("/api/admin/settings", response_model=AllSettingsResponse)
-async def get_admin_settings(
+def get_admin_settings(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -1395,7 +1611,7 @@ async def get_admin_settings(
 
 
 @app.put("/api/admin/settings/{key}", response_model=SettingResponse)
-async def update_setting(
+def update_setting(
     key: str,
     data: SettingUpdate,
     db: Session = Depends(get_db),
@@ -1413,13 +1629,18 @@ async def update_setting(
         setting = SiteSettings(key=key, value=data.value, user_id=current_user.id)
         db.add(setting)
 
+    _touch_public_content(current_user)
     db.commit()
+    if key == "integrations":
+        invalidate_integration_settings(current_user.id, db)
+        invalidate_cloudinary(current_user.id)
+    _public_content_changed(current_user)
     db.refresh(setting)
     return setting
 
 
 @app.delete("/api/admin/settings/{key}")
-async def delete_setting(
+def delete_setting(
     key: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -1433,7 +1654,12 @@ async def delete_setting(
         raise HTTPException(status_code=404, detail="Setting not found")
 
     db.delete(setting)
+    _touch_public_content(current_user)
     db.commit()
+    if key == "integrations":
+        invalidate_integration_settings(current_user.id, db)
+        invalidate_cloudinary(current_user.id)
+    _public_content_changed(current_user)
     return {"message": "Setting deleted"}
 
 
@@ -1450,7 +1676,7 @@ async def add_domain_to_vercel(domain: str) -> dict:
     if not VERCEL_TOKEN or not VERCEL_PROJECT_ID:
         return {"ok": False, "error": "Vercel integration not configured"}
 
-    url = f"https://api.vercel.com/v10/projects/{VERCEL_PROJECT_ID}/domains"
+    url = f"/v10/projects/{VERCEL_PROJECT_ID}/domains"
     if VERCEL_TEAM_ID:
         url += f"?teamId={VERCEL_TEAM_ID}"
 
@@ -1460,20 +1686,18 @@ async def add_domain_to_vercel(domain: str) -> dict:
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                headers=headers,
-                json={"name": domain},
-                timeout=30.0,
-            )
-            if response.status_code in (200, 201):
-                return {"ok": True, "data": response.json()}
-            elif response.status_code == 409:
-                # Domain already exists
-                return {"ok": True, "data": {"name": domain, "already_exists": True}}
-            else:
-                return {"ok": False, "error": response.text, "status": response.status_code}
+        response = await get_client("vercel").post(
+            url,
+            headers=headers,
+            json={"name": domain},
+        )
+        if response.status_code in (200, 201):
+            return {"ok": True, "data": response.json()}
+        elif response.status_code == 409:
+            # Domain already exists
+            return {"ok": True, "data": {"name": domain, "already_exists": True}}
+        else:
+            return {"ok": False, "error": response.text, "status": response.status_code}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
@@ -1483,7 +1707,7 @@ async def remove_domain_from_vercel(domain: str) -> dict:
     if not VERCEL_TOKEN or not VERCEL_PROJECT_ID:
         return {"ok": False, "error": "Vercel integration not configured"}
 
-    url = f"https://api.vercel.com/v10/projects/{VERCEL_PROJECT_ID}/domains/{domain}"
+    url = f"/v10/projects/{VERCEL_PROJECT_ID}/domains/{domain}"
     if VERCEL_TEAM_ID:
         url += f"?teamId={VERCEL_TEAM_ID}"
 
@@ -1492,43 +1716,50 @@ async def remove_domain_from_vercel(domain: str) -> dict:
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(url, headers=headers, timeout=30.0)
-            if response.status_code in (200, 204):
-                return {"ok": True}
-            elif response.status_code == 404:
-                # Domain doesn't exist, that's fine
-                return {"ok": True}
-            else:
-                return {"ok": False, "error": response.text, "status": response.status_code}
+        response = await get_client("vercel").delete(url, headers=headers)
+        if response.status_code in (200, 204):
+            return {"ok": True}
+        elif response.status_code == 404:
+            # Domain doesn't exist, that's fine
+            return {"ok": True}
+        else:
+            return {"ok": False, "error": response.text, "status": response.status_code}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 
-@app.put("/api/admin/domain")
-async def set_custom_domain(
-    domain: str = Form(""),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def _domain_in_use(db: Session, user: User, domain: str) -> bool:
+    return db.query(User.id).filter(User.custom_domain == domain, User.id != user.id).first() is not None
+
+
+def _save_custom_domain(db: Session, user: User, domain: str | None, old_domain: str | None) -> None:
+    user.custom_domain = domain
+    _touch_public_content(user)
+    db.commit()
+    _public_content_changed(user, old_domain, domain)
+    # Saving the same domain again is how users ask for a re-check after
+    # fixing their DNS, so the stored result is dropped either way.
+    forget_domain_status(db, user.id)
+
+
+async def _apply_custom_domain(db: Session, user: User, domain: str) -> dict:
+    """Register `domain` with Vercel and save it for `user`; an empty domain clears it.
+
+    Only the Vercel calls run on the event loop; database work goes to a thread.
+    """
     domain = domain.strip().lower()
-    old_domain = current_user.custom_domain
+    old_domain = await asyncio.to_thread(getattr, user, "custom_domain")
 
     if not domain:
         # Clear custom domain
         if old_domain:
             # Remove from Vercel
             await remove_domain_from_vercel(old_domain)
-        current_user.custom_domain = None
-        db.commit()
+        await asyncio.to_thread(_save_custom_domain, db, user, None, old_domain)
         return {"message": "Custom domain cleared", "custom_domain": None}
 
     # Check if domain is already taken
-    existing = db.query(User).filter(
-        User.custom_domain == domain,
-        User.id != current_user.id
-    ).first()
-    if existing:
+    if await asyncio.to_thread(_domain_in_use, db, user, domain):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="This domain is already in use by another user."
@@ -1549,105 +1780,120 @@ async def set_custom_domain(
     if old_domain and old_domain != domain:
         await remove_domain_from_vercel(old_domain)
 
-    current_user.custom_domain = domain
-    db.commit()
+    await asyncio.to_thread(_save_custom_domain, db, user, domain, old_domain)
     return {"message": "Custom domain set", "custom_domain": domain}
 
 
+@app.put("/api/admin/domain")
+async def set_custom_domain(
+    domain: str = Form(""),
+    background: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """`background=true` queues a `custom_domain` job and answers 202 with its status."""
+    if background:
+        job = await asyncio.to_thread(enqueue, db, current_user.id, "custom_domain", {"domain": domain})
+        return JSONResponse(status_code=202, content=job_status(job))
+    return await _apply_custom_domain(db, current_user, domain)
+
+
+@job_type("custom_domain", concurrency=1, max_attempts=4, retry_delay=10.0)
+async def _run_custom_domain_job(ctx: JobContext) -> dict:
+    user = await asyncio.to_thread(ctx.db.get, User, ctx.user_id)
+    return await _apply_custom_domain(ctx.db, user, ctx.payload.get("domain") or "")
+
+
 @app.get("/api/admin/domain/status")
 async def get_domain_status(
+    refresh: bool = Query(False),
+    background: bool = Query(False),
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    domain = (current_user.custom_domain or "").strip()
+    """
+    The stored verification result for the user's domain, with `checked_at`.
+
+    The domain sweeper keeps it current; the first request after the domain
+    is saved, or `refresh=true`, checks it now. `background=true` queues that check as
+    a `domain_status` job and answers 202 with the job's status.
+    """
+    domain = (await asyncio.to_thread(getattr, current_user, "custom_domain") or "").strip()
+    if not domain:
+        return {"status": "not_set", "domain": None}
+    row = None if refresh else await asyncio.to_thread(get_domain_status_row, db, current_user.id, domain)
+    if row is not None:
+        return domain_status_response(row)
+    if background:
+        job = await asyncio.to_thread(enqueue, db, current_user.id, "domain_status", {})
+        return JSONResponse(status_code=202, content=job_status(job))
+    return domain_status_response(await refresh_domain_status(db, current_user.id, domain))
+
+
+@job_type("domain_status", concurrency=4, max_attempts=2)
+async def _run_domain_status_job(ctx: JobContext) -> dict:
+    user = await asyncio.to_thread(ctx.db.get, User, ctx.user_id)
+    domain = (user.custom_domain or "").strip()
     if not domain:
         return {"status": "not_set", "domain": None}
+    return domain_status_response(await refresh_domain_status(ctx.db, ctx.user_id, domain))
 
-    expected_cname = os.getenv("DOMAIN_CHECK_CNAME", "").strip().lower().rstrip(".")
-    expected_a = os.getenv("DOMAIN_CHECK_A", "").strip()
-    expected_ns = [
-        value.strip().lower().rstrip(".")
-        for value in os.getenv("DOMAIN_CHECK_NS", "").split(",")
-        if value.strip()
-    ]
 
-    if not expected_cname and not expected_a and not expected_ns:
-        return {"status": "unconfigured", "domain": domain}
-
-    result = {
-        "status": "not_verified",
-        "domain": domain,
-        "expected_cname": expected_cname or None,
-        "expected_a": expected_a or None,
-        "expected_ns": expected_ns,
-        "found_cname": None,
-        "found_a": [],
-        "found_ns": [],
-        "site_status": "unchecked",
-        "site_checks": {
-            "https": None,
-            "http": None,
-        },
-    }
+async def _domain_sweep_loop() -> None:
+    while True:
+        try:
+            await sweep_domains()
+        except Exception:
+            logger.exception("Domain sweep failed")
+        await asyncio.sleep(DOMAIN_SWEEP_INTERVAL)
 
-    try:
-        cname_answers = dns.resolver.resolve(domain, "CNAME")
-        cnames = [str(r.target).rstrip(".").lower() for r in cname_answers]
-        result["found_cname"] = cnames[0] if cnames else None
-    except Exception:
-        result["found_cname"] = None
 
-    try:
-        a_answers = dns.resolver.resolve(domain, "A")
-        result["found_a"] = [str(r.address) for r in a_answers]
-    except Exception:
-        result["found_a"] = []
-
-    def _resolve_ns_records(host: str) -> list[str]:
-        labels = host.strip(".").split(".")
-        for i in range(len(labels)):
-            candidate = ".".join(labels[i:])
-            if not candidate:
-                continue
-            try:
-                ns_answers = dns.resolver.resolve(candidate, "NS")
-                records = sorted({str(r.target).rstrip(".").lower() for r in ns_answers})
-                if records:
-                    return records
-            except Exception:
-                continue
-        return []
-
-    result["found_ns"] = _resolve_ns_records(domain)
-
-    cname_ok = expected_cname and result["found_cname"] == expected_cname
-    a_ok = expected_a and expected_a in result["found_a"]
-    ns_ok = bool(expected_ns) and all(ns in result["found_ns"] for ns in expected_ns)
-
-    if cname_ok or a_ok or ns_ok:
-        result["status"] = "verified"
-
-        reachable = False
-        async with httpx.AsyncClient(timeout=5.0, follow_redirects=True) as client:
-            for scheme in ("https", "http"):
-                url = f"{scheme}://{domain}"
-                try:
-                    response = await client.get(
-                        url,
-                        headers={"User-Agent": "folio-domain-check/1.0"},
-                    )
-                    ok = response.status_code < 500
-                    result["site_checks"][scheme] = {
-                        "ok": ok,
-                        "status_code": response.status_code,
-                    }
-                    if ok:
-                        reachable = True
-                except Exception as exc:
-                    result["site_checks"][scheme] = {
-                        "ok": False,
-                        "error": exc.__class__.__name__,
-                    }
-
-        result["site_status"] = "reachable" if reachable else "propagating"
+# ============== Background Jobs ==============
+
+@app.post("/api/admin/jobs", status_code=202)
+def submit_job(
+    job: JobSubmit,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a job of a registered type; poll its status_url for progress."""
+    return job_status(enqueue(db, current_user.id, job.type, job.payload))
+
+
+@app.get("/api/admin/jobs")
+def list_jobs(
+    status_filter: str | None = Query(None, alias="status"),
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    query = db.query(Job).filter(Job.user_id == current_user.id)
+    if status_filter:
+        query = query.filter(Job.status == status_filter)
+    jobs = query.order_by(Job.created_at.desc()).limit(min(max(limit, 1), 100)).all()
+    return {"jobs": [job_status(job) for job in jobs]}
+
+
+@app.get("/api/admin/jobs/{job_id}")
+def get_job_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return job_status(get_job(db, job_id, current_user.id))
+
+
+@app.get("/api/admin/jobs/{job_id}/result")
+def get_job_result(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The job's result once it succeeded; 202 with its status while it is pending."""
+    job = get_job(db, job_id, current_user.id)
+    if job.status == "succeeded":
+        return job.result
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=job.error or "Job failed")
+    return JSONResponse(status_code=202, content=job_status(job))
 
-    return result
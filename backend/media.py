@@ -0,0 +1,344 @@
+"""
+Content-addressed media registry and media library index.
+
+Every file stored through our upload paths is recorded in the `media` table,
+keyed by (user, SHA-256 of the content, storage backend). Before uploading,
+callers hash the bytes and look them up; a hit returns the stored URL without
+sending anything upstream, unless the local file is gone or the asset is in a
+Cloudinary account the tenant no longer uses. Rows also keep size, format and pixel dimensions
+so other endpoints can use them without re-probing the file.
+
+The same table backs the admin media library. reconcile_cloudinary() pulls
+in files that reached the tenant's Cloudinary folder some other way and drops
+rows for files deleted there; list_media_page() then pages and searches the
+index with keyset pagination instead of calling the Admin API per request.
+"""
+import base64
+import hashlib
+import json
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from db_models import Media, MediaSync
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+# Enough of the file to find dimensions in PNG/GIF/WebP headers and in most
+# JPEGs (EXIF blocks come before the SOF marker).
+_PROBE_BYTES = 256 * 1024
+_RECONCILE_GRACE = timedelta(minutes=5)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; every timestamp stored here is UTC.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def sha256_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def sha256_file(fileobj) -> tuple[str, int]:
+    """Hash a file object in chunks; returns (hex digest, size) and rewinds it."""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while chunk := fileobj.read(_HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def read_probe(fileobj) -> bytes:
+    """Read the leading bytes used by image_info() and rewind."""
+    fileobj.seek(0)
+    head = fileobj.read(_PROBE_BYTES)
+    fileobj.seek(0)
+    return head
+
+
+def image_info(head: bytes) -> tuple[str, int, int] | None:
+    """(format, width, height) from PNG, GIF, JPEG or WebP header bytes."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n") and len(head) >= 24:
+        width, height = struct.unpack(">II", head[16:24])
+        return "png", width, height
+    if head[:6] in (b"GIF87a", b"GIF89a") and len(head) >= 10:
+        width, height = struct.unpack("<HH", head[6:10])
+        return "gif", width, height
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", head[26:30])
+            return "webp", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(head[21:25], "little")
+            return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            width = int.from_bytes(head[24:27], "little") + 1
+            height = int.from_bytes(head[27:30], "little") + 1
+            return "webp", width, height
+        return None
+    if head[:2] == b"\xff\xd8":
+        pos = 2
+        while pos + 9 <= len(head):
+            if head[pos] != 0xFF:
+                return None
+            marker = head[pos + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                pos += 2
+                continue
+            length = struct.unpack(">H", head[pos + 2:pos + 4])[0]
+            # SOF0-SOF15, excluding DHT (C4), JPG (C8) and DAC (CC).
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", head[pos + 5:pos + 9])
+                return "jpg", width, height
+            pos += 2 + length
+    return None
+
+
+def find_media(db: Session, user_id: int, sha256: str, storage: str) -> Media | None:
+    return (
+        db.query(Media)
+        .filter(Media.user_id == user_id, Media.sha256 == sha256, Media.storage == storage)
+        .first()
+    )
+
+
+def record_media(
+    db: Session,
+    *,
+    user_id: int,
+    sha256: str,
+    storage: str,
+    url: str,
+    public_id: str,
+    resource_type: str,
+    size: int,
+    format: str | None = None,
+    width: int | None = None,
+    height: int | None = None,
+) -> Media:
+    """Insert a media row; if a concurrent upload of the same content won, return that one."""
+    media = Media(
+        user_id=user_id,
+        sha256=sha256,
+        storage=storage,
+        url=url,
+        public_id=public_id,
+        resource_type=resource_type,
+        bytes=size,
+        format=format,
+        width=width,
+        height=height,
+        # Set here rather than by the server default so every row stores the
+        # same timestamp format; keyset pagination compares these values.
+        created_at=_now(),
+        synced_at=_now(),
+    )
+    db.add(media)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return find_media(db, user_id, sha256, storage)
+    db.refresh(media)
+    return media
+
+
+def record_cloudinary_upload(db: Session, user_id: int, sha256: str, result: dict) -> Media:
+    return record_media(
+        db,
+        user_id=user_id,
+        sha256=sha256,
+        storage="cloudinary",
+        url=result["secure_url"],
+        public_id=result["public_id"],
+        resource_type=result.get("resource_type") or "image",
+        size=result.get("bytes") or 0,
+        format=result.get("format"),
+        width=result.get("width"),
+        height=result.get("height"),
+    )
+
+
+def _in_cloudinary_account(url: str, cloud_name: str) -> bool:
+    # Delivery URLs are https://res.cloudinary.com/<cloud_name>/... or, with a
+    # private CDN, https://<cloud_name>-res.cloudinary.com/...
+    parsed = urlparse(url)
+    return parsed.path.startswith(f"/{cloud_name}/") or (parsed.hostname or "").startswith(f"{cloud_name}-")
+
+
+def find_reusable_media(
+    db: Session,
+    user_id: int,
+    sha256: str,
+    storage: str,
+    upload_dir: str,
+    cloud_name: str | None = None,
+) -> Media | None:
+    """
+    find_media(), dropping rows that can no longer be served: local rows whose
+    file is gone from `upload_dir`, and Cloudinary rows stored under another
+    account than `cloud_name` (the tenant changed their Cloudinary URL).
+    """
+    media = find_media(db, user_id, sha256, storage)
+    if media is None:
+        return None
+    if storage == "local":
+        stale = not os.path.exists(os.path.join(upload_dir, media.public_id))
+    else:
+        stale = cloud_name is not None and not _in_cloudinary_account(media.url, cloud_name)
+    if stale:
+        db.delete(media)
+        db.commit()
+        return None
+    return media
+
+
+def _parse_cloudinary_time(value: str | None) -> datetime:
+    if not value:
+        return _now()
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+
+def reconcile_cloudinary(db: Session, user_id: int, folder_prefix: str, credentials: dict) -> dict:
+    """
+    Bring the user's Cloudinary rows in line with their folder: add files we
+    have not recorded, refresh metadata, and delete rows for files that are
+    gone.
+    """
+    import cloudinary.api
+
+    started = _now()
+    existing = {
+        media.public_id: media
+        for media in db.query(Media).filter(Media.user_id == user_id, Media.storage == "cloudinary")
+    }
+    seen = set()
+    added = 0
+    # Every type upload_file() can store, so raw rows are not mistaken for
+    # deleted files below.
+    for resource_type in ("image", "video", "raw"):
+        next_cursor = None
+        while True:
+            result = cloudinary.api.resources(
+                type="upload",
+                resource_type=resource_type,
+                prefix=folder_prefix,
+                max_results=500,
+                next_cursor=next_cursor,
+                **credentials,
+            )
+            for item in result.get("resources", []):
+                public_id = str(item.get("public_id") or "")
+                if not public_id or not item.get("secure_url"):
+                    continue
+                seen.add(public_id)
+                media = existing.get(public_id)
+                if media is None:
+                    media = Media(
+                        user_id=user_id,
+                        storage="cloudinary",
+                        public_id=public_id,
+                        created_at=_parse_cloudinary_time(item.get("created_at")),
+                    )
+                    db.add(media)
+                    existing[public_id] = media
+                    added += 1
+                media.url = item["secure_url"]
+                media.resource_type = item.get("resource_type") or resource_type
+                media.format = item.get("format")
+                media.bytes = item.get("bytes") or 0
+                media.width = item.get("width")
+                media.height = item.get("height")
+                media.synced_at = started
+            next_cursor = result.get("next_cursor")
+            if not next_cursor:
+                break
+
+    # The Admin API listing can lag behind uploads, so recently recorded rows
+    # are never treated as deleted.
+    keep_after = started - _RECONCILE_GRACE
+    removed = 0
+    for public_id, media in existing.items():
+        if public_id not in seen and (media.synced_at is None or _aware(media.synced_at) < keep_after):
+            db.delete(media)
+            removed += 1
+
+    state = db.get(MediaSync, user_id) or MediaSync(user_id=user_id)
+    state.synced_at = started
+    state.error = None
+    db.add(state)
+    db.commit()
+    return {"seen": len(seen), "added": added, "removed": removed}
+
+
+def record_sync_error(db: Session, user_id: int, error: str) -> None:
+    """Keep the previous synced_at so the next pass retries."""
+    db.rollback()
+    state = db.get(MediaSync, user_id) or MediaSync(user_id=user_id)
+    state.error = error[:1000]
+    db.add(state)
+    db.commit()
+
+
+def last_synced_at(db: Session, user_id: int) -> datetime | None:
+    state = db.get(MediaSync, user_id)
+    if state is None or state.synced_at is None:
+        return None
+    return _aware(state.synced_at)
+
+
+def _encode_cursor(media: Media) -> str:
+    raw = json.dumps([media.created_at.isoformat(), media.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int] | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, media_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(media_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def list_media_page(
+    db: Session,
+    user_id: int,
+    *,
+    storage: str,
+    resource_type: str,
+    limit: int,
+    cursor: str | None = None,
+    search: str | None = None,
+) -> tuple[list[Media], str | None]:
+    """Newest first, keyset-paginated on (created_at, id); search matches public_id."""
+    query = db.query(Media).filter(
+        Media.user_id == user_id,
+        Media.storage == storage,
+        Media.resource_type == resource_type,
+    )
+    if search:
+        escaped = search.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(Media.public_id.ilike(f"%{escaped}%", escape="\\"))
+    position = _decode_cursor(cursor) if cursor else None
+    if position is not None:
+        created_at, media_id = position
+        query = query.filter(or_(
+            Media.created_at < created_at,
+            and_(Media.created_at == created_at, Media.id < media_id),
+        ))
+    rows = query.order_by(Media.created_at.desc(), Media.id.desc()).limit(limit + 1).all()
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
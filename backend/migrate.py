@@ -0,0 +1,238 @@
+"""
+Versioned schema migrations.
+
+The `schema_version` table holds one row with the number of the last applied
+step. On startup, main.py calls ensure_schema_current(), which reads that row
+and returns when it matches the latest step, without reflecting the schema.
+When the database is behind, it migrates in-process unless
+MIGRATE_ON_STARTUP=false, in which case it refuses to start. With several
+workers, run the migrations once before starting them:
+
+    python migrate.py           # apply pending steps
+    python migrate.py --status  # print the current and latest version
+
+Each step runs in its own transaction together with the version bump. On
+Postgres, migrations hold an advisory lock, so concurrent runs wait for each
+other instead of racing on DDL.
+
+Steps up to 7 reproduce what the old import-time ensure_schema() did. They
+inspect the schema first, because databases created before versioning can
+be in any of those states. A database without tables is created from the
+models and stamped with the latest version directly. To change the schema,
+append a step to STEPS; never edit or reorder applied ones. New tables need a
+step too, e.g. `Base.metadata.create_all(conn, tables=[Model.__table__])`.
+"""
+import argparse
+import os
+from typing import Callable
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from database import Base, engine
+import db_models  # noqa: F401  (registers the models on Base.metadata)
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+# Arbitrary key for pg_advisory_lock, shared by every process migrating this database.
+_ADVISORY_LOCK_ID = 74_225_001
+
+
+def _columns(conn: Connection, table: str) -> set[str] | None:
+    inspector = inspect(conn)
+    if table not in inspector.get_table_names():
+        return None
+    return {col["name"] for col in inspector.get_columns(table)}
+
+
+def _create_tables(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+
+def _design_work_media(conn: Connection) -> None:
+    columns = _columns(conn, "design_works")
+    if columns is None:
+        return
+    if "primary_image" not in columns:
+        conn.execute(text("ALTER TABLE design_works ADD COLUMN primary_image INTEGER DEFAULT 0"))
+    if "videos" not in columns:
+        conn.execute(text("ALTER TABLE design_works ADD COLUMN videos JSON"))
+
+
+def _multi_tenant(conn: Connection) -> None:
+    """Add user_id columns and assign existing data to the first user."""
+    columns = _columns(conn, "projects")
+    if columns is None or "user_id" in columns:
+        return
+
+    row = conn.execute(text("SELECT id FROM users ORDER BY id LIMIT 1")).fetchone()
+    first_user_id = row[0] if row else None
+    for table in ("projects", "design_works", "site_settings"):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN user_id INTEGER REFERENCES users(id)"))
+        if first_user_id:
+            conn.execute(text(f"UPDATE {table} SET user_id = {first_user_id}"))
+
+    if conn.dialect.name != "postgresql":
+        # SQLite can't add constraints to existing tables; the models' unique
+        # constraint only applies to databases created from them.
+        return
+    # Drop old unique constraint on site_settings.key
+    conn.execute(text("ALTER TABLE site_settings DROP CONSTRAINT IF EXISTS site_settings_key_key"))
+    if not first_user_id:
+        # No users yet — the nullable columns are set on first use
+        return
+    for table in ("projects", "design_works", "site_settings"):
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN user_id SET NOT NULL"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_site_settings_key"))
+    conn.execute(text("ALTER TABLE site_settings ADD CONSTRAINT uq_user_setting UNIQUE (user_id, key)"))
+
+
+def _project_media(conn: Connection) -> None:
+    columns = _columns(conn, "projects")
+    if columns is None:
+        return
+    if "video_url" not in columns:
+        conn.execute(text("ALTER TABLE projects ADD COLUMN video_url VARCHAR(500)"))
+    if "gallery" not in columns:
+        conn.execute(text("ALTER TABLE projects ADD COLUMN gallery JSON"))
+    if "github_releases" not in columns:
+        conn.execute(text("ALTER TABLE projects ADD COLUMN github_releases BOOLEAN DEFAULT FALSE"))
+
+
+def _user_profile(conn: Connection) -> None:
+    columns = _columns(conn, "users")
+    if columns is None:
+        return
+    if "custom_domain" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN custom_domain VARCHAR(255)"))
+    if "email" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN email VARCHAR(255)"))
+    if "super_admin" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN super_admin BOOLEAN DEFAULT FALSE"))
+    if "content_version" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN content_version INTEGER DEFAULT 0"))
+    if "content_updated_at" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN content_updated_at TIMESTAMP WITH TIME ZONE"))
+    conn.execute(text("UPDATE users SET super_admin = FALSE WHERE super_admin IS NULL"))
+    conn.execute(text("UPDATE users SET content_version = 0 WHERE content_version IS NULL"))
+
+
+def _site_settings_index(conn: Connection) -> None:
+    # The old unique index on site_settings.key breaks multi-tenant settings.
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("DROP INDEX IF EXISTS ix_site_settings_key"))
+
+
+def _user_token_version(conn: Connection) -> None:
+    columns = _columns(conn, "users")
+    if columns is None:
+        return
+    if "token_version" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER DEFAULT 0"))
+    conn.execute(text("UPDATE users SET token_version = 0 WHERE token_version IS NULL"))
+
+
+# (version, description, step), in the order they are applied.
+STEPS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create missing tables", _create_tables),
+    (2, "design_works.primary_image and videos", _design_work_media),
+    (3, "user_id on projects, design_works and site_settings", _multi_tenant),
+    (4, "projects.video_url, gallery and github_releases", _project_media),
+    (5, "users.custom_domain, email, super_admin and content_version", _user_profile),
+    (6, "drop ix_site_settings_key", _site_settings_index),
+    (7, "users.token_version", _user_token_version),
+]
+LATEST_VERSION = STEPS[-1][0]
+
+
+def current_version(engine: Engine) -> int:
+    """The applied schema version; 0 for a database that predates versioning."""
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(text("SELECT version FROM schema_version WHERE id = 1")).scalar()
+    except DBAPIError:
+        # No schema_version table yet.
+        return 0
+    return version or 0
+
+
+def _set_version(conn: Connection, version: int) -> None:
+    updated = conn.execute(
+        text("UPDATE schema_version SET version = :version, updated_at = CURRENT_TIMESTAMP WHERE id = 1"),
+        {"version": version},
+    ).rowcount
+    if not updated:
+        conn.execute(
+            text("INSERT INTO schema_version (id, version, updated_at) VALUES (1, :version, CURRENT_TIMESTAMP)"),
+            {"version": version},
+        )
+
+
+def _migrate(engine: Engine, log: Callable[[str], None]) -> int:
+    version = current_version(engine)
+    if version >= LATEST_VERSION:
+        return version
+
+    if version == 0:
+        with engine.begin() as conn:
+            if not inspect(conn).get_table_names():
+                # Fresh database: the models already describe the latest schema.
+                Base.metadata.create_all(conn)
+                _set_version(conn, LATEST_VERSION)
+                log(f"Created schema at version {LATEST_VERSION}")
+                return LATEST_VERSION
+            db_models.SchemaVersion.__table__.create(conn, checkfirst=True)
+
+    for step_version, description, step in STEPS:
+        if step_version <= version:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            _set_version(conn, step_version)
+        log(f"Applied {step_version}: {description}")
+        version = step_version
+    return version
+
+
+def migrate(engine: Engine, log: Callable[[str], None] = print) -> int:
+    """Apply pending steps; returns the resulting version."""
+    if engine.dialect.name != "postgresql":
+        return _migrate(engine, log)
+    with engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+        try:
+            # Re-reads the version, so a process that waited for the lock
+            # finds the work done.
+            return _migrate(engine, log)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _ADVISORY_LOCK_ID})
+
+
+def ensure_schema_current(engine: Engine) -> None:
+    """Startup check: one read when the schema is current, otherwise migrate or fail."""
+    version = current_version(engine)
+    if version == LATEST_VERSION:
+        return
+    if version > LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, newer than this code ({LATEST_VERSION})."
+        )
+    if not MIGRATE_ON_STARTUP:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}. Run `python migrate.py`."
+        )
+    migrate(engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending database schema migrations.")
+    parser.add_argument("--status", action="store_true", help="print the current and latest version and exit")
+    args = parser.parse_args()
+    if args.status:
+        print(f"current {current_version(engine)}, latest {LATEST_VERSION}")
+    else:
+        print(f"Schema at version {migrate(engine)}")
@@ -0,0 +1,122 @@
+"""
+bcrypt hashing off the event loop.
+
+A bcrypt check costs about 250 ms of CPU at cost 12. bcrypt releases the GIL,
+so hashing runs in a small thread pool (PASSWORD_HASH_WORKERS threads) and the
+loop stays free for other requests during a burst of logins. At most
+PASSWORD_HASH_MAX_QUEUE hash operations may be pending at once; further
+requests get a 503 instead of queueing without bound.
+
+New hashes use BCRYPT_ROUNDS. A stored hash with a lower cost still verifies,
+and needs_rehash() tells the login route to replace it.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+BCRYPT_ROUNDS = min(max(int(os.getenv("BCRYPT_ROUNDS", "12")), 4), 31)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+
+def _password_bytes(password: str) -> bytes:
+    # bcrypt only looks at the first 72 bytes and bcrypt>=5 rejects longer input.
+    return password.encode("utf-8")[:72]
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    try:
+        return bcrypt.checkpw(_password_bytes(password), hashed_password.encode("utf-8"))
+    except ValueError:
+        # Not a bcrypt hash.
+        return False
+
+
+def hash_rounds(hashed_password: str) -> int | None:
+    """The cost factor of a bcrypt hash ("$2b$12$..." -> 12)."""
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed_password: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+    current = hash_rounds(hashed_password)
+    return current is not None and current < rounds
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+        rounds: int = BCRYPT_ROUNDS,
+    ):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many sign-in attempts. Please retry shortly.")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(hash_password, password, self.rounds)
+        self.hashed += 1
+        return hashed
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        ok = await self._run(check_password, password, hashed_password)
+        self.verified += 1
+        return ok
+
+    async def rehash_if_needed(self, password: str, hashed_password: str) -> str | None:
+        """A new hash at the configured cost if `hashed_password` is weaker, else None."""
+        if not needs_rehash(hashed_password, self.rounds):
+            return None
+        self.rehashed += 1
+        return await self.hash(password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_queue": self.max_queue,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher()
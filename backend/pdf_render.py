@@ -0,0 +1,248 @@
+"""
+PDF page rasterization in a bounded process pool.
+
+PyMuPDF rendering is CPU-bound and holds the GIL, so it runs in worker
+processes rather than on the event loop. Requested pages are split into one
+chunk per worker; each worker re-opens the document from the shared temp path
+instead of receiving the PDF bytes. At most PDF_RENDER_MAX_QUEUE render jobs
+may be pending at once; further requests get a 503 instead of queueing
+without bound.
+
+A worker killed mid-render (OOM, a MuPDF crash) breaks the whole
+ProcessPoolExecutor. The pool is then replaced and the unfinished pages are
+submitted once more; if the new pool breaks too, the request gets a 503.
+"""
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "0")) or (os.cpu_count() or 1)
+PDF_RENDER_MAX_QUEUE = int(os.getenv("PDF_RENDER_MAX_QUEUE", "8"))
+
+# WebP output goes through Pillow, which is optional; without it WebP requests
+# are encoded as JPEG instead.
+WEBP_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+
+def page_scale(width: float, height: float, dpi: int, max_dim: int | None = None) -> float:
+    scale = dpi / 72
+    max_side = max(width, height)
+    if max_dim and max_side > 0:
+        scale = min(scale, max_dim / max_side)
+    return scale
+
+
+def encode_pixmap(pix, fmt: str, quality: int | None = None) -> tuple[bytes, str]:
+    """Encode a pixmap as WebP, JPEG or PNG; returns (bytes, file extension)."""
+    if fmt == "webp":
+        if WEBP_AVAILABLE:
+            return pix.pil_tobytes(format="WEBP", quality=quality or 80), "webp"
+        fmt = "jpeg"
+    if fmt in ("jpg", "jpeg"):
+        try:
+            return pix.tobytes("jpg", jpg_quality=quality or 95), "jpg"
+        except TypeError:
+            return pix.tobytes("jpg"), "jpg"
+    return pix.tobytes("png"), "png"
+
+
+def _render_chunk(
+    path: str,
+    page_numbers: list[int],
+    dpi: int,
+    max_dim: int | None,
+    fmt: str,
+    quality: int | None,
+) -> list[dict]:
+    """Worker entry point: rasterize `page_numbers` of the PDF at `path`."""
+    import fitz  # PyMuPDF
+
+    results = []
+    with fitz.open(path) as doc:
+        for page_num in page_numbers:
+            try:
+                started = time.perf_counter()
+                page = doc[page_num]
+                scale = page_scale(page.rect.width, page.rect.height, dpi, max_dim)
+                pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+                content, ext = encode_pixmap(pix, fmt, quality)
+                results.append({
+                    "page": page_num,
+                    "content": content,
+                    "ext": ext,
+                    "width": page.rect.width * scale,
+                    "height": page.rect.height * scale,
+                    "render_ms": round((time.perf_counter() - started) * 1000, 1),
+                })
+                del pix
+            except Exception as e:
+                results.append({"page": page_num, "error": str(e)})
+    return results
+
+
+def _discard_result(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+def _split(items: list[int], parts: int) -> list[list[int]]:
+    """Split into `parts` contiguous chunks of near-equal size, dropping empties."""
+    size, extra = divmod(len(items), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+class RenderPool:
+    def __init__(self, workers: int = PDF_RENDER_WORKERS, max_queue: int = PDF_RENDER_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.pending = 0
+        self.pages_rendered = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a threaded server process is unsafe for MuPDF.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _admit(self) -> None:
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="PDF renderer is busy. Please retry shortly.")
+        self.pending += 1
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken pool; the next submit starts a fresh one."""
+        if self._executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.restarts += 1
+
+    @staticmethod
+    def _crashed() -> HTTPException:
+        return HTTPException(status_code=503, detail="PDF renderer crashed. Please retry shortly.")
+
+    def _submit(
+        self, executor: ProcessPoolExecutor, path: str, chunks: list[list[int]], *args
+    ) -> list[asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        return [loop.run_in_executor(executor, _render_chunk, path, chunk, *args) for chunk in chunks]
+
+    def _count(self, items: list[dict]) -> None:
+        self.pages_rendered += sum(1 for item in items if "content" in item)
+
+    async def render(
+        self,
+        path: str,
+        page_numbers: list[int],
+        *,
+        dpi: int,
+        max_dim: int | None = None,
+        fmt: str = "png",
+        quality: int | None = None,
+    ) -> list[dict]:
+        """
+        Render pages in parallel; returns one dict per page in input order,
+        with either `content`/`ext`/`width`/`height`/`render_ms` or `error`.
+        """
+        if not page_numbers:
+            return []
+        self._admit()
+        try:
+            chunks = _split(page_numbers, self.workers)
+            for attempt in range(2):
+                executor = self._get_executor()
+                try:
+                    chunk_results = await asyncio.gather(
+                        *self._submit(executor, path, chunks, dpi, max_dim, fmt, quality)
+                    )
+                    break
+                except BrokenProcessPool:
+                    self._reset(executor)
+                    if attempt:
+                        raise self._crashed()
+        finally:
+            self.pending -= 1
+
+        results = [item for chunk in chunk_results for item in chunk]
+        self._count(results)
+        return results
+
+    async def render_iter(
+        self,
+        path: str,
+        page_numbers: list[int],
+        *,
+        dpi: int,
+        max_dim: int | None = None,
+        fmt: str = "png",
+        quality: int | None = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Like render(), but submits one page per task and yields each page as
+        soon as it is done, so callers can stream results (order not kept).
+        """
+        if not page_numbers:
+            return
+        self._admit()
+        remaining = list(page_numbers)
+        futures = []
+        try:
+            for attempt in range(2):
+                executor = self._get_executor()
+                try:
+                    futures = self._submit(executor, path, [[n] for n in remaining], dpi, max_dim, fmt, quality)
+                    for next_done in asyncio.as_completed(futures):
+                        items = await next_done
+                        self._count(items)
+                        for item in items:
+                            remaining.remove(item["page"])
+                            yield item
+                    break
+                except BrokenProcessPool:
+                    self._reset(executor)
+                    for future in futures:
+                        # The other pages failed the same way; don't log each one.
+                        future.add_done_callback(_discard_result)
+                    if attempt:
+                        raise self._crashed()
+        finally:
+            self.pending -= 1
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_queue": self.max_queue,
+            "pages_rendered": self.pages_rendered,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+
+render_pool = RenderPool()
@@ -0,0 +1,235 @@
+"""
+Server-side PDF upload sessions.
+
+The admin PDF flow previews a deck and then extracts pages from it. Instead of
+uploading the file for each step, preview stores it here and returns a session
+ID that extract accepts. Files are stored on disk and named by SHA-256, so
+re-uploading the same deck reuses the stored copy.
+
+Layout under PDF_SESSION_DIR:
+    blobs/<sha256>.pdf        document bytes, shared by every session that uploaded them
+    sessions/<id>.json        owner, hash, size and page count; mtime is the last access
+
+Sessions expire PDF_SESSION_TTL seconds after their last use. A blob is
+removed once no session references it. Each user may hold at most
+PDF_SESSION_USER_QUOTA_BYTES of distinct documents; when an upload would go
+over the quota, that user's least recently used sessions are dropped first.
+Everything lives on disk, so all workers on the host share the same sessions.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import time
+from typing import BinaryIO
+
+from fastapi import HTTPException
+
+PDF_SESSION_DIR = os.getenv("PDF_SESSION_DIR", "").strip() or os.path.join(tempfile.gettempdir(), "pdf-sessions")
+PDF_SESSION_TTL = int(os.getenv("PDF_SESSION_TTL", "1800"))
+PDF_SESSION_USER_QUOTA_BYTES = int(os.getenv("PDF_SESSION_USER_QUOTA_BYTES", str(200 * 1024 * 1024)))
+
+_CHUNK_SIZE = 1024 * 1024
+# A new blob is written before its session file; don't let a concurrent sweep
+# in another worker delete it in between.
+_BLOB_GRACE_SECONDS = 60
+
+
+class PdfSessionStore:
+    def __init__(self, root: str, ttl: int, user_quota: int):
+        self.root = root
+        self.ttl = ttl
+        self.user_quota = user_quota
+        self.created = 0
+        self.deduplicated = 0
+        self.evicted = 0
+        self._blob_dir = os.path.join(root, "blobs")
+        self._session_dir = os.path.join(root, "sessions")
+
+    def _ensure_dirs(self) -> None:
+        os.makedirs(self._blob_dir, exist_ok=True)
+        os.makedirs(self._session_dir, exist_ok=True)
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self._blob_dir, f"{sha256}.pdf")
+
+    def _session_path(self, session_id: str) -> str:
+        return os.path.join(self._session_dir, f"{session_id}.json")
+
+    def _read_session(self, path: str) -> dict | None:
+        try:
+            with open(path) as f:
+                session = json.load(f)
+            session["accessed_at"] = os.path.getmtime(path)
+            return session
+        except (OSError, ValueError):
+            return None
+
+    def _sessions(self) -> list[dict]:
+        sessions = []
+        for name in os.listdir(self._session_dir):
+            if name.endswith(".json"):
+                session = self._read_session(os.path.join(self._session_dir, name))
+                if session is not None:
+                    sessions.append(session)
+        return sessions
+
+    def _remove_session(self, session_id: str) -> None:
+        try:
+            os.remove(self._session_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def _public(self, session: dict) -> dict:
+        return {
+            "id": session["id"],
+            "path": self.blob_path(session["sha256"]),
+            "size": session["size"],
+            "page_count": session["page_count"],
+        }
+
+    def sweep(self) -> None:
+        """Drop expired sessions and blobs that no session references."""
+        self._ensure_dirs()
+        now = time.time()
+        referenced = set()
+        for session in self._sessions():
+            if now - session["accessed_at"] > self.ttl:
+                self._remove_session(session["id"])
+                self.evicted += 1
+            else:
+                referenced.add(session["sha256"])
+        for name in os.listdir(self._blob_dir):
+            sha256, ext = os.path.splitext(name)
+            if ext not in (".pdf", ".part") or sha256 in referenced:
+                continue
+            path = os.path.join(self._blob_dir, name)
+            try:
+                if now - os.path.getmtime(path) > _BLOB_GRACE_SECONDS:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _store_blob(self, fileobj: BinaryIO) -> tuple[str, int]:
+        """Copy the upload to disk in chunks, hashing as it goes."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self._blob_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while chunk := fileobj.read(_CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if size > self.user_quota:
+                        raise HTTPException(status_code=413, detail="PDF is larger than the upload quota")
+                    tmp.write(chunk)
+            sha256 = digest.hexdigest()
+            path = self.blob_path(sha256)
+            if os.path.exists(path):
+                self.deduplicated += 1
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+                tmp_path = None
+            return sha256, size
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _make_room(self, user_id: int, sha256: str, size: int, sessions: list[dict]) -> None:
+        """Drop the user's least recently used sessions until `size` more bytes fit."""
+        own = sorted((s for s in sessions if s["user_id"] == user_id), key=lambda s: s["accessed_at"])
+        if any(s["sha256"] == sha256 for s in own):
+            return
+        usage = sum({s["sha256"]: s["size"] for s in own}.values())
+        while own and usage + size > self.user_quota:
+            oldest = own.pop(0)
+            self._remove_session(oldest["id"])
+            self.evicted += 1
+            if not any(s["sha256"] == oldest["sha256"] for s in own):
+                usage -= oldest["size"]
+
+    def _create(self, user_id: int, fileobj: BinaryIO) -> dict:
+        import fitz  # PyMuPDF
+
+        self.sweep()
+        sha256, size = self._store_blob(fileobj)
+        sessions = self._sessions()
+
+        # Same user, same document: hand back the existing session.
+        for session in sessions:
+            if session["user_id"] == user_id and session["sha256"] == sha256:
+                os.utime(self._session_path(session["id"]))
+                return self._public(session)
+
+        try:
+            with fitz.open(self.blob_path(sha256)) as doc:
+                page_count = len(doc)
+        except Exception:
+            if not any(s["sha256"] == sha256 for s in sessions):
+                os.remove(self.blob_path(sha256))
+            raise HTTPException(status_code=400, detail="Failed to open PDF: not a valid PDF document")
+
+        self._make_room(user_id, sha256, size, sessions)
+        session = {
+            "id": secrets.token_urlsafe(16),
+            "user_id": user_id,
+            "sha256": sha256,
+            "size": size,
+            "page_count": page_count,
+        }
+        with open(self._session_path(session["id"]), "w") as f:
+            json.dump(session, f)
+        self.created += 1
+        return self._public(session)
+
+    async def create(self, user_id: int, fileobj: BinaryIO) -> dict:
+        """Store an uploaded PDF; returns {id, path, size, page_count}."""
+        return await asyncio.to_thread(self._create, user_id, fileobj)
+
+    def get(self, session_id: str, user_id: int) -> dict:
+        """Look up a live session owned by `user_id` and extend its TTL."""
+        if not session_id or not session_id.replace("-", "").replace("_", "").isalnum():
+            raise HTTPException(status_code=404, detail="PDF session not found or expired")
+        path = self._session_path(session_id)
+        session = self._read_session(path)
+        if (
+            session is None
+            or session["user_id"] != user_id
+            or time.time() - session["accessed_at"] > self.ttl
+            or not os.path.exists(self.blob_path(session["sha256"]))
+        ):
+            raise HTTPException(status_code=404, detail="PDF session not found or expired")
+        os.utime(path)
+        return self._public(session)
+
+    def delete(self, session_id: str, user_id: int) -> None:
+        self.get(session_id, user_id)
+        self._remove_session(session_id)
+        self.sweep()
+
+    def stats(self) -> dict:
+        self._ensure_dirs()
+        sessions = self._sessions()
+        blob_sizes = []
+        for name in os.listdir(self._blob_dir):
+            if name.endswith(".pdf"):
+                try:
+                    blob_sizes.append(os.path.getsize(os.path.join(self._blob_dir, name)))
+                except FileNotFoundError:
+                    pass
+        return {
+            "sessions": len(sessions),
+            "blobs": len(blob_sizes),
+            "bytes": sum(blob_sizes),
+            "created": self.created,
+            "deduplicated": self.deduplicated,
+            "evicted": self.evicted,
+            "ttl": self.ttl,
+            "user_quota": self.user_quota,
+        }
+
+
+pdf_sessions = PdfSessionStore(PDF_SESSION_DIR, PDF_SESSION_TTL, PDF_SESSION_USER_QUOTA_BYTES)
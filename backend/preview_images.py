@@ -0,0 +1,37 @@
+"""
+Short-lived URLs for rendered PDF preview pages.
+
+Instead of inlining every page as a base64 data URI, preview_pdf can park the
+image bytes here and return `/api/pdf/preview-images/{token}`. The token is a
+random capability (the URL works in an <img> tag without an Authorization
+header) and expires after PDF_PREVIEW_URL_TTL seconds. Images live in this
+process's memory, so multi-worker deployments need sticky sessions for this
+mode.
+"""
+import os
+import secrets
+
+from cache import MISSING, TTLCache
+
+PDF_PREVIEW_URL_TTL = int(os.getenv("PDF_PREVIEW_URL_TTL", "300"))
+PDF_PREVIEW_URL_MAX_ITEMS = int(os.getenv("PDF_PREVIEW_URL_MAX_ITEMS", "400"))
+
+MEDIA_TYPES = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp"}
+
+_images = TTLCache(maxsize=PDF_PREVIEW_URL_MAX_ITEMS, ttl=PDF_PREVIEW_URL_TTL)
+
+
+def store_preview_image(content: bytes, ext: str) -> str:
+    """Keep `content` for PDF_PREVIEW_URL_TTL seconds; returns its URL path."""
+    token = secrets.token_urlsafe(24)
+    _images.set(token, (content, MEDIA_TYPES.get(ext, "application/octet-stream")))
+    return f"/api/pdf/preview-images/{token}"
+
+
+def get_preview_image(token: str) -> tuple[bytes, str] | None:
+    entry = _images.get(token)
+    return None if entry is MISSING else entry
+
+
+def preview_image_stats() -> dict:
+    return _images.stats()
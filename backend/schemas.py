@@ -136,3 +136,16 @@ class AllSettingsResponse(BaseModel):
     footer: dict | None = None
     appearance: dict | None = None
     integrations: dict | None = None
+
+
+class JobSubmit(BaseModel):
+    type: str
+    payload: dict = {}
+
+
+# Public bundle schema
+class PortfolioBundleResponse(BaseModel):
+    profile: UserResponse
+    projects: list[ProjectResponse]
+    designs: list[DesignWorkResponse]
+    settings: AllSettingsResponse
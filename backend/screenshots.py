@@ -0,0 +1,245 @@
+"""
+Cached project screenshots.
+
+A ScreenshotOne capture takes several seconds and is billed per call, and
+admins often press capture more than once for the same site. Captures are
+cached on disk per user, keyed by the normalized URL plus the viewport
+options, for SCREENSHOT_CACHE_TTL seconds. Concurrent requests for the same
+key in one worker share a single upstream call.
+
+Layout under SCREENSHOT_CACHE_DIR:
+    blobs/<sha256>.png        image bytes, stored once however many entries point at them
+    entries/<key>.json        owner, url, options and blob hash; mtime is the capture time
+
+Failed captures are not cached. Everything lives on disk, so all workers on
+the host share the cache. The upstream is the `screenshotone` client in
+http_clients; point SCREENSHOTONE_BASE_URL at a local stand-in to test.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+from fastapi import HTTPException
+
+from http_clients import get_client
+
+SCREENSHOT_CACHE_DIR = os.getenv("SCREENSHOT_CACHE_DIR", "").strip() or os.path.join(tempfile.gettempdir(), "screenshots")
+SCREENSHOT_CACHE_TTL = int(os.getenv("SCREENSHOT_CACHE_TTL", "86400"))
+
+DEFAULT_OPTIONS = {"viewport_width": 1280, "viewport_height": 720, "full_page": True}
+# A blob is written before its entry; don't let a concurrent sweep in another
+# worker delete it in between.
+_BLOB_GRACE_SECONDS = 60
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Add a scheme if missing and lower-case the scheme and host; drop default ports."""
+    url = url.strip()
+    if not url.startswith(("http://", "https://")):
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if not host:
+        raise HTTPException(status_code=400, detail="URL is required")
+    if ":" in host:
+        host = f"[{host}]"
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        auth = parts.username + (f":{parts.password}" if parts.password else "")
+        host = f"{auth}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, parts.fragment))
+
+
+def screenshot_options(viewport_width: int | None, viewport_height: int | None, full_page: bool | None) -> dict:
+    """Viewport options with defaults filled in and sizes clamped to what the API accepts."""
+    width = DEFAULT_OPTIONS["viewport_width"] if viewport_width is None else viewport_width
+    height = DEFAULT_OPTIONS["viewport_height"] if viewport_height is None else viewport_height
+    return {
+        "viewport_width": min(max(width, 320), 3840),
+        "viewport_height": min(max(height, 200), 2160),
+        "full_page": DEFAULT_OPTIONS["full_page"] if full_page is None else bool(full_page),
+    }
+
+
+async def take_screenshot(access_key: str, url: str, options: dict) -> bytes:
+    """One ScreenshotOne capture as PNG bytes."""
+    import httpx
+
+    params = {
+        "access_key": access_key,
+        "url": url,
+        "viewport_width": options["viewport_width"],
+        "viewport_height": options["viewport_height"],
+        "full_page": "true" if options["full_page"] else "false",
+        "format": "png",
+        "block_ads": "true",
+        "block_cookie_banners": "true",
+        "delay": 2,
+    }
+    try:
+        response = await get_client("screenshotone").get("/take", params=params)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=408, detail="Screenshot request timed out")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to capture screenshot: {str(e)}")
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail=f"Screenshot API error: {response.text}")
+    return response.content
+
+
+class ScreenshotCache:
+    def __init__(self, root: str, ttl: int):
+        self.root = root
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.deduplicated = 0
+        self._blob_dir = os.path.join(root, "blobs")
+        self._entry_dir = os.path.join(root, "entries")
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def _ensure_dirs(self) -> None:
+        os.makedirs(self._blob_dir, exist_ok=True)
+        os.makedirs(self._entry_dir, exist_ok=True)
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self._blob_dir, f"{sha256}.png")
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._entry_dir, f"{key}.json")
+
+    @staticmethod
+    def cache_key(user_id: int, url: str, options: dict) -> str:
+        raw = json.dumps([user_id, url, options], sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _read(self, key: str, user_id: int | None = None) -> bytes | None:
+        path = self._entry_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path) as f:
+                entry = json.load(f)
+            if user_id is not None and entry["user_id"] != user_id:
+                return None
+            with open(self._blob_path(entry["sha256"]), "rb") as f:
+                return f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    async def get(self, key: str, user_id: int) -> bytes | None:
+        """A cached capture by key, if it belongs to `user_id` and has not expired."""
+        if len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+            return None
+        return await asyncio.to_thread(self._read, key, user_id)
+
+    def _write(self, key: str, user_id: int, url: str, options: dict, content: bytes) -> None:
+        self._ensure_dirs()
+        self.sweep()
+        sha256 = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(sha256)
+        if os.path.exists(blob_path):
+            self.deduplicated += 1
+            os.utime(blob_path)
+        else:
+            self._write_atomic(blob_path, content)
+        entry = {"user_id": user_id, "url": url, "options": options, "sha256": sha256, "size": len(content)}
+        self._write_atomic(self._entry_path(key), json.dumps(entry).encode())
+
+    def _write_atomic(self, path: str, content: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def sweep(self) -> None:
+        """Drop expired entries and blobs that no live entry references."""
+        self._ensure_dirs()
+        now = time.time()
+        referenced = set()
+        for name in os.listdir(self._entry_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self._entry_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    referenced.add(json.load(f)["sha256"])
+            except (OSError, ValueError, KeyError):
+                pass
+        for name in os.listdir(self._blob_dir):
+            sha256, ext = os.path.splitext(name)
+            if ext not in (".png", ".part") or sha256 in referenced:
+                continue
+            path = os.path.join(self._blob_dir, name)
+            try:
+                if now - os.path.getmtime(path) > _BLOB_GRACE_SECONDS:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def get_or_capture(
+        self, user_id: int, access_key: str, url: str, options: dict, refresh: bool = False
+    ) -> tuple[bytes, bool]:
+        """PNG bytes for the capture and whether they came from the cache."""
+        key = self.cache_key(user_id, url, options)
+        if not refresh:
+            content = await asyncio.to_thread(self._read, key)
+            if content is not None:
+                self.hits += 1
+                return content, True
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._capture(key, user_id, access_key, url, options))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one client disconnecting doesn't cancel the capture for the rest.
+        return await asyncio.shield(task), False
+
+    async def _capture(self, key: str, user_id: int, access_key: str, url: str, options: dict) -> bytes:
+        content = await take_screenshot(access_key, url, options)
+        await asyncio.to_thread(self._write, key, user_id, url, options, content)
+        return content
+
+    def stats(self) -> dict:
+        self._ensure_dirs()
+        entries = sum(1 for name in os.listdir(self._entry_dir) if name.endswith(".json"))
+        blob_sizes = []
+        for name in os.listdir(self._blob_dir):
+            if name.endswith(".png"):
+                try:
+                    blob_sizes.append(os.path.getsize(os.path.join(self._blob_dir, name)))
+                except FileNotFoundError:
+                    pass
+        return {
+            "entries": entries,
+            "blobs": len(blob_sizes),
+            "bytes": sum(blob_sizes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "deduplicated": self.deduplicated,
+            "inflight": len(self._inflight),
+            "ttl": self.ttl,
+        }
+
+
+screenshot_cache = ScreenshotCache(SCREENSHOT_CACHE_DIR, SCREENSHOT_CACHE_TTL)
@@ -0,0 +1,84 @@
+"""
+Per-tenant snapshot of the public portfolio bundle.
+
+The bundle (profile, projects, designs and public settings) is serialized once
+and kept in memory keyed by username. Admin write routes call
+invalidate_snapshot() so the next public read rebuilds it. Other workers
+don't see that call, so each entry also records the user's content_version it
+was built from and is only served for that version; entries also expire after
+SNAPSHOT_TTL_SECONDS.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db_models import User, Project, DesignWork, SiteSettings
+from schemas import (
+    UserResponse, ProjectResponse, DesignWorkResponse,
+    AllSettingsResponse, PortfolioBundleResponse,
+)
+
+SNAPSHOT_TTL_SECONDS = int(os.getenv("SNAPSHOT_TTL_SECONDS", "300"))
+
+_lock = threading.Lock()
+# username -> (expires_at, content_version, payload)
+_snapshots: dict[str, tuple[float, int, bytes]] = {}
+# Bumped on every invalidation so a rebuild that raced with a write is dropped.
+_generations: dict[str, int] = {}
+
+
+def get_snapshot(username: str, content_version: int) -> bytes | None:
+    """The cached bundle, if it was built from `content_version` and has not expired."""
+    with _lock:
+        entry = _snapshots.get(username)
+        if not entry:
+            return None
+        expires_at, version, payload = entry
+        if expires_at < time.monotonic() or version != content_version:
+            del _snapshots[username]
+            return None
+        return payload
+
+
+def snapshot_generation(username: str) -> int:
+    with _lock:
+        return _generations.get(username, 0)
+
+
+def store_snapshot(username: str, payload: bytes, generation: int, content_version: int) -> None:
+    with _lock:
+        if _generations.get(username, 0) != generation:
+            return
+        _snapshots[username] = (time.monotonic() + SNAPSHOT_TTL_SECONDS, content_version, payload)
+
+
+def invalidate_snapshot(username: str) -> None:
+    with _lock:
+        _snapshots.pop(username, None)
+        _generations[username] = _generations.get(username, 0) + 1
+
+
+async def build_bundle(user: User, db: AsyncSession) -> bytes:
+    projects = await db.scalars(
+        select(Project)
+        .where(Project.user_id == user.id)
+        .order_by(Project.order, Project.id.desc())
+    )
+    designs = await db.scalars(
+        select(DesignWork)
+        .where(DesignWork.user_id == user.id)
+        .order_by(DesignWork.order, DesignWork.id.desc())
+    )
+    settings = await db.scalars(select(SiteSettings).where(SiteSettings.user_id == user.id))
+    public_settings = {s.key: s.value for s in settings if s.key != "integrations"}
+
+    bundle = PortfolioBundleResponse(
+        profile=UserResponse.model_validate(user),
+        projects=[ProjectResponse.model_validate(p) for p in projects],
+        designs=[DesignWorkResponse.model_validate(d) for d in designs],
+        settings=AllSettingsResponse(**public_settings),
+    )
+    return bundle.model_dump_json().encode("utf-8")
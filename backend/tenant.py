@@ -1,15 +1,69 @@
+import os
+
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from cache import TTLCache, MISSING
 from db_models import User
 
+TENANT_CACHE_SIZE = int(os.getenv("TENANT_CACHE_SIZE", "1024"))
+TENANT_CACHE_TTL = float(os.getenv("TENANT_CACHE_TTL", "60"))
+TENANT_NEGATIVE_CACHE_TTL = float(os.getenv("TENANT_NEGATIVE_CACHE_TTL", "30"))
+
+# username -> detached User (read-only attributes only; no lazy relationships)
+_users_by_username = TTLCache(maxsize=TENANT_CACHE_SIZE, ttl=TENANT_CACHE_TTL)
+# domain -> username, or None for hosts that map to no tenant
+_usernames_by_domain = TTLCache(maxsize=TENANT_CACHE_SIZE, ttl=TENANT_CACHE_TTL)
+
+
+async def _get_user_by_username_async(username: str, db: AsyncSession) -> User | None:
+    user = _users_by_username.get(username)
+    if user is not MISSING:
+        # Other workers bump content_version without touching this cache, and
+        # ETags and snapshots are built from it, so it is read on every hit.
+        version = await db.scalar(select(User.content_version).where(User.username == username))
+        if version is not None and version == user.content_version:
+            return user
+        _users_by_username.pop(username)
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
+    if user:
+        db.expunge(user)
+        _users_by_username.set(username, user)
+    return user
+
 
-def get_user_by_username_or_404(username: str, db: Session) -> User:
-    user = db.query(User).filter(User.username == username).first()
+async def get_user_by_username_or_404_async(username: str, db: AsyncSession) -> User:
+    user = await _get_user_by_username_async(username, db)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
-def get_user_by_domain(domain: str, db: Session) -> User | None:
-    return db.query(User).filter(User.custom_domain == domain).first()
+async def get_username_by_domain_async(domain: str, db: AsyncSession) -> str | None:
+    username = _usernames_by_domain.get(domain)
+    if username is not MISSING:
+        return username
+    result = await db.execute(select(User.username).where(User.custom_domain == domain))
+    username = result.scalars().first()
+    if username:
+        _usernames_by_domain.set(domain, username)
+        return username
+    _usernames_by_domain.set(domain, None, ttl=TENANT_NEGATIVE_CACHE_TTL)
+    return None
+
+
+def invalidate_tenant(username: str, *domains: str | None) -> None:
+    """Drop cached lookups after a user's username or domain mapping changes."""
+    _users_by_username.pop(username)
+    for domain in domains:
+        if domain:
+            _usernames_by_domain.pop(domain)
+
+
+def tenant_cache_stats() -> dict:
+    return {
+        "users_by_username": _users_by_username.stats(),
+        "usernames_by_domain": _usernames_by_domain.stats(),
+    }
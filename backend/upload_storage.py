@@ -0,0 +1,221 @@
+"""
+On-disk layout and HTTP serving for local uploads.
+
+New local files are content-addressed: an upload whose SHA-256 is `ab12…`
+is stored once at uploads/ab/12/ab12….{ext} and served as /uploads/ab12….{ext}.
+Two levels of hash-prefix sharding keep directories small, and the same bytes
+uploaded by different tenants share one file. Image variants live next to it
+under uploads/ab/12/ab12…/ (see image_derivatives).
+
+UploadStaticFiles serves:
+- content-addressed files and variants with a strong ETag derived from the
+  hash and `Cache-Control: immutable`, plus a precompressed .gz sibling for
+  text formats when the client accepts gzip;
+- older flat uploads/{uuid}.{ext} files as plain static files, with a day of
+  public caching (their names are unique, but not derived from content).
+
+Byte ranges (video seeking) and If-None-Match come from Starlette's
+FileResponse; full-file responses use the ASGI pathsend extension, i.e. the
+server's sendfile path, when the server offers it. Range responses are read
+in UPLOAD_SERVE_CHUNK_SIZE pieces.
+"""
+import asyncio
+import gzip
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+from typing import Callable
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+from image_derivatives import UPLOAD_DERIVATIVE_CONCURRENCY, UPLOAD_DERIVATIVE_QUALITY, parse_variant_path, render_variant, source_path
+
+UPLOAD_SERVE_CHUNK_SIZE = int(os.getenv("UPLOAD_SERVE_CHUNK_SIZE", str(1024 * 1024)))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+LEGACY_CACHE_CONTROL = "public, max-age=86400"
+
+# Text formats worth storing a gzip copy of; images and video are already compressed.
+PRECOMPRESS_EXTENSIONS = {".svg", ".txt", ".json", ".csv", ".xml", ".md"}
+
+_CONTENT_NAME = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]{1,10})?$")
+_EXTENSION = re.compile(r"^[A-Za-z0-9]{1,10}$")
+
+# mkstemp creates files as 0600; stored uploads are public.
+_FILE_MODE = 0o644
+
+
+def safe_extension(filename: str | None) -> str:
+    """Lower-cased extension of an uploaded filename, or "" if it is unusable in a URL."""
+    ext = filename.rsplit(".", 1)[-1] if filename and "." in filename else ""
+    return ext.lower() if _EXTENSION.match(ext) else ""
+
+
+def shard_dir(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}"
+
+
+def content_path(sha256: str, ext: str = "") -> str:
+    """Path of a content-addressed file, relative to the uploads directory."""
+    return f"{shard_dir(sha256)}/{sha256}{'.' + ext.lower() if ext else ''}"
+
+
+def content_url(sha256: str, ext: str = "") -> str:
+    return f"/uploads/{sha256}{'.' + ext.lower() if ext else ''}"
+
+
+def variant_path(sha256: str, width: int, fmt: str) -> str:
+    return f"{shard_dir(sha256)}/{sha256}/w{width}.{fmt}"
+
+
+def store_content(upload_dir: str, sha256: str, ext: str, write: Callable[[str], object]) -> str:
+    """
+    Store content under its hash unless that file already exists; `write(path)`
+    produces the bytes at a temp path. Returns the relative path.
+    """
+    rel_path = content_path(sha256, ext)
+    full_path = os.path.join(upload_dir, rel_path)
+    if os.path.exists(full_path):
+        return rel_path
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    # A unique temp name per call: the same bytes may be stored by two
+    # threads of one worker at once.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.chmod(tmp_path, _FILE_MODE)
+        os.replace(tmp_path, full_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _precompress(full_path)
+    return rel_path
+
+
+def _precompress(full_path: str) -> None:
+    if os.path.splitext(full_path)[1] not in PRECOMPRESS_EXTENSIONS:
+        return
+    gz_path = f"{full_path}.gz"
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix=".tmp")
+    try:
+        with (
+            open(full_path, "rb") as src,
+            os.fdopen(fd, "wb") as raw,
+            gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9) as dest,
+        ):
+            shutil.copyfileobj(src, dest)
+        # Only keep the copy when it actually saves bytes.
+        if os.path.getsize(tmp_path) < os.path.getsize(full_path) * 0.9:
+            os.chmod(tmp_path, _FILE_MODE)
+            os.replace(tmp_path, gz_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _UploadFileResponse(FileResponse):
+    chunk_size = UPLOAD_SERVE_CHUNK_SIZE
+
+
+class UploadStaticFiles(StaticFiles):
+    """StaticFiles for uploads/: sharded content-addressed files, lazy image variants."""
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.upload_dir = directory
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(UPLOAD_DERIVATIVE_CONCURRENCY)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise StarletteHTTPException(status_code=405)
+        name = path.replace(os.sep, "/")
+
+        variant = parse_variant_path(name)
+        if variant is not None:
+            sha256, width, fmt = variant
+            rel_path = variant_path(sha256, width, fmt)
+            full_path, stat_result = await asyncio.to_thread(self.lookup_path, rel_path)
+            if stat_result is None:
+                if not await self._generate(rel_path, sha256, width, fmt):
+                    raise StarletteHTTPException(status_code=404)
+                full_path, stat_result = await asyncio.to_thread(self.lookup_path, rel_path)
+            return self._immutable_response(full_path, stat_result, scope, f'"{sha256}-w{width}.{fmt}"')
+
+        match = _CONTENT_NAME.match(name)
+        if match is not None:
+            sha256, ext = match.group(1), (match.group(2) or "")[1:]
+            full_path, stat_result = await asyncio.to_thread(self.lookup_path, content_path(sha256, ext))
+            if stat_result is None:
+                raise StarletteHTTPException(status_code=404)
+            request_headers = Headers(scope=scope)
+            vary = {"vary": "Accept-Encoding"} if f".{ext}" in PRECOMPRESS_EXTENSIONS else None
+            if "gzip" in request_headers.get("accept-encoding", "") and "range" not in request_headers:
+                gz_path, gz_stat = await asyncio.to_thread(self.lookup_path, content_path(sha256, ext) + ".gz")
+                if gz_stat is not None:
+                    return self._immutable_response(
+                        gz_path,
+                        gz_stat,
+                        scope,
+                        f'"{sha256}-gz"',
+                        media_type=mimetypes.guess_type(name)[0],
+                        extra_headers={"content-encoding": "gzip", "vary": "Accept-Encoding"},
+                    )
+            return self._immutable_response(full_path, stat_result, scope, f'"{sha256}"', extra_headers=vary)
+
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        """Legacy flat uploads: Starlette's mtime/size ETag plus a day of caching."""
+        response = _UploadFileResponse(
+            full_path, status_code=status_code, stat_result=stat_result,
+            headers={"cache-control": LEGACY_CACHE_CONTROL},
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _immutable_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        etag: str,
+        media_type: str | None = None,
+        extra_headers: dict | None = None,
+    ) -> Response:
+        headers = {"etag": etag, "cache-control": IMMUTABLE_CACHE_CONTROL, **(extra_headers or {})}
+        response = _UploadFileResponse(full_path, stat_result=stat_result, headers=headers, media_type=media_type)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    async def _generate(self, rel_path: str, sha256: str, width: int, fmt: str) -> bool:
+        """Render a missing variant; concurrent requests for it share one render."""
+        task = self._inflight.get(rel_path)
+        if task is None:
+            task = asyncio.create_task(self._render(rel_path, sha256, width, fmt))
+            self._inflight[rel_path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(rel_path, None))
+        return await asyncio.shield(task)
+
+    async def _render(self, rel_path: str, sha256: str, width: int, fmt: str) -> bool:
+        async with self._semaphore:
+            src_path = await asyncio.to_thread(source_path, self.upload_dir, sha256)
+            if src_path is None:
+                return False
+            dest_path = os.path.join(self.upload_dir, rel_path)
+            try:
+                await asyncio.to_thread(render_variant, src_path, dest_path, width, fmt, UPLOAD_DERIVATIVE_QUALITY)
+            except Exception:
+                # Not a raster format PyMuPDF can decode (e.g. SVG); serve a 404.
+                return False
+            return True
@@ -0,0 +1,117 @@
+"""
+Size limits and chunked transfer for /api/admin/upload.
+
+Starlette spools multipart file parts to a temp file, so an UploadFile is
+already on disk by the time the route runs. These helpers keep it there:
+local uploads are copied in UPLOAD_CHUNK_SIZE pieces, and Cloudinary uploads
+larger than one chunk go through upload_large(), which sends one chunk per
+request. Peak memory per upload is about one chunk, however large the file.
+
+Limits are per resource type. UploadSizeLimitMiddleware rejects requests
+whose Content-Length is already over the limit before the body is read.
+"""
+import json
+import os
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+
+MB = 1024 * 1024
+UPLOAD_MAX_BYTES = {
+    "image": int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(20 * MB))),
+    "video": int(os.getenv("UPLOAD_MAX_VIDEO_BYTES", str(500 * MB))),
+    "raw": int(os.getenv("UPLOAD_MAX_RAW_BYTES", str(50 * MB))),
+}
+# Cloudinary requires upload_large chunks of at least 5 MB.
+UPLOAD_CHUNK_SIZE = max(int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * MB))), 5 * MB)
+
+# Room for multipart boundaries and part headers on top of the file itself.
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def upload_kind(resource_type: str, content_type: str | None = None) -> str:
+    """Map a Cloudinary resource_type (or "auto" plus MIME type) to a limit key."""
+    if resource_type in UPLOAD_MAX_BYTES:
+        return resource_type
+    content_type = content_type or ""
+    if content_type.startswith("image/"):
+        return "image"
+    if content_type.startswith(("video/", "audio/")):
+        return "video"
+    return "raw"
+
+
+def check_upload_size(size: int | None, resource_type: str, content_type: str | None = None) -> None:
+    if size is None:
+        return
+    kind = upload_kind(resource_type, content_type)
+    limit = UPLOAD_MAX_BYTES[kind]
+    if size > limit:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large for {kind} uploads (max {limit // MB} MB)",
+        )
+
+
+def save_upload(src, dest_path: str, resource_type: str, content_type: str | None = None) -> int:
+    """Copy an upload to `dest_path` chunk by chunk; returns bytes written."""
+    written = 0
+    try:
+        with open(dest_path, "wb") as dest:
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                check_upload_size(written, resource_type, content_type)
+                dest.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return written
+
+
+def upload_to_cloudinary(src, size: int | None, **options) -> dict:
+    """Upload a file object, in chunks when it is larger than one chunk."""
+    import cloudinary.uploader
+
+    if size is None:
+        src.seek(0, os.SEEK_END)
+        size = src.tell()
+    src.seek(0)
+    if size > UPLOAD_CHUNK_SIZE:
+        return cloudinary.uploader.upload_large(src, chunk_size=UPLOAD_CHUNK_SIZE, **options)
+    return cloudinary.uploader.upload(src, **options)
+
+
+class UploadSizeLimitMiddleware:
+    """Answer 413 for uploads whose declared Content-Length is over the limit."""
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == self.path:
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length and content_length.isdigit():
+                query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+                resource_type = query.get("resource_type", ["auto"])[0]
+                # "auto" is only resolved from the part's MIME type after parsing.
+                limit = UPLOAD_MAX_BYTES.get(resource_type, max(UPLOAD_MAX_BYTES.values()))
+                if int(content_length) > limit + _MULTIPART_OVERHEAD:
+                    await self._reject(send, resource_type, limit)
+                    return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, resource_type: str, limit: int) -> None:
+        kind = f"{resource_type} uploads" if resource_type in UPLOAD_MAX_BYTES else "upload"
+        body = json.dumps({"detail": f"File too large for {kind} (max {limit // MB} MB)"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
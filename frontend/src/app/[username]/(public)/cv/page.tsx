@@ -1,9 +1,9 @@
 import Link from "next/link";
-import { getSettingsForUser, AllSettings, SkillCategory } from "@/lib/settings-api";
+import { AllSettings, SkillCategory } from "@/lib/settings-api";
+import { getPortfolioBundle } from "@/lib/bundle";
 import { resolveAppearance } from "@/lib/appearance";
 import { getSiteBasePath } from "@/lib/site-path";
-import { getProjectsForUser } from "@/lib/api";
-import { getDesignsForUser, buildDesignPathSegment } from "@/lib/designs";
+import { buildDesignPathSegment } from "@/lib/designs";
 import { Project } from "@/types/project";
 import { buildProjectPathSegment } from "@/lib/projects";
 import { DesignWork } from "@/types/design";
@@ -34,11 +34,7 @@ export default async function CVPage({
   let designs: DesignWork[] = [];
 
   try {
-    [settings, projects, designs] = await Promise.all([
-      getSettingsForUser(username),
-      getProjectsForUser(username),
-      getDesignsForUser(username),
-    ]);
+    ({ settings, projects, designs } = await getPortfolioBundle(username));
   } catch (error) {
     console.error("Failed to fetch data:", error);
   }
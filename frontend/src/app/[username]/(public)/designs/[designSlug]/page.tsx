@@ -1,7 +1,7 @@
 import Link from "next/link";
 import { notFound } from "next/navigation";
-import { getDesignForUser, parseDesignIdFromPathSegment } from "@/lib/designs";
-import { getSettingsForUser } from "@/lib/settings-api";
+import { parseDesignIdFromPathSegment } from "@/lib/designs";
+import { getPortfolioBundle } from "@/lib/bundle";
 import { resolveAppearance } from "@/lib/appearance";
 import DesignDetailGallery from "@/components/DesignDetailGallery";
 import MarkdownContent from "@/components/MarkdownContent";
@@ -19,10 +19,9 @@ export default async function DesignDetailPage({
   }
 
   try {
-    const [design, settings] = await Promise.all([
-      getDesignForUser(username, parsedId),
-      getSettingsForUser(username),
-    ]);
+    const { designs, settings } = await getPortfolioBundle(username);
+    const design = designs.find((item) => item.id === parsedId);
+    if (!design) throw new Error("Design not found");
     const sectionBg = resolveAppearance(settings.appearance).active.sections?.designs || "";
 
     return (
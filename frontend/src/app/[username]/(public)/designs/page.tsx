@@ -1,5 +1,4 @@
-import { getDesignsForUser } from "@/lib/designs";
-import { getSettingsForUser } from "@/lib/settings-api";
+import { getPortfolioBundle } from "@/lib/bundle";
 import { resolveAppearance } from "@/lib/appearance";
 import { getSiteBasePath } from "@/lib/site-path";
 import DesignGallery from "@/components/DesignGallery";
@@ -16,9 +15,9 @@ export default async function DesignsPage({
   let sectionBg = "";
 
   try {
-    designs = await getDesignsForUser(username);
-    const settings = await getSettingsForUser(username);
-    sectionBg = resolveAppearance(settings.appearance).active.sections?.designs || "";
+    const bundle = await getPortfolioBundle(username);
+    designs = bundle.designs;
+    sectionBg = resolveAppearance(bundle.settings.appearance).active.sections?.designs || "";
   } catch (error) {
     console.error("Failed to fetch designs:", error);
   }
@@ -1,7 +1,8 @@
 import type { Metadata } from "next";
 import Navbar from "@/components/Navbar";
 import Footer from "@/components/Footer";
-import { getSettingsForUser, AllSettings } from "@/lib/settings-api";
+import { AllSettings } from "@/lib/settings-api";
+import { getPortfolioBundle } from "@/lib/bundle";
 import { resolveAppearance } from "@/lib/appearance";
 import { getSiteBasePath } from "@/lib/site-path";
 
@@ -12,7 +13,7 @@ export async function generateMetadata({
 }): Promise<Metadata> {
   const { username } = await params;
   try {
-    const settings = await getSettingsForUser(username);
+    const { settings } = await getPortfolioBundle(username);
     const name = settings.hero?.highlight || username;
     return {
       title: `${name}'s Portfolio`,
@@ -36,7 +37,7 @@ export default async function PublicLayout({
   let settings: AllSettings = {};
 
   try {
-    settings = await getSettingsForUser(username);
+    ({ settings } = await getPortfolioBundle(username));
   } catch (error) {
     console.error("Failed to fetch settings:", error);
   }
@@ -3,9 +3,8 @@ import Projects from "@/components/Projects";
 import DesignSection from "@/components/DesignSection";
 import TechStack from "@/components/TechStack";
 import CVCard from "@/components/CVCard";
-import { getProjectsForUser } from "@/lib/api";
-import { getDesignsForUser } from "@/lib/designs";
-import { getSettingsForUser, AllSettings, SkillCategory } from "@/lib/settings-api";
+import { getPortfolioBundle } from "@/lib/bundle";
+import { AllSettings, SkillCategory } from "@/lib/settings-api";
 import { resolveAppearance } from "@/lib/appearance";
 import { getSiteBasePath } from "@/lib/site-path";
 import { Project } from "@/types/project";
@@ -22,11 +21,7 @@ export default async function UserHome({
   let settings: AllSettings = {};
 
   try {
-    [projects, designs, settings] = await Promise.all([
-      getProjectsForUser(username),
-      getDesignsForUser(username),
-      getSettingsForUser(username),
-    ]);
+    ({ projects, designs, settings } = await getPortfolioBundle(username));
   } catch (error) {
     console.error("Failed to fetch data:", error);
   }
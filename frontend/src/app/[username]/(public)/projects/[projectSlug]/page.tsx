@@ -1,10 +1,9 @@
 import Link from "next/link";
 import { notFound } from "next/navigation";
-import { getSettingsForUser } from "@/lib/settings-api";
 import { resolveAppearance } from "@/lib/appearance";
 import { getSiteBasePath } from "@/lib/site-path";
 import { parseProjectIdFromPathSegment } from "@/lib/projects";
-import { getProjectForUser } from "@/lib/api";
+import { getPortfolioBundle } from "@/lib/bundle";
 import ProjectGallery from "@/components/ProjectGallery";
 import MarkdownContent from "@/components/MarkdownContent";
 
@@ -59,10 +58,9 @@ export default async function ProjectDetailPage({
   if (!parsedId) notFound();
 
   try {
-    const [project, settings] = await Promise.all([
-      getProjectForUser(username, parsedId),
-      getSettingsForUser(username),
-    ]);
+    const { projects, settings } = await getPortfolioBundle(username);
+    const project = projects.find((item) => item.id === parsedId);
+    if (!project) throw new Error("Project not found");
     const sectionBg = resolveAppearance(settings.appearance).active.sections?.projects || "";
     const basePath = await getSiteBasePath(username);
     const homePath = basePath || "/";
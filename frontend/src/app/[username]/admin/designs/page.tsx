@@ -61,6 +61,7 @@ export default function DesignsPage() {
   // PDF state
   const [showPdfModal, setShowPdfModal] = useState(false);
   const [pdfFile, setPdfFile] = useState<File | null>(null);
+  const [pdfSessionId, setPdfSessionId] = useState<string | undefined>(undefined);
   const [pdfPages, setPdfPages] = useState<PdfPage[]>([]);
   const [selectedPages, setSelectedPages] = useState<number[]>([]);
   const [processingPdf, setProcessingPdf] = useState(false);
@@ -188,6 +189,7 @@ export default function DesignsPage() {
 
     try {
       const result = await previewPdf(file);
+      setPdfSessionId(result.session_id);
       setPdfPages(result.pages);
       setPdfPageCount(result.page_count || result.pages.length);
       setPdfPreviewTruncated(Boolean(result.truncated));
@@ -214,7 +216,7 @@ export default function DesignsPage() {
 
     setProcessingPdf(true);
     try {
-      const result = await extractPdfPages(pdfFile, selectedPages);
+      const result = await extractPdfPages(pdfFile, selectedPages, pdfSessionId);
       const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
       const newUrls = result.images.map((img) =>
         img.url.startsWith("http") ? img.url : `${apiUrl}${img.url}`
@@ -243,6 +245,7 @@ export default function DesignsPage() {
 
       setShowPdfModal(false);
       setPdfFile(null);
+      setPdfSessionId(undefined);
       setPdfPages([]);
       setSelectedPages([]);
       setPdfPageCount(0);
@@ -394,6 +397,7 @@ export default function DesignsPage() {
                 onClick={() => {
                   setShowPdfModal(false);
                   setPdfFile(null);
+                  setPdfSessionId(undefined);
                   setPdfPages([]);
                   setSelectedPages([]);
                   setPdfPageCount(0);
@@ -2060,9 +2060,9 @@ export function SettingsPageClient({
               <button
                 onClick={async () => {
                   await handleSaveDomain();
-                  // Refresh domain status after saving
+                  // Re-check the domain now rather than showing the stored result
                   try {
-                    const status = await getDomainStatus();
+                    const status = await getDomainStatus(true);
                     setDomainStatus(status.status);
                     setDomainExpectedA(status.expected_a || null);
                     setDomainExpectedCname(status.expected_cname || null);
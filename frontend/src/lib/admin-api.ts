@@ -210,6 +210,7 @@ export interface PdfPage {
 }
 
 export interface PdfPreviewResponse {
+  session_id?: string;
   page_count: number;
   pages: PdfPage[];
   preview_count?: number;
@@ -255,20 +256,33 @@ export async function previewPdf(file: File): Promise<PdfPreviewResponse> {
 
 export async function extractPdfPages(
   file: File,
-  pages: number[]
+  pages: number[],
+  sessionId?: string
 ): Promise<ExtractPdfResponse> {
   const token = getToken();
-  const formData = new FormData();
-  formData.append("file", file);
-  formData.append("pages", pages.join(","));
+  const send = (useSession: boolean) => {
+    const formData = new FormData();
+    if (useSession && sessionId) {
+      formData.append("session_id", sessionId);
+    } else {
+      formData.append("file", file);
+    }
+    formData.append("pages", pages.join(","));
+    return fetch(`${API_BASE_URL}/api/admin/pdf/extract`, {
+      method: "POST",
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+      body: formData,
+    });
+  };
 
-  const res = await fetch(`${API_BASE_URL}/api/admin/pdf/extract`, {
-    method: "POST",
-    headers: {
-      Authorization: `Bearer ${token}`,
-    },
-    body: formData,
-  });
+  // The preview already stored the PDF server-side; only re-upload if that
+  // session has expired.
+  let res = await send(true);
+  if (sessionId && res.status === 404) {
+    res = await send(false);
+  }
 
   if (!res.ok) {
     const error = await res.json().catch(() => ({}));
@@ -312,11 +326,15 @@ export interface DomainStatus {
     https?: { ok: boolean; status_code?: number; error?: string } | null;
     http?: { ok: boolean; status_code?: number; error?: string } | null;
   };
+  checked_at?: string;
+  next_check_at?: string;
+  status_changed_at?: string;
 }
 
-export async function getDomainStatus(): Promise<DomainStatus> {
+export async function getDomainStatus(refresh = false): Promise<DomainStatus> {
   const token = getToken();
-  const res = await fetch(`${API_BASE_URL}/api/admin/domain/status`, {
+  const query = refresh ? "?refresh=true" : "";
+  const res = await fetch(`${API_BASE_URL}/api/admin/domain/status${query}`, {
     headers: {
       Authorization: `Bearer ${token}`,
     },
@@ -13,15 +13,3 @@ export async function getProjectsForUser(username: string): Promise<Project[]> {
 
   return res.json();
 }
-
-export async function getProjectForUser(username: string, id: number): Promise<Project> {
-  const res = await fetch(`${API_BASE_URL}/api/u/${username}/projects/${id}`, {
-    cache: "no-store",
-  });
-
-  if (!res.ok) {
-    throw new Error("Failed to fetch project");
-  }
-
-  return res.json();
-}
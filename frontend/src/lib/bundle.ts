@@ -0,0 +1,28 @@
+import { cache } from "react";
+import { User } from "./auth";
+import { AllSettings } from "./settings-api";
+import { Project } from "@/types/project";
+import { DesignWork } from "@/types/design";
+
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+
+export interface PortfolioBundle {
+  profile: User;
+  projects: Project[];
+  designs: DesignWork[];
+  settings: AllSettings;
+}
+
+// Everything a public page shows comes from one request; cache() shares it
+// between the layout, metadata and page of the same render.
+export const getPortfolioBundle = cache(async (username: string): Promise<PortfolioBundle> => {
+  const res = await fetch(`${API_BASE_URL}/api/u/${username}/bundle`, {
+    cache: "no-store",
+  });
+
+  if (!res.ok) {
+    throw new Error("Failed to fetch portfolio");
+  }
+
+  return res.json();
+});
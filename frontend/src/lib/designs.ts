@@ -16,18 +16,6 @@ export async function getDesignsForUser(username: string, category?: string): Pr
   return res.json();
 }
 
-export async function getDesignForUser(username: string, id: number): Promise<DesignWork> {
-  const res = await fetch(`${API_BASE_URL}/api/u/${username}/designs/${id}`, {
-    cache: "no-store",
-  });
-
-  if (!res.ok) {
-    throw new Error("Failed to fetch design");
-  }
-
-  return res.json();
-}
-
 export function designSlugPart(title: string): string {
   const cleaned = title
     .toLowerCase()
@@ -167,18 +167,6 @@ export interface AllSettings {
   integrations?: IntegrationsSettings;
 }
 
-export async function getSettingsForUser(username: string): Promise<AllSettings> {
-  const res = await fetch(`${API_BASE_URL}/api/u/${username}/settings`, {
-    cache: "no-store",
-  });
-
-  if (!res.ok) {
-    throw new Error("Failed to fetch settings");
-  }
-
-  return res.json();
-}
-
 export async function getAdminSettings(): Promise<AllSettings> {
   const token = getToken();
 